@@ -0,0 +1,60 @@
+"""
+Column store benchmark: python heap and lookup time of a route/3 table kept
+in memory against the same table attached as a memory-mapped column store.
+
+    python benchmarks/bench_columns.py [n_facts]
+"""
+
+import sys
+import os
+import gc
+import time
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytholog as pl
+from bench_memory import route_facts
+
+
+def heap(build):
+    gc.collect()
+    tracemalloc.start()
+    kb = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return kb, size
+
+
+def lookups(kb, queries):
+    start = time.perf_counter()
+    for q in queries:
+        kb.query(pl.Expr(q))
+    return (time.perf_counter() - start) * 1e6 / len(queries)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    path = os.path.join(tempfile.mkdtemp(), "route.cols")
+    def in_memory():
+        kb = pl.KnowledgeBase("memory")
+        kb(route_facts(n))
+        kb.db["route"]["facts"][0]  # sort the bulk loaded facts
+        return kb
+    kb, size = heap(in_memory)
+    kb.save_store("route", path)
+    def mapped():
+        kb = pl.KnowledgeBase("mapped")
+        kb.attach_store(path)
+        return kb
+    store, mapped_size = heap(mapped)
+    ## the second column is not the sorted one, only the store has an index on it
+    queries = ["route(city%d, Y, W)" % i for i in range(0, 1000, 10)]
+    queries += ["route(X, city%d, W)" % i for i in range(0, 1000, 10)]
+    print("%d route/3 facts, store file %.1f MB" % (n, os.path.getsize(path) / 1e6))
+    print("  %-10s %12d bytes of heap %10.1f us/query" % ("in memory", size, lookups(kb, queries)))
+    print("  %-10s %12d bytes of heap %10.1f us/query" % ("mapped", mapped_size, lookups(store, queries)))
+    store.db["route"]["facts"].close()
+    os.remove(path)
@@ -0,0 +1,52 @@
+"""
+Consult benchmark: streaming a generated prolog file into a knowledge base,
+with the time per clause and the peak resident memory against the file size.
+
+    python benchmarks/bench_consult.py [n_clauses] [--gzip]
+"""
+
+import sys
+import os
+import gzip
+import time
+import tempfile
+import resource
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytholog as pl
+
+
+def write_source(path, n, compress):
+    opener = gzip.open if compress else open
+    with opener(path, "wt") as f:
+        f.write("% generated graph\n")
+        for i in range(n):
+            if i % 1000 == 999:
+                f.write("path(X, Y) :-\n    edge(X, Z, _),\n    path(Z, Y).\n")
+            else:
+                f.write("edge(n%d, n%d, %d).  %% weight\n" % (i % 5000, (i * 7) % 5000, i % 97))
+
+
+def peak_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    compress = "--gzip" in sys.argv
+    path = os.path.join(tempfile.mkdtemp(), "source.pl" + (".gz" if compress else ""))
+    write_source(path, n, compress)
+    size = os.path.getsize(path) / 1e6
+    before = peak_mb()
+    kb = pl.KnowledgeBase("consult")
+    start = time.perf_counter()
+    count = kb.from_file(path)
+    elapsed = time.perf_counter() - start
+    len(kb.db["edge"]["facts"]) and kb.db["edge"]["facts"][0]  # sort the bulk loaded facts
+    sorted_in = time.perf_counter() - start
+    print("%d clauses, %.1f MB file" % (count, size))
+    print("  consult   %8.2f s %8.2f us/clause" % (elapsed, elapsed * 1e6 / count))
+    print("  + sort    %8.2f s" % sorted_in)
+    print("  peak rss  %8.1f MB (%.1f MB before)" % (peak_mb(), before))
+    os.remove(path)
@@ -0,0 +1,88 @@
+"""
+Goal domain benchmark: time and memory per inference on backtracking workloads
+(the same shapes as test_complex_backtracking.py, scaled up).
+
+Compares the persistent (structure-sharing) domains against plain dict copies:
+
+    python benchmarks/bench_domains.py
+"""
+
+import sys
+import os
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytholog as pl
+from pytholog import querizer
+from pytholog.domain import Domain
+
+
+def ancestors(n):
+    kb = pl.KnowledgeBase("ancestors")
+    kb(["parent(p%d, p%d)" % (i, i + 1) for i in range(n)] +
+       ["ancestor(X, Y) :- parent(X, Y)",
+        "ancestor(X, Y) :- parent(X, Z), ancestor(Z, Y)"])
+    return kb, "ancestor(p0, X)"
+
+
+def generate_and_test(n):
+    kb = pl.KnowledgeBase("generate_test")
+    kb(["person(p%d)" % i for i in range(n)] +
+       ["age(p%d, %d)" % (i, 20 + i % 5) for i in range(n)] +
+       ["same_age(X, Y) :- person(X), person(Y), age(X, A), age(Y, A), neq(X, Y)"])
+    return kb, "same_age(p0, Y)"
+
+
+def common_interest(n):
+    kb = pl.KnowledgeBase("nested")
+    kb(["likes(u%d, t%d)" % (i, i % 7) for i in range(n)] +
+       ["common_interest(X, Y, Z) :- likes(X, Z), likes(Y, Z)"])
+    return kb, "common_interest(u0, Y, Z)"
+
+
+WORKLOADS = [(ancestors, 25), (generate_and_test, 60), (common_interest, 150)]
+
+
+def run(workload, n):
+    kb, query = workload(n)
+    inferences = [0]
+    pop = querizer.SearchQueue.pop
+    def counting_pop(self):
+        inferences[0] += 1
+        return pop(self)
+    querizer.SearchQueue.pop = counting_pop
+    try:
+        tracemalloc.start()
+        start = time.perf_counter()
+        kb.query(pl.Expr(query))
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    finally:
+        querizer.SearchQueue.pop = pop
+    return inferences[0], elapsed, peak
+
+
+def report(label):
+    print(label)
+    print("  %-20s %10s %14s %14s" % ("workload", "inferences", "us/inference", "bytes/inference"))
+    for workload, n in WORKLOADS:
+        inf, elapsed, peak = run(workload, n)
+        inf = max(inf, 1)
+        print("  %-20s %10d %14.1f %14.0f" % (workload.__name__, inf, elapsed / inf * 1e6, peak / inf))
+
+
+if __name__ == "__main__":
+    report("persistent domains")
+    fork = Domain.fork
+    def copying_fork(self): ## a full copy per goal, as plain dicts did
+        new = fork(self)
+        new._local, new._frame, new._depth = dict(self._items()), None, 0
+        return new
+    Domain.fork = copying_fork
+    try:
+        report("dict copies")
+    finally:
+        Domain.fork = fork
@@ -0,0 +1,54 @@
+"""
+Bulk insert benchmark: adding a delta of n facts to a knowledge base one
+clause per call (what n /insert requests do) against one batch (what one
+/insert_batch request does), with cached answers of other predicates kept.
+
+    python benchmarks/bench_insert.py [n_facts]
+"""
+
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytholog as pl
+from bench_memory import route_facts
+
+
+def base(n):
+    kb = pl.KnowledgeBase("insert")
+    kb(route_facts(n))
+    kb(["likes(city%d, city%d)" % (i, i + 1) for i in range(1000)])
+    kb.materialize()
+    for i in range(1000):
+        kb.query(pl.Expr("likes(city%d, What)" % i))
+    return kb
+
+
+def report(label, elapsed, n, kb):
+    print("  %-8s %10.3f s %8.1f us/fact, %d cached answers of likes kept" % (
+        label, elapsed, elapsed * 1e6 / n, len(kb._cache)))
+
+
+def delta(n):
+    return ["route(city%d, town%d, %d)" % (i % 1000, i, i % 500) for i in range(n)]
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    clauses = delta(n)
+    print("%d facts into %d" % (n, n))
+
+    kb = base(n)
+    start = time.perf_counter()
+    for c in clauses:
+        kb([c])
+        kb.db["route"]["facts"][0]  ## each request is seen by the next ones
+    report("single", time.perf_counter() - start, n, kb)
+
+    kb = base(n)
+    start = time.perf_counter()
+    kb(clauses)
+    kb.materialize()
+    report("batch", time.perf_counter() - start, n, kb)
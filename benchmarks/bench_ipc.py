@@ -0,0 +1,77 @@
+"""
+Local query benchmark: latency of point lookups on a route/3 table from one
+client over HTTP with json (the tool's api framing) against the unix socket
+binary protocol, with a prepared statement and pipelined. The servers run in
+another process.
+
+    python benchmarks/bench_ipc.py [n_queries]
+"""
+
+import sys
+import os
+import time
+import json
+import signal
+import tempfile
+import threading
+import http.client
+from urllib.parse import quote
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytholog as pl
+from pytholog.server import Server
+from pytholog.ipc import IPCServer
+from pytholog.client import Connection, Prepared
+from bench_server import query_app
+
+
+def report(label, elapsed, n):
+    print("  %-10s %8.1f us/query" % (label, elapsed * 1e6 / n))
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    kb = pl.KnowledgeBase("routes")
+    kb(["route(city%d, town%d, %d)" % (i % 1000, i, i % 500) for i in range(100000)])
+    kb.materialize()
+    pairs = [("city%d" % (i * 7 % 1000), "town%d" % (i * 7 % 100000)) for i in range(n)]
+    for a, b in set(pairs):  ## answers are cached by the knowledge base either way
+        kb.query(pl.Expr("route(%s, %s, Cost)" % (a, b)))
+
+    http_server = Server(query_app(kb), port = 0, threads = 1)
+    path = os.path.join(tempfile.mkdtemp(), "kb.sock")
+    ipc_server = IPCServer(kb, path)
+    pid = os.fork()
+    if pid == 0:
+        threading.Thread(target = ipc_server.serve_forever, daemon = True).start()
+        http_server.serve()
+        os._exit(0)
+    print("%d lookups" % n)
+
+    conn = http.client.HTTPConnection(*http_server.address)
+    start = time.perf_counter()
+    for a, b in pairs:
+        conn.request("GET", "/query?expr=" + quote("route(%s, %s, Cost)" % (a, b)))
+        json.loads(conn.getresponse().read())
+    report("http", time.perf_counter() - start, n)
+
+    client = Connection(path)
+    start = time.perf_counter()
+    for a, b in pairs:
+        client.query("route(%s, %s, Cost)" % (a, b))
+    report("ipc", time.perf_counter() - start, n)
+
+    route = client.prepare("route(From, To, Cost)", ["From", "To"])
+    start = time.perf_counter()
+    for pair in pairs:
+        client.execute(route, pair)
+    report("prepared", time.perf_counter() - start, n)
+
+    start = time.perf_counter()
+    for i in range(0, n, 100):
+        client.pipeline([(route, pair) for pair in pairs[i:i + 100]])
+    report("pipelined", time.perf_counter() - start, n)
+
+    os.kill(pid, signal.SIGTERM)
+    os.waitpid(pid, 0)
@@ -0,0 +1,54 @@
+"""
+Journal benchmark: persisting single inserts into a knowledge base of n facts,
+by rewriting it as a prolog file (what the tool's /save does) against
+journaling each insert with the three sync policies.
+
+    python benchmarks/bench_journal.py [n_facts] [n_inserts]
+"""
+
+import sys
+import os
+import time
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytholog as pl
+from bench_memory import route_facts
+
+
+def rewrite(kb, path):
+    with open(path, "w") as f:
+        for pred in kb.db:
+            for fact in kb.db[pred]["facts"]:
+                f.write(fact.to_string() + ".\n")
+
+
+def report(label, elapsed, inserts):
+    print("  %-8s %10.1f us/insert" % (label, elapsed * 1e6 / inserts))
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    inserts = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    folder = tempfile.mkdtemp()
+    facts = route_facts(n)
+    print("%d facts, %d inserts" % (n, inserts))
+    kb = pl.KnowledgeBase("rewrite")
+    kb(facts)
+    start = time.perf_counter()
+    for i in range(min(inserts, 5)):  # a full rewrite each time, a few are enough
+        kb(["route(new%d, city0, 1)" % i])
+        rewrite(kb, os.path.join(folder, "kb.pl"))
+    report("rewrite", time.perf_counter() - start, min(inserts, 5))
+    for sync in ("always", "batch", "never"):
+        snap, log = os.path.join(folder, sync + ".snapshot"), os.path.join(folder, sync + ".journal")
+        kb = pl.KnowledgeBase.restore(snap, log, sync, sync = sync)
+        kb.add_kn(facts)
+        kb.compact(snap, background = False)
+        start = time.perf_counter()
+        for i in range(inserts):
+            kb(["route(new%d, city0, 1)" % i])
+        kb.journal.flush()
+        report(sync, time.perf_counter() - start, inserts)
+        kb.journal.close()
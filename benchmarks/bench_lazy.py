@@ -0,0 +1,38 @@
+"""
+Lazy consult benchmark: time to the first query on a small predicate of a
+large generated program, consulted eagerly against lazily (once indexed).
+
+    python benchmarks/bench_lazy.py [n_clauses]
+"""
+
+import sys
+import os
+import time
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytholog as pl
+from bench_consult import write_source
+
+
+def first_query(label, path, lazy):
+    start = time.perf_counter()
+    kb = pl.KnowledgeBase(label)
+    kb.from_file(path, lazy = lazy)
+    answer = kb.query(pl.Expr("owner(graph, Who)"))
+    print("  %-10s %10.3f s to the first answer %s" % (label, time.perf_counter() - start, answer))
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    path = os.path.join(tempfile.mkdtemp(), "source.pl")
+    write_source(path, n, False)
+    with open(path, "a") as f:
+        f.write("owner(graph, noor).\n")
+    print("%d clauses" % n)
+    first_query("eager", path, False)
+    first_query("indexing", path, True)
+    first_query("lazy", path, True)
+    os.remove(path)
+    os.remove(path + ".idx")
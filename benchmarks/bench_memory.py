@@ -0,0 +1,70 @@
+"""
+Knowledge base memory benchmark: resident size of list-heavy facts
+(adjacency lists and category paths repeated across facts), or bytes per
+fact of a large table of small facts such as route/3.
+
+    python benchmarks/bench_memory.py [n_facts]
+    python benchmarks/bench_memory.py route [n_facts]
+"""
+
+import sys
+import os
+import gc
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytholog as pl
+from pytholog import term
+
+
+def list_heavy_facts(n):
+    paths = ["[electronics,computers,laptops]", "[electronics,phones,android]",
+             "[home,kitchen,cookware]", "[books,fiction,scifi]"]
+    neighbours = ["[n%d,n%d,n%d,n%d]" % (i, i + 1, i + 2, i + 3) for i in range(50)]
+    facts = []
+    for i in range(n):
+        facts.append("category(item%d, %s)" % (i, paths[i % len(paths)]))
+        facts.append("adjacent(node%d, %s)" % (i, neighbours[i % len(neighbours)]))
+    return facts
+
+
+def route_facts(n):
+    return ["route(city%d, city%d, %d)" % (i % 1000, (i * 7) % 1000, i % 500)
+            for i in range(n)]
+
+
+def measure(facts):
+    gc.collect()
+    tracemalloc.start()
+    kb = pl.KnowledgeBase("memory")
+    kb(facts)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return kb, size
+
+
+def report(label, facts):
+    kb, size = measure(facts)
+    print("  %-16s %12d bytes %10.0f bytes/fact" % (label, size, size / len(facts)))
+    return kb
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["route"]:
+        n = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+        facts = route_facts(n)
+        print("%d route/3 facts" % n)
+        report("route/3", facts)
+        sys.exit(0)
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    facts = list_heavy_facts(n)
+    print("%d list-heavy facts" % len(facts))
+    report("hash-consed", facts)
+    hashcons = term.hashcons
+    term.hashcons = lambda t: t
+    try:
+        report("not shared", facts)
+    finally:
+        term.hashcons = hashcons
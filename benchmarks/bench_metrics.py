@@ -0,0 +1,47 @@
+"""
+Metrics overhead benchmark: the same rule searches and fact lookups with the
+metrics off (the default) and on (kb.enable_metrics()), the cache cleared
+before each query so every one is searched.
+
+    python benchmarks/bench_metrics.py [n_queries]
+"""
+
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytholog as pl
+
+
+def family(n):
+    kb = pl.KnowledgeBase("metrics")
+    kb(["parent(p%d, p%d)" % (i // 3, i) for i in range(1, n)])
+    kb(["grand(X, Z) :- parent(X, Y), parent(Y, Z)"])
+    kb.materialize()
+    return kb
+
+
+def run(kb, queries):
+    start = time.perf_counter()
+    for q in queries:
+        kb._cache.clear()
+        kb.query(q)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    kb = family(300)
+    for label, text in (("rules", "grand(p%d, G)"), ("facts", "parent(p%d, C)")):
+        queries = [pl.Expr(text % (i % 100)) for i in range(n)]
+        kb.enable_metrics(False)
+        off = min(run(kb, queries) for _ in range(3))
+        kb.enable_metrics()
+        on = min(run(kb, queries) for _ in range(3))
+        print("  %-6s off %8.1f us/query   on %8.1f us/query  (%+.1f%%)" % (
+            label, off * 1e6 / n, on * 1e6 / n, (on - off) * 100 / off))
+    stats = kb.stats()
+    print("  %d queries, %d inferences, %d unifications, %d scans, %d index probes" % (
+        stats["queries"], stats["inferences"], stats["unifications"], stats["scans"], stats["index_probes"]))
@@ -0,0 +1,47 @@
+"""
+Prepared query benchmark: the same query shapes with different constants sent
+as text (read, then answered by kb.query) against prepared once and executed
+with the constants bound, each with a constant not asked before.
+
+    python benchmarks/bench_prepared.py [n_facts] [n_queries]
+"""
+
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytholog as pl
+
+
+def build(n):
+    kb = pl.KnowledgeBase("prepared")
+    kb(["edge(c%d, c%d, %d)" % (i % 1000, (i * 7) % 1000, i % 13) for i in range(n)])
+    kb(["likes(p%d, t%d)" % (i, i % 1000) for i in range(n)])
+    kb(["path(X, Y, P) :- edge(X, Y, P)"])
+    kb.materialize()
+    return kb
+
+
+def timed(run, n):
+    start = time.perf_counter()
+    for i in range(n):
+        run(i)
+    return (time.perf_counter() - start) * 1e6 / n
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    kb = build(n)
+    print("%d facts, %d queries of each shape" % (n, queries))
+    for text, param, value in (("likes(Who, What)", "Who", "p%d"), ("likes(Who, What)", "What", "t%d"),
+                               ("path(X, Y, P)", "X", "c%d")):
+        handle = kb.prepare(text)
+        as_text = text.replace(param, "%s")
+        sent = timed(lambda i: kb.query(pl.Expr(as_text % (value % i))), queries)
+        kb.clear_cache()
+        executed = timed(lambda i: handle.execute(**{param: value % i}), queries)
+        kb.clear_cache()
+        print("  %-18s %-6s text %8.1f us/query   prepared %8.1f us/query" % (text, param, sent, executed))
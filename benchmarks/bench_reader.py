@@ -0,0 +1,45 @@
+"""
+Clause reader benchmark: time to read and compile clauses into Fact objects,
+and to load them into a knowledge base (facts and rules with arithmetic).
+
+    python benchmarks/bench_reader.py [n_clauses]
+    python benchmarks/bench_reader.py 1000000
+"""
+
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytholog as pl
+
+
+def clauses(n):
+    rules = ["path(X, Y, W) :- edge(X, Z, W1), path(Z, Y, W2), W is W1 + W2.",
+             "reach(X, Y) :- edge(X, Y, _) ; edge(Y, X, _).",
+             "walk([H|T], N) :- N > 0, visit(H), N1 is N - 1, walk(T, N1)."]
+    out = []
+    for i in range(n):
+        if i % 10 == 9:
+            out.append(rules[i % len(rules)])
+        elif i % 10 == 8:
+            out.append("route(city%d, [stop%d, stop%d], %d.5)." % (i, i + 1, i + 2, i % 50))
+        else:
+            out.append("edge(n%d, n%d, %d)." % (i % 1000, (i * 7) % 1000, i % 97))
+    return out
+
+
+def timed(label, fn, n):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print("  %-10s %8.2f s %8.2f us/clause" % (label, elapsed, elapsed * 1e6 / n))
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    texts = clauses(n)
+    print("%d clauses" % n)
+    timed("read", lambda: [pl.Fact(t) for t in texts], n)
+    timed("load", lambda: pl.KnowledgeBase("reader")(texts), n)
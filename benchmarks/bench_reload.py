@@ -0,0 +1,56 @@
+"""
+Hot reload benchmark: a clause of a large generated program is changed, and
+the knowledge base is restarted (consulted again) against reloaded by its
+registry (only the changed clauses applied), with its cached answers kept.
+
+    python benchmarks/bench_reload.py [n_clauses]
+"""
+
+import sys
+import os
+import time
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytholog as pl
+from pytholog.registry import Registry
+from bench_consult import write_source
+
+
+def warm(kb):
+    for i in range(100):
+        kb.query(pl.Expr("likes(person%d, What)" % i))
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    path = os.path.join(tempfile.mkdtemp(), "source.pl")
+    write_source(path, n, False)
+    with open(path, "a") as f:
+        f.write("".join("likes(person%d, tea).\n" % i for i in range(100)))
+        f.write("owner(graph, noor).\n")
+    print("%d clauses" % n)
+    registry = Registry()
+    warm(registry.add("source", [path]))
+
+    with open(path) as f:
+        text = f.read()
+    with open(path, "w") as f:
+        f.write(text.replace("owner(graph, noor).", "owner(graph, fawi)."))
+    stamp = time.time() + 2
+    os.utime(path, (stamp, stamp))
+
+    start = time.perf_counter()
+    kb = pl.KnowledgeBase("restart")
+    kb.from_file(path)
+    warm(kb)
+    print("  %-8s %10.3f s, answers to warm again" % ("restart", time.perf_counter() - start))
+
+    start = time.perf_counter()
+    registry.reload()
+    kb = registry["source"]
+    elapsed = time.perf_counter() - start
+    print("  %-8s %10.3f s, %d cached answers kept, %s" % (
+        "reload", elapsed, len(kb._cache), kb.query(pl.Expr("owner(graph, Who)"))))
+    os.remove(path)
@@ -0,0 +1,67 @@
+"""
+Scheduler benchmark: latency of short lookups sent while long scans run, when
+queries are answered one at a time (a worker running each query to its end)
+against the fair scheduler.
+
+    python benchmarks/bench_scheduler.py [n_facts] [n_lookups]
+"""
+
+import sys
+import os
+import time
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytholog as pl
+from pytholog.scheduler import Scheduler
+
+
+def build(n):
+    kb = pl.KnowledgeBase("mixed")
+    kb(["big(n%d, [%d])" % (i, i % 1000) for i in range(n)])
+    kb(["friend(a%d, b%d)" % (i, i) for i in range(1000)])
+    kb.materialize()
+    return kb
+
+
+def mixed(run, lookups):
+    stop = threading.Event()
+    def scans():
+        i = 0
+        while not stop.is_set():
+            run(pl.Expr("big(X, [%d])" % i), "low")  ## a list arg: no index, every fact is read
+            i += 1
+    scanner = threading.Thread(target = scans)
+    scanner.start()
+    time.sleep(0.1)
+    latencies = []
+    for i in range(lookups):
+        start = time.perf_counter()
+        run(pl.Expr("friend(a%d, Y)" % i), "high")
+        latencies.append(time.perf_counter() - start)
+        time.sleep(0.002)
+    stop.set()
+    scanner.join()
+    latencies.sort()
+    return latencies[len(latencies) // 2] * 1000, latencies[int(len(latencies) * 0.99)] * 1000
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    lookups = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    print("short lookups during scans of %d facts" % n)
+
+    kb = build(n)
+    worker = threading.Lock()
+    def serial(expr, priority):
+        with worker:
+            return list(kb.solve(expr))
+    print("  %-10s p50 %8.2f ms  p99 %8.2f ms" % (("serial",) + mixed(serial, lookups)))
+
+    kb = build(n)
+    scheduler = Scheduler(kb)
+    def scheduled(expr, priority):
+        return scheduler.query(expr, priority = priority, client = priority)
+    print("  %-10s p50 %8.2f ms  p99 %8.2f ms" % (("scheduled",) + mixed(scheduled, lookups)))
+    scheduler.stop()
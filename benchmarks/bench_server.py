@@ -0,0 +1,107 @@
+"""
+Server load test: p50 / p99 latency and QPS of /query requests sent by
+concurrent clients over keep-alive connections (or a new connection for
+every request with --close).
+
+With no url a local instance of pytholog.server is started over a route/3
+table (the tool in production mode is the same server around its flask app):
+
+    python benchmarks/bench_server.py [url] [-c clients] [-n requests]
+                                      [-w workers] [-t threads] [--close]
+
+    python tool/Pytholog.py -c big.pl -n big -w 4 &
+    python benchmarks/bench_server.py http://127.0.0.1:5000 -c 16
+"""
+
+import sys
+import os
+import json
+import time
+import random
+import signal
+import argparse
+import http.client
+import multiprocessing
+from urllib.parse import urlsplit, quote, parse_qs
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytholog as pl
+from pytholog.server import Server
+from bench_memory import route_facts
+
+
+def query_app(kb):
+    def app(environ, start_response):
+        expr = parse_qs(environ["QUERY_STRING"])["expr"][0]
+        body = json.dumps(kb.query(pl.Expr(expr))).encode("utf-8")
+        start_response("200 OK", [("Content-Type", "application/json"),
+                                  ("Content-Length", str(len(body)))])
+        return [body]
+    return app
+
+
+def client(url, requests, close, seed):
+    parts = urlsplit(url)
+    rand = random.Random(seed)
+    conn = None
+    latencies = []
+    for _ in range(requests):
+        path = "/query?expr=" + quote("route(city%d, To, Cost)" % rand.randrange(1000))
+        start = time.perf_counter()
+        if conn is None:
+            conn = http.client.HTTPConnection(parts.hostname, parts.port)
+        conn.request("GET", path, headers = {"Connection": "close"} if close else {})
+        response = conn.getresponse()
+        response.read()
+        if response.status != 200:
+            raise RuntimeError("%s answered %d" % (url, response.status))
+        if close:
+            conn.close()
+            conn = None
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def load(url, clients, requests, close):
+    per_client = max(1, requests // clients)
+    with multiprocessing.Pool(clients) as pool:
+        start = time.perf_counter()
+        runs = pool.starmap(client, [(url, per_client, close, seed) for seed in range(clients)])
+        elapsed = time.perf_counter() - start
+    latencies = sorted(l for run in runs for l in run)
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+    print("%d requests, %d clients, %s" % (len(latencies), clients, "close" if close else "keep-alive"))
+    print("  p50 %8.2f ms" % percentile(0.50))
+    print("  p99 %8.2f ms" % percentile(0.99))
+    print("  QPS %8.0f" % (len(latencies) / elapsed))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("url", nargs = "?")
+    parser.add_argument("-c", "--clients", type = int, default = 8)
+    parser.add_argument("-n", "--requests", type = int, default = 4000)
+    parser.add_argument("-w", "--workers", type = int, default = 2)
+    parser.add_argument("-t", "--threads", type = int, default = 8)
+    parser.add_argument("--close", action = "store_true")
+    args = parser.parse_args()
+    if args.url:
+        load(args.url, args.clients, args.requests, args.close)
+        sys.exit(0)
+    kb = pl.KnowledgeBase("routes")
+    kb(route_facts(100000))
+    kb.materialize()
+    server = Server(query_app(kb), port = 0, workers = args.workers, threads = args.threads)
+    pid = os.fork()
+    if pid == 0:
+        server.serve()
+        os._exit(0)
+    try:
+        url = "http://127.0.0.1:%d" % server.address[1]
+        print("local server: %d workers, %d threads" % (args.workers, args.threads))
+        load(url, args.clients, args.requests, args.close)
+    finally:
+        os.kill(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
@@ -0,0 +1,44 @@
+"""
+Query shape benchmark: queries of a few shapes, each with constants not asked
+before, read into an Expr every time and answered by kb.query (which shares the
+plan of the shape) against sent as text, compiled by their shape.
+
+    python benchmarks/bench_shapes.py [n_facts] [n_queries]
+"""
+
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytholog as pl
+
+
+def build(n):
+    kb = pl.KnowledgeBase("shapes")
+    kb(["edge(c%d, c%d, %d)" % (i % 1000, (i * 7) % 1000, i % 13) for i in range(n)])
+    kb(["likes(p%d, t%d)" % (i, i % 1000) for i in range(n)])
+    kb(["path(X, Y, P) :- edge(X, Y, P)"])
+    kb.materialize()
+    return kb
+
+
+def timed(run, n):
+    start = time.perf_counter()
+    for i in range(n):
+        run(i)
+    return (time.perf_counter() - start) * 1e6 / n
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    kb = build(n)
+    print("%d facts, %d queries of each shape" % (n, queries))
+    for shape in ("likes(p%d, What)", "likes(Who, t%d)", "edge(c%d, Y, 3)", "path(c%d, Y, P)"):
+        read = timed(lambda i: kb.query(pl.Expr(shape % i)), queries)
+        kb.clear_cache()
+        shaped = timed(lambda i: kb.query(shape % i), queries)
+        kb.clear_cache()
+        print("  %-18s read %8.1f us/query   by shape %8.1f us/query" % (shape, read, shaped))
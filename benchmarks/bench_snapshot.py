@@ -0,0 +1,45 @@
+"""
+Snapshot benchmark: cold start of a knowledge base from prolog text against
+loading its binary snapshot.
+
+    python benchmarks/bench_snapshot.py [n_clauses]
+"""
+
+import sys
+import os
+import time
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytholog as pl
+from bench_consult import write_source
+
+
+def timed(label, fn, n, path):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print("  %-9s %8.2f s %8.2f us/clause %8.1f MB" %
+          (label, elapsed, elapsed * 1e6 / n, os.path.getsize(path) / 1e6))
+    return result
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    folder = tempfile.mkdtemp()
+    source = os.path.join(folder, "source.pl")
+    snap = os.path.join(folder, "source.snapshot")
+    write_source(source, n, False)
+    print("%d clauses" % n)
+    def cold():
+        kb = pl.KnowledgeBase("cold")
+        kb.from_file(source)
+        kb.db["edge"]["facts"][0]  # sort the bulk loaded facts
+        return kb
+    kb = timed("text", cold, n, source)
+    kb.save_snapshot(snap)
+    restored = timed("snapshot", lambda: pl.KnowledgeBase.load_snapshot(snap), n, snap)
+    assert len(restored.db["edge"]["facts"]) == len(kb.db["edge"]["facts"])
+    os.remove(source)
+    os.remove(snap)
@@ -0,0 +1,60 @@
+"""
+SQL planner benchmark: a three table drill-down rule searched goal at a time
+over in memory facts against the same rule compiled into one SQLite join.
+
+    python benchmarks/bench_sqlplan.py [n_customers]
+"""
+
+import sys
+import os
+import time
+import sqlite3
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytholog as pl
+
+RULE = "customer_rental(C, F) :- customer(C, Id), rental(Id, Inv), inventory(Inv, F)"
+
+
+def tables(n):
+    customers = [("c%d" % i, "%d" % i) for i in range(n)]
+    rentals = [("%d" % (i % n), "%d" % i) for i in range(5 * n)]
+    inventory = [("%d" % i, "film%d" % (i % 1000)) for i in range(5 * n)]
+    return {"customer": customers, "rental": rentals, "inventory": inventory}
+
+
+def write_database(path, data):
+    db = sqlite3.connect(path)
+    for table, rows in data.items():
+        db.execute("CREATE TABLE %s (x TEXT, y TEXT)" % table)
+        db.executemany("INSERT INTO %s VALUES (?, ?)" % table, rows)
+    db.commit()
+    db.close()
+
+
+def timed(label, kb, queries):
+    start = time.perf_counter()
+    answers = sum(len(kb.query(pl.Expr(q))) for q in queries)
+    elapsed = time.perf_counter() - start
+    print("  %-10s %10.2f ms/query (%d answers)" % (label, elapsed * 1e3 / len(queries), answers))
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    data = tables(n)
+    path = os.path.join(tempfile.mkdtemp(), "shop.db")
+    write_database(path, data)
+    memory = pl.KnowledgeBase("memory")
+    memory(["%s(%s, %s)" % (t, x, y) for t, rows in data.items() for x, y in rows] + [RULE])
+    sql = pl.KnowledgeBase("sql")
+    for table in data:
+        sql.external(table, 2, path, table, index = True)
+    sql([RULE])
+    queries = ["customer_rental(c%d, F)" % i for i in range(0, n, n // 20)]
+    queries += ["customer_rental(C, film%d)" % i for i in range(0, 1000, 50)]
+    print("%d customers, %d rentals" % (n, 5 * n))
+    timed("search", memory, queries)
+    timed("sql", sql, queries)
+    os.remove(path)
@@ -0,0 +1,57 @@
+"""
+Table import benchmark: rows of a csv file added as clause text against
+load_csv, which makes the facts directly from the columns.
+
+    python benchmarks/bench_tabular.py [n_rows]
+"""
+
+import sys
+import os
+import csv
+import time
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytholog as pl
+
+
+def write_csv(path, n):
+    with open(path, "w", newline = "") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "city", "population", "score"])
+        for i in range(n):
+            writer.writerow([i, "city%d" % (i % 1000), i % 5000, "%.2f" % (i / 7)])
+
+
+def timed(label, fn, n):
+    start = time.perf_counter()
+    kb = fn()
+    kb.db["city"]["facts"][0]  # sort the bulk loaded facts
+    elapsed = time.perf_counter() - start
+    print("  %-9s %8.2f s %10.0f rows/s" % (label, elapsed, n / elapsed))
+
+
+def from_text(path):
+    kb = pl.KnowledgeBase("text")
+    with open(path, newline = "") as f:
+        rows = csv.reader(f)
+        next(rows)
+        kb(["city(%s, %s, %s, %s)" % tuple(row) for row in rows])
+    return kb
+
+
+def from_csv(path):
+    kb = pl.KnowledgeBase("csv")
+    kb.load_csv("city", path)
+    return kb
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    path = os.path.join(tempfile.mkdtemp(), "cities.csv")
+    write_csv(path, n)
+    print("%d rows" % n)
+    timed("text", lambda: from_text(path), n)
+    timed("load_csv", lambda: from_csv(path), n)
+    os.remove(path)
@@ -0,0 +1,183 @@
+import socket
+import threading
+from contextlib import contextmanager
+from .ipc import PREPARE, EXECUTE, QUERY, CLOSE, ERROR, frame, read_frames
+
+## python client of the local query server (see ipc.py):
+##
+##   pool = Pool("/tmp/kb.sock")
+##   route = Prepared("route(From, To, Cost)", ["From"])
+##   pool.execute(route, ["city3"])
+##   with pool.connection() as conn:
+##       answers = conn.pipeline([(route, ["city%d" % i]) for i in range(100)])
+##
+## a connection prepares a statement on the server the first time it executes it.
+## answers are the ones of kb.query: a list of bindings, ["Yes"] or ["No"].
+
+class QueryError(Exception):
+    pass
+
+## a query prepared once per connection and run with its parameters bound
+class Prepared:
+    def __init__(self, text, params = ()):
+        self.text = text
+        self.params = list(params)
+
+    def __repr__(self):
+        return "Prepared(%s, %s)" % (self.text, self.params)
+
+class Connection:
+    def __init__(self, path, timeout = None):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(path)
+        self._rid = 0
+        self._buffer = bytearray()
+        self._statements = {}  ## Prepared -> its id on the server, once it is prepared there
+        self._sid = 0  ## ids are not reused: a closed one may still be executed in a pipeline
+
+    def _frame(self, kind, value):
+        self._rid = (self._rid + 1) & 0xffffffff
+        return frame(kind, self._rid, value)
+
+    def _receive(self, count):
+        results = []
+        while True:
+            frames, used = read_frames(self._buffer)
+            del self._buffer[:used]
+            results.extend(frames)
+            if len(results) >= count:
+                return results
+            data = self.sock.recv(1 << 16)
+            if not data:
+                raise ConnectionError("the server closed the connection")
+            self._buffer += data
+
+    def _next_sid(self):
+        self._sid += 1
+        return self._sid
+
+    ## add the frames executing a statement, preparing it first on this connection:
+    ## `preparing` is statement -> (its id, the position of its PREPARE in frames)
+    def _execute_frames(self, frames, preparing, statement, values, limit):
+        sid = self._statements.get(statement)
+        if sid is None:
+            if statement not in preparing:
+                preparing[statement] = (self._next_sid(), len(frames))
+                frames.append(self._frame(PREPARE, [preparing[statement][0], statement.text, statement.params]))
+            sid = preparing[statement][0]
+        frames.append(self._frame(EXECUTE, [sid, list(values), limit]))
+
+    ## send the frames and keep the statements the server prepared
+    def _run_preparing(self, frames, preparing):
+        results = self._run(frames)
+        for statement, (sid, at) in preparing.items():
+            if not isinstance(results[at], QueryError):
+                self._statements[statement] = sid
+        return results
+
+    ## send the frames together and read their answers, in order
+    def _run(self, frames):
+        self.sock.sendall(b"".join(frames))
+        results = []
+        for status, rid, value in self._receive(len(frames)):
+            if status == ERROR:
+                value = QueryError(value)
+            results.append(value)
+        return results
+
+    def query(self, text, limit = 0):
+        return _check(self._run([self._frame(QUERY, [text, limit])]))[-1]
+
+    def prepare(self, text, params = ()):
+        statement = Prepared(text, params)
+        sid = self._next_sid()
+        _check(self._run([self._frame(PREPARE, [sid, text, statement.params])]))
+        self._statements[statement] = sid
+        return statement
+
+    def execute(self, statement, values = (), limit = 0):
+        frames, preparing = [], {}
+        self._execute_frames(frames, preparing, statement, values, limit)
+        return _check(self._run_preparing(frames, preparing))[-1]
+
+    ## many queries sent before their answers are read: each request is a query
+    ## text or a (Prepared, values) pair. the answers are in the order of the requests,
+    ## a failed one is its QueryError (raised after all of them were read if raise_errors)
+    def pipeline(self, requests, limit = 0, raise_errors = True):
+        frames, answer_at, preparing = [], [], {}
+        for request in requests:
+            if isinstance(request, str):
+                frames.append(self._frame(QUERY, [request, limit]))
+            else:
+                self._execute_frames(frames, preparing, request[0], request[1], limit)
+            answer_at.append(len(frames) - 1)
+        results = self._run_preparing(frames, preparing)
+        if raise_errors:
+            _check(results)
+        return [results[i] for i in answer_at]
+
+    def close_statement(self, statement):
+        sid = self._statements.pop(statement, None)
+        if sid is not None:
+            _check(self._run([self._frame(CLOSE, sid)]))
+
+    def close(self):
+        self.sock.close()
+
+def _check(results):
+    for r in results:
+        if isinstance(r, QueryError):
+            raise r
+    return results
+
+## up to `size` connections shared by threads, opened when they are first needed
+class Pool:
+    def __init__(self, path, size = 8, timeout = None):
+        self.path = path
+        self.timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+
+    @contextmanager
+    def connection(self):
+        self._slots.acquire()
+        try:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                conn = Connection(self.path, self.timeout)
+            try:
+                yield conn
+            except QueryError:
+                self._release(conn)
+                raise
+            except BaseException:
+                conn.close()  ## its answers may be out of step, it is not reused
+                raise
+            self._release(conn)
+        finally:
+            self._slots.release()
+
+    def _release(self, conn):
+        with self._lock:
+            self._idle.append(conn)
+
+    def query(self, text, limit = 0):
+        with self.connection() as conn:
+            return conn.query(text, limit)
+
+    def execute(self, statement, values = (), limit = 0):
+        with self.connection() as conn:
+            return conn.execute(statement, values, limit)
+
+    def pipeline(self, requests, limit = 0, raise_errors = True):
+        with self.connection() as conn:
+            return conn.pipeline(requests, limit, raise_errors)
+
+    def close(self):
+        with self._lock:
+            for conn in self._idle:
+                conn.close()
+            self._idle = []
@@ -0,0 +1,176 @@
+import sys
+import mmap
+import struct
+from array import array
+from functools import lru_cache
+from .fact import Fact
+from .util import bisect_key
+
+## read-only column stores: the rows of a predicate made only of ground facts, in a
+## file that is memory-mapped instead of read, so a table larger than the memory of
+## the process is paged in by the OS as it is probed and worker processes mapping
+## the same file share one page-cached copy.
+##
+##   header   magic, format version, arity, rows, symbols, name size, symbols size
+##   name     utf-8 predicate name
+##   offsets  symbols + 1 offsets (u64) into the symbols
+##   symbols  utf-8 text of the symbols, numbered in sorted order
+##   columns  one column per arg: the symbol id (i32) of the arg of every row
+##   indexes  one index per column: the rows sorted (stably) on the column ids
+##
+## sections start on 8 byte boundaries, numbers are little endian.
+## symbol ids are in the order of their text, so the id of a constant is found by
+## binary search on the symbols and the rows of an id by binary search on an index.
+## nothing of a row is made into python objects until it is bound into an answer.
+
+MAGIC = b"PLCOLUMN"
+VERSION = 1
+
+_HEADER = struct.Struct("<8sIIQQQQ")
+
+class StoreError(ValueError):
+    pass
+
+def _check_byteorder():
+    if sys.byteorder != "little":
+        raise StoreError("column stores are only supported on little endian hosts")
+
+def _pad(f):
+    f.write(b"\0" * (-f.tell() % 8))
+
+## write the rows (tuples of text constants) of a predicate to a column store
+def write_store(path, predicate, rows):
+    _check_byteorder()
+    ids = {}
+    columns = None
+    nrows = 0
+    for row in rows:
+        if columns is None:
+            columns = [array("i") for _ in row]
+        if len(row) != len(columns):
+            raise StoreError("%s rows have %d args, got %r" % (predicate, len(columns), row))
+        for col, value in zip(columns, row):
+            if not isinstance(value, str):
+                raise StoreError("only text constants can be stored, got %r" % (value,))
+            i = ids.get(value)
+            if i is None:
+                i = ids[value] = len(ids)
+            col.append(i)
+        nrows += 1
+    columns = columns or []
+    ## number the symbols in sorted order
+    symbols = sorted(ids)
+    renumber = array("i", bytes(4 * len(symbols)))
+    for new, s in enumerate(symbols):
+        renumber[ids[s]] = new
+    columns = [array("i", map(renumber.__getitem__, col)) for col in columns]
+    offsets = array("Q", [0])
+    blob = bytearray()
+    for s in symbols:
+        blob += s.encode("utf-8")
+        offsets.append(len(blob))
+    name = predicate.encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(columns), nrows, len(symbols), len(name), len(blob)))
+        for section in [name, offsets, blob] + columns:
+            f.write(section)
+            _pad(f)
+        for col in columns:
+            f.write(array("i", sorted(range(nrows), key = col.__getitem__)))
+            _pad(f)
+
+class ColumnStore:
+    def __init__(self, path):
+        _check_byteorder()
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+        data = memoryview(self._map)
+        if len(data) < _HEADER.size or data[:8] != MAGIC:
+            raise StoreError("%s is not a pytholog column store" % path)
+        magic, version, arity, nrows, nsyms, nname, nblob = _HEADER.unpack_from(data, 0)
+        if version != VERSION:
+            raise StoreError("column store format %d is not supported (expected %d)" % (version, VERSION))
+        self.arity = arity
+        self.nrows = nrows
+        self.nsyms = nsyms
+        pos = _HEADER.size
+        def section(size):
+            nonlocal pos
+            view = data[pos:pos + size]
+            pos += size + (-size % 8)
+            return view
+        self.predicate = sys.intern(bytes(section(nname)).decode("utf-8"))
+        self._offsets = section(8 * (nsyms + 1)).cast("Q")
+        self._blob = section(nblob)
+        self.columns = [section(4 * nrows).cast("i") for _ in range(arity)]
+        self.indexes = [section(4 * nrows).cast("i") for _ in range(arity)]
+        ## decoded symbols are kept for the constants that are used the most
+        self.symbol = lru_cache(maxsize = 1 << 16)(self._symbol)
+
+    def _symbol(self, i):
+        text = bytes(self._blob[self._offsets[i]:self._offsets[i + 1]]).decode("utf-8")
+        return sys.intern(text)
+
+    ## id of a text constant, None if it is in no row
+    def symbol_id(self, value):
+        i = bisect_key(range(self.nsyms), value, self.symbol)
+        if i < self.nsyms and self.symbol(i) == value:
+            return i
+        return None
+
+    ## the range of index positions of the rows with the symbol in the column
+    def _range(self, column, sid):
+        index, key = self.indexes[column], self.columns[column].__getitem__
+        lo = bisect_key(index, sid, key)
+        return lo, bisect_key(index, sid, key, right = True, lo = lo)
+
+    ## the rows matching the text constants of `values` (None for the other args):
+    ## the rows of the most selective one from its index, checked on the other ones
+    def select(self, values):
+        best = None
+        bound = []
+        for column, value in enumerate(values):
+            if value is None: continue
+            sid = self.symbol_id(value)
+            if sid is None:
+                return ()
+            lo, hi = self._range(column, sid)
+            if best is None or hi - lo < best[2] - best[1]:
+                best = (column, lo, hi)
+            bound.append((column, sid))
+        if best is None:
+            return range(self.nrows)
+        column, lo, hi = best
+        rows = self.indexes[column][lo:hi]
+        checks = [(self.columns[c], sid) for c, sid in bound if c != column]
+        if not checks:
+            return rows
+        return (r for r in rows if all(col[r] == sid for col, sid in checks))
+
+    ## the arg of a row as a constant
+    def value(self, row, column):
+        return self.symbol(self.columns[column][row])
+
+    ## rows can also be read as facts like the ones of a FactHeap
+    def __getitem__(self, row):
+        if not -self.nrows <= row < self.nrows:
+            raise IndexError("row %d of %d" % (row, self.nrows))
+        return Fact.from_row(self.predicate, tuple(self.value(row, c) for c in range(self.arity)))
+
+    def __len__(self):
+        return self.nrows
+
+    def push(self, item):
+        raise TypeError("%s is a read-only column store (%s)" % (self.predicate, self.path))
+
+    extend = remove = push
+
+    def close(self):
+        self.columns = self.indexes = None
+        self._offsets = self._blob = None
+        self.symbol.cache_clear()
+        self._map.close()
+
+    def __repr__(self):
+        return "ColumnStore(%s/%d, %d rows, %s)" % (self.predicate, self.arity, self.nrows, self.path)
@@ -0,0 +1,137 @@
+from collections.abc import MutableMapping
+
+_DELETED = object()  ## tombstone marking a binding removed in a newer frame
+
+## goal domains (variable bindings) as a persistent map.
+## the bindings live in a chain of frozen frames (dict, parent frame) shared by
+## all the goals forked from it, plus a small dict of local writes.
+## forking a domain for a new branch only freezes the local writes, so it is O(1),
+## and sibling branches share everything bound before them.
+class Domain(MutableMapping):
+    __slots__ = ("_local", "_frame", "_depth", "_size")
+
+    ## chains longer than this are flattened into one frame on the next fork
+    ## so lookups stay cheap (the flattening cost is amortized over the forks)
+    MAX_DEPTH = 32
+
+    def __init__(self, bindings = None):
+        self._local = {}
+        self._frame = None
+        self._depth = 0
+        self._size = 0
+        if bindings:
+            self.update(bindings)
+
+    @classmethod
+    def of(cls, domain):
+        ## an independent domain with the same bindings, shared when possible
+        if isinstance(domain, Domain):
+            return domain.fork()
+        return cls(domain)
+
+    def fork(self):
+        if self._local:
+            self._frame = (self._local, self._frame)
+            self._depth += 1
+            self._local = {}
+            if self._depth > Domain.MAX_DEPTH:
+                self._compact()
+        new = object.__new__(type(self))
+        new._local = {}
+        new._frame = self._frame
+        new._depth = self._depth
+        new._size = self._size
+        return new
+
+    copy = fork
+    __copy__ = fork
+
+    def _compact(self):
+        flat = {}
+        for k, v in self._items():
+            flat[k] = v
+        self._frame = (flat, None) if flat else None
+        self._depth = 1 if flat else 0
+
+    def _lookup(self, key):
+        if key in self._local:
+            return self._local[key]
+        frame = self._frame
+        while frame is not None:
+            bindings, frame = frame
+            if key in bindings:
+                return bindings[key]
+        return _DELETED
+
+    def _items(self):
+        seen = set()
+        for bindings in self._layers():
+            for k, v in bindings.items():
+                if k in seen: continue
+                seen.add(k)
+                if v is not _DELETED:
+                    yield k, v
+
+    def _layers(self):
+        yield self._local
+        frame = self._frame
+        while frame is not None:
+            bindings, frame = frame
+            yield bindings
+
+    def __getitem__(self, key):
+        value = self._lookup(key)
+        if value is _DELETED:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self._lookup(key) is not _DELETED
+
+    def get(self, key, default = None):
+        value = self._lookup(key)
+        return default if value is _DELETED else value
+
+    def __setitem__(self, key, value):
+        if self._lookup(key) is _DELETED:
+            self._size += 1
+        self._local[key] = value
+
+    def __delitem__(self, key):
+        if self._lookup(key) is _DELETED:
+            raise KeyError(key)
+        self._local[key] = _DELETED
+        self._size -= 1
+
+    def __iter__(self):
+        return (k for k, _ in self._items())
+
+    def items(self):
+        return list(self._items())
+
+    def __len__(self):
+        return self._size
+
+    def __repr__(self):
+        return repr(dict(self._items()))
+
+
+## the binding store of a search branch: variable ids to (term, offset) pairs.
+## top is the next free variable id, a clause called on this branch gets its
+## variables renamed apart by taking top as its offset
+class Bindings(Domain):
+    __slots__ = ("top", "trimmed")
+
+    def __init__(self, top = 0):
+        Domain.__init__(self)
+        self.top = top
+        self.trimmed = 0  ## size of the store after the last trimming
+
+    def fork(self):
+        new = Domain.fork(self)
+        new.top = self.top
+        new.trimmed = self.trimmed
+        return new
+
+    copy = fork
+    __copy__ = fork
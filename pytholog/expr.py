@@ -1,55 +1,63 @@
-import re
+from sys import intern
+from .term import VarTable, term_var_indices
+from .reader import Reader, compile_goal
 
 class Expr:
-    def __init__ (self, fact):
-        self._parse_expr(fact)
-            
-    def _parse_expr(self, fact):
-        fact = fact.replace(" ", "")
-        self.f = fact
-        splitting = r"is|\*|\+|\-|\/|>=|<=|>|<|and|or|in|not"
-        if "(" not in fact: 
-            fact = "(" + fact + ")"
-        pred_ind = fact.index("(")
-        self.predicate = fact[:pred_ind]
-        self.terms = fact[pred_ind:]
-        to_remove = str.maketrans("", "", "() ")
-        self.terms = self.terms.translate(to_remove)
-        if self.predicate == "": 
-            self.terms = re.split(splitting, self.terms)
-        else: 
-            # Safe term splitting: only split on commas at top level (not inside brackets/parens)
-            self.terms = self._split_terms(self.terms)
-        self.string = self.f
-        self.index = 0
-    
-    def _split_terms(self, terms_str):
-        """Split terms on commas, but only at top level (not inside brackets or parentheses)."""
-        if not terms_str:
-            return []
-        
-        terms = []
-        current = []
-        depth = 0
-        
-        for char in terms_str:
-            if char in '([':
-                depth += 1
-                current.append(char)
-            elif char in ')]':
-                depth = max(0, depth - 1)
-                current.append(char)
-            elif char == ',' and depth == 0:
-                if current:
-                    terms.append(''.join(current))
-                    current = []
-            else:
-                current.append(char)
-        
-        if current:
-            terms.append(''.join(current))
-        
-        return terms
+    ## one compact representation: predicate, term texts and compiled args.
+    ## the expr text is derived from them when needed (see string)
+    __slots__ = ("predicate", "terms", "args", "arith", "varnames", "nvars", "_text")
+    index = 0
+
+    ## table is the variable table of the clause the expr belongs to,
+    ## a standalone expr (a query) numbers its own variables
+    def __init__ (self, fact, table = None):
+        self._build(Reader(fact).clause(), VarTable() if table is None else table)
+
+    ## an expr from a goal the reader has already read (the goals of a clause)
+    @classmethod
+    def from_node(cls, node, table):
+        expr = object.__new__(cls)
+        expr._build(node, table)
+        return expr
+
+    ## compiled form used by the search: args with numbered variables,
+    ## or the arithmetic template when there is no predicate.
+    ## the text is kept only for arithmetic, other exprs derive it
+    def _build(self, node, table):
+        self.predicate, self.terms, self.args, self.arith, self._text = compile_goal(node, table)
+        self.varnames = table.names or ()
+        self.nvars = len(table.names)
+
+    ## the expr with other constants at some of its args: (position, text) pairs
+    ## (see prepared.py and shapes.py), nothing is read again
+    def replaced(self, consts):
+        args, terms = list(self.args), list(self.terms)
+        for i, text in consts:
+            args[i] = terms[i] = intern(text)
+        expr = object.__new__(Expr)
+        expr.predicate, expr.arith, expr._text = self.predicate, None, None
+        expr.args, expr.terms = tuple(args), tuple(terms)
+        expr.varnames, expr.nvars = self.varnames, self.nvars
+        return expr
+
+    @property
+    def string(self):
+        if self._text is not None:
+            return self._text
+        if not self.terms:
+            return self.predicate
+        return "%s(%s)" % (self.predicate, ",".join(self.terms))
+
+    f = string
+
+    ## indices of the variables the expr mentions
+    def vars(self):
+        if self.arith is not None:
+            return self.arith.vars()
+        found = set()
+        for a in self.args:
+            found |= term_var_indices(a)
+        return found
     
     ## return string value of the expr in case we need it elsewhere with different type
     def to_string(self):
@@ -59,7 +67,7 @@ class Expr:
         return self.string
         
     def __lt__(self, other):
-        return self.terms[self.index] < other.terms[other.index]
+        return self.terms[self.index:self.index + 1] < other.terms[other.index:other.index + 1]
         
 
 #pl_expr deprecated
@@ -0,0 +1,87 @@
+from .fact import Fact
+
+## external predicates: the rows of a predicate live in a SQLite table (or query)
+## and a call is answered by SQL with its bound args pushed into the WHERE clause,
+## so the data is not copied into the knowledge base and a selective call uses the
+## indexes of the database instead of scanning the rows.
+## rows come back as the python values of sqlite (text, numbers).
+
+class ExternalError(ValueError):
+    pass
+
+def quote(name):
+    return '"%s"' % name.replace('"', '""')
+
+def table_columns(connection, table):
+    return [row[1] for row in connection.execute("PRAGMA table_info(%s)" % quote(table))]
+
+class SQLiteTable:
+    ## `source` is the FROM part of the queries: a quoted table name or a subquery
+    def __init__(self, predicate, connection, source, columns):
+        self.predicate = predicate
+        self.connection = connection
+        self.source = source
+        self.columns = list(columns)
+        self.arity = len(self.columns)
+        self._queries = {}  ## SELECT of each combination of bound args
+
+    @classmethod
+    def table(cls, predicate, arity, connection, table, columns = None, index = False):
+        known = table_columns(connection, table)
+        if not known:
+            raise ExternalError("no table %s in the database" % table)
+        if columns is None:
+            columns = known
+        missing = [c for c in columns if c not in known]
+        if missing:
+            raise ExternalError("%s has no column %s" % (table, ", ".join(missing)))
+        if len(columns) != arity:
+            raise ExternalError("%s/%d needs %d columns, got %d" % (predicate, arity, arity, len(columns)))
+        if index:
+            for c in columns:
+                connection.execute("CREATE INDEX IF NOT EXISTS %s ON %s (%s)" % (
+                    quote("pytholog_%s_%s" % (table, c)), quote(table), quote(c)))
+        return cls(predicate, connection, quote(table), columns)
+
+    def _query(self, bound):
+        sql = self._queries.get(bound)
+        if sql is None:
+            sql = "SELECT %s FROM %s" % (", ".join(quote(c) for c in self.columns), self.source)
+            where = [quote(self.columns[c]) + " = ?" for c in bound]
+            if where:
+                sql += " WHERE " + " AND ".join(where)
+            self._queries[bound] = sql
+        return sql
+
+    ## the rows matching the constants of `values` (None for the other args),
+    ## streamed from the database
+    def select(self, values):
+        bound = tuple(c for c, v in enumerate(values) if v is not None)
+        return self.connection.execute(self._query(bound), [values[c] for c in bound])
+
+    def value(self, row, column):
+        return row[column]
+
+    ## rows can also be read as facts like the ones of a FactHeap
+    def __iter__(self):
+        for row in self.select([None] * self.arity):
+            yield Fact.from_row(self.predicate, tuple(map(str, row)))
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += len(self)
+        found = self.connection.execute(self._query(()) + " LIMIT 1 OFFSET ?", (row,)).fetchone()
+        if row < 0 or found is None:
+            raise IndexError("row %d of %s" % (row, self.predicate))
+        return Fact.from_row(self.predicate, tuple(map(str, found)))
+
+    def __len__(self):
+        return self.connection.execute("SELECT count(*) FROM %s" % self.source).fetchone()[0]
+
+    def push(self, item):
+        raise TypeError("%s is an external predicate (%s)" % (self.predicate, self.source))
+
+    extend = remove = push
+
+    def __repr__(self):
+        return "SQLiteTable(%s/%d, %s)" % (self.predicate, self.arity, self.source)
@@ -1,33 +1,92 @@
 from .util import rule_terms
 import re
+import sys
+from itertools import count
 from .expr import Expr
-import uuid
+from .term import VarTable
+from .reader import read_clause, clause_goals, SYMBOL_CHARS
+
+_fresh_ids = count()
+_start_head = None
 
 class Fact:
+    ## a clause is its head expr and body exprs only, the clause text
+    ## and its terms are derived from them when needed
+    __slots__ = ("lh", "rhs", "varnames", "nvars", "_live")
+
     def __init__ (self, fact):
         self._parse_fact(fact)
         
     def _parse_fact(self, fact):
-        fact = fact.replace(" ", "")
-        # normalize by removing trailing periods from fact strings
-        fact = re.sub(r"\.+$", "", fact)
-        self.terms = rule_terms(fact)
-        if ":-" in fact:
-            if_ind = fact.index(":-")
-            self.lh = Expr(fact[:if_ind])
-            replacements = {"),": ")AND", ");": ")OR"}  ## AND OR conditions placeholders
-            replacements = dict((re.escape(k), v) for k, v in replacements.items()) 
-            pattern = re.compile("|".join(replacements.keys()))
-            rh = pattern.sub(lambda x: replacements[re.escape(x.group(0))], fact[if_ind + 2:])
-            rh = re.split("AND|OR", rh)
-            self.rhs = [Expr(g) for g in rh] 
-            rs = [i.to_string() for i in self.rhs]
-            self.fact = (self.lh.to_string() + ":-" + ",".join(rs))
-        else:   ## to store normal expr as facts as well in the database
-            self.lh = Expr(fact)
-            self.rhs = []
-            self.fact = self.lh.to_string()
+        self._live = None
+        head, body = clause_goals(read_clause(fact))
+        ## variables are numbered once for the whole clause
+        table = VarTable()
+        self.lh = Expr.from_node(head, table)
+        self.rhs = [Expr.from_node(g, table) for g in body]
+        self.varnames = table.names or ()
+        self.nvars = len(table.names)
+
+    @property
+    def fact(self):
+        if not self.rhs:
+            return self.lh.to_string()
+        body = ",".join(i.to_string() for i in self.rhs)
+        ## a body starting with a symbol (like \+) would read back glued to the neck
+        neck = ":- " if body[0] in SYMBOL_CHARS else ":-"
+        return self.lh.to_string() + neck + body
+
+    ## unique terms of the clause
+    @property
+    def terms(self):
+        return [sys.intern(t) for t in rule_terms(self.fact)]
+
+    ## the clause the search starts from, its only goal is the query
+    ## and its variables are the query ones
+    ## (its head is read once, the clause is not parsed for every query)
+    @classmethod
+    def query(cls, expr):
+        global _start_head
+        if _start_head is None:
+            _start_head = cls("start(search):-from(random_point)").lh
+        start = object.__new__(cls)
+        start._live = None
+        start.lh = _start_head
+        start.rhs = [expr]
+        start.varnames = expr.varnames
+        start.nvars = expr.nvars
+        return start
     
+    ## a ground fact whose args are all constants is a row of a table:
+    ## the text of its args (numbers are written as text), or None for other clauses
+    def row(self):
+        if self.rhs or self.lh.arith is not None:
+            return None
+        for arg in self.lh.args:
+            if not isinstance(arg, (str, int, float)) or isinstance(arg, bool):
+                return None
+        return self.lh.terms
+
+    ## the fact of a table row, without reading any text.
+    ## the text of a constant is the constant so by default the expr terms and args
+    ## are one tuple, `terms` gives the text of args that are not text (numbers)
+    @classmethod
+    def from_row(cls, predicate, args, terms = None):
+        expr = object.__new__(Expr)
+        expr.predicate = predicate
+        expr.args = args
+        expr.terms = args if terms is None else terms
+        expr.arith = expr._text = None
+        expr.varnames = ()
+        expr.nvars = 0
+        fact = object.__new__(cls)
+        fact.lh = expr
+        fact.rhs = []
+        fact.varnames = ()
+        fact.nvars = 0
+        fact._live = None
+        return fact
+
     ## returning string value of the fact
     def to_string(self):
         return self.fact
@@ -36,17 +95,29 @@ class Fact:
         return self.fact
         
     def __lt__(self, other):
-        return self.lh.terms[self.lh.index] < other.lh.terms[other.lh.index]
+        return self.lh.terms[:1] < other.lh.terms[:1]
+
+    ## indices of the variables still needed once the first `ind` body goals are solved:
+    ## the head ones (returned to the parent) and the ones of the remaining goals
+    def live_vars(self, ind):
+        if self._live is None:
+            self._live = {}
+        if ind not in self._live:
+            live = set()
+            for expr in [self.lh] + self.rhs[ind:]:
+                live |= expr.vars()
+            self._live[ind] = live
+        return self._live[ind]
 
     def fresh(self, uid=None):
         """Return a fresh copy of this Fact with all variables renamed by appending a unique suffix.
-        Variables are tokens starting with an uppercase letter or underscore. The rename is applied
-        to the textual representation of the fact before parsing a new Fact object.
+        The search does not need it: clause variables are numbered when the clause is
+        compiled and renamed apart by the offset of each call in the binding store.
         """
         if uid is None:
-            uid = uuid.uuid4().hex[:8]
-        s = self.fact
-        # Replace variable-like tokens (starting with uppercase or underscore) with token_uid
-        s2 = re.sub(r"\b([A-Z_][A-Za-z0-9_]*)\b", lambda m: f"{m.group(1)}_{uid}", s)
+            uid = next(_fresh_ids)
+        names = set(self.varnames)
+        s2 = re.sub(r"\b([A-Z_][A-Za-z0-9_]*)\b",
+                    lambda m: f"{m.group(1)}_{uid}" if m.group(1) in names else m.group(1), self.fact)
         return Fact(s2)
         
\ No newline at end of file
@@ -1,20 +1,28 @@
+from .domain import Domain
+
 ## goal class which will help us query the rule branches in the facts tree    
 class Goal :
-    def __init__ (self, fact, parent = None, domain = {}, ind = 0) :
+    __slots__ = ("fact", "parent", "domain", "ind", "offset")
+
+    def __init__ (self, fact, parent = None, domain = {}, ind = 0, offset = 0) :
         self.fact = fact
-        self.parent = parent  ## parent goal which is a step above in the tree
+        ## parent goal which is a step above in the tree,
+        ## it is resumed at its next rh goal once this one is solved
+        self.parent = parent
         ## to keep the domain of the goal independent 
         ## as we will change domains a lot in the search
-        self.domain = {}
-        self.domain.update(domain)
+        ## domains are persistent so this fork is O(1) and shares the parent bindings
+        self.domain = Domain.of(domain)
         self.ind = ind
+        ## the fact variables are renamed apart by this offset in the domain
+        self.offset = offset
         
     def __copy__(self):
-        return Goal(self.fact, self.parent, self.domain, self.ind)    
+        return Goal(self.fact, self.parent, self.domain, self.ind, self.offset)    
 
     def __repr__ (self) :
         return "Goal = %s, parent = %s" % (self.fact, self.parent)
         
     def __lt__(self, other):
         return self.fact.lh.terms[self.fact.lh.index] < other.fact.lh.terms[other.fact.lh.index]
-        
\ No newline at end of file
+        
@@ -0,0 +1,261 @@
+import os
+import sys
+import struct
+from array import array
+from itertools import accumulate, chain
+import socketserver
+from .prepared import Template
+
+## local queries over a unix domain socket with a compact binary protocol, for
+## clients on the same host: no HTTP or json framing, and a query prepared once is
+## run again with only its parameters sent (see client.py for the python client).
+##
+## every message is a frame: its size (u32) then the message
+##   request   op (u8), request id (u32), value
+##   response  status (u8, OK or ERROR), request id (u32), value
+## requests of a connection are answered in order, so a client can send many of
+## them before reading the answers (pipelining). statements are numbered by the
+## client, so it can execute one in the same batch that prepares it.
+##
+##   PREPARE   [statement id, query text, [parameter names]] -> None
+##   EXECUTE   [statement id, [parameter values], limit] -> answers
+##   QUERY     [query text, limit] -> answers
+##   CLOSE     statement id -> None
+##
+## answers are the ones of kb.query (a limit of 0 means all of them).
+## values are tagged: n none, t / f booleans, i i64, d f64, s utf-8 text,
+## l list, m map, each tag followed by the value (texts, lists and maps by a u32 size).
+## numbers too big for i64 are sent as text. answers binding their variables to
+## text are a table: a the variable names then the values row by row, as two text
+## blocks (their count, the u32 sizes of the texts and the texts), so they are
+## packed and unpacked a block at a time instead of a value at a time.
+## numbers are little endian.
+
+PREPARE, EXECUTE, QUERY, CLOSE = 1, 2, 3, 4
+OK, ERROR = 0, 1
+
+_FRAME = struct.Struct("<I")
+_HEAD = struct.Struct("<BI")
+_U32 = struct.Struct("<I")
+_I64 = struct.Struct("<q")
+_F64 = struct.Struct("<d")
+
+class ProtocolError(ValueError):
+    pass
+
+def _encode(value, out):
+    if value is None:
+        out.append(b"n")
+    elif value is True:
+        out.append(b"t")
+    elif value is False:
+        out.append(b"f")
+    elif isinstance(value, int) and -(1 << 63) <= value < (1 << 63):
+        out.append(b"i" + _I64.pack(value))
+    elif isinstance(value, float):
+        out.append(b"d" + _F64.pack(value))
+    elif isinstance(value, list) and value and type(value[0]) is dict and _table(value, out):
+        pass
+    elif isinstance(value, (list, tuple)):
+        out.append(b"l" + _U32.pack(len(value)))
+        for v in value:
+            _encode(v, out)
+    elif isinstance(value, dict):
+        out.append(b"m" + _U32.pack(len(value)))
+        for k, v in value.items():
+            _encode(k, out)
+            _encode(v, out)
+    else:
+        text = (value if isinstance(value, str) else str(value)).encode("utf-8")
+        out.append(b"s" + _U32.pack(len(text)))
+        out.append(text)
+
+## answers that all bind the same variables to texts, as a table
+def _table(rows, out):
+    names = list(rows[0])
+    keys = rows[0].keys()
+    if not all(type(r) is dict and r.keys() == keys for r in rows):
+        return False
+    cells = [r[k] for r in rows for k in names]
+    if not all(type(c) is str for c in cells):
+        return False
+    out.append(b"a")
+    _texts(names, out)
+    _texts(cells, out)
+    return True
+
+def _texts(texts, out):
+    texts = [t.encode("utf-8") for t in texts]
+    sizes = array("I", map(len, texts))
+    if sys.byteorder == "big": sizes.byteswap()
+    out.append(_U32.pack(len(texts)))
+    out.append(sizes.tobytes())
+    out.append(b"".join(texts))
+
+def _read_texts(data, pos):
+    count, = _U32.unpack_from(data, pos)
+    pos += 4
+    sizes = array("I", data[pos:pos + 4 * count])
+    if sys.byteorder == "big": sizes.byteswap()
+    pos += 4 * count
+    end = pos + sum(sizes)
+    blob = str(data[pos:end], "utf-8")
+    if len(blob) != end - pos: ## not ascii: the sizes are not the ones of the text
+        offsets = list(accumulate(chain((pos,), sizes)))
+        return [str(data[a:b], "utf-8") for a, b in zip(offsets, offsets[1:])], end
+    offsets = list(accumulate(chain((0,), sizes)))
+    return [blob[a:b] for a, b in zip(offsets, offsets[1:])], end
+
+def encode(value):
+    out = []
+    _encode(value, out)
+    return b"".join(out)
+
+def _decode(data, pos):
+    tag = data[pos:pos + 1]
+    pos += 1
+    if tag == b"s":
+        size, = _U32.unpack_from(data, pos)
+        pos += 4
+        return str(data[pos:pos + size], "utf-8"), pos + size
+    if tag == b"a":
+        names, pos = _read_texts(data, pos)
+        cells, pos = _read_texts(data, pos)
+        rows = zip(*[iter(cells)] * len(names))
+        return [dict(zip(names, row)) for row in rows], pos
+    if tag == b"i":
+        return _I64.unpack_from(data, pos)[0], pos + 8
+    if tag == b"l":
+        size, = _U32.unpack_from(data, pos)
+        pos += 4
+        items = []
+        for _ in range(size):
+            item, pos = _decode(data, pos)
+            items.append(item)
+        return items, pos
+    if tag == b"m":
+        size, = _U32.unpack_from(data, pos)
+        pos += 4
+        items = {}
+        for _ in range(size):
+            key, pos = _decode(data, pos)
+            items[key], pos = _decode(data, pos)
+        return items, pos
+    if tag == b"d":
+        return _F64.unpack_from(data, pos)[0], pos + 8
+    if tag == b"n":
+        return None, pos
+    if tag == b"t":
+        return True, pos
+    if tag == b"f":
+        return False, pos
+    raise ProtocolError("unknown value tag %r" % tag)
+
+def decode(data, pos = 0):
+    value, pos = _decode(data, pos)
+    if pos != len(data):
+        raise ProtocolError("%d bytes after the value" % (len(data) - pos))
+    return value
+
+def frame(kind, rid, value):
+    body = _HEAD.pack(kind, rid) + encode(value)
+    return _FRAME.pack(len(body)) + body
+
+## the complete frames at the start of a buffer: (kind, request id, value) and
+## the size they take
+def read_frames(buffer):
+    frames = []
+    pos = 0
+    while len(buffer) - pos >= 4:
+        size, = _FRAME.unpack_from(buffer, pos)
+        if len(buffer) - pos - 4 < size:
+            break
+        kind, rid = _HEAD.unpack_from(buffer, pos + 4)
+        frames.append((kind, rid, decode(bytes(buffer[pos + 9:pos + 4 + size]))))
+        pos += 4 + size
+    return frames, pos
+
+## a query whose parameters (variables that are args of the query) are bound
+## to constants when it is run, it is read only once (see prepared.py)
+class Statement:
+    def __init__(self, text, params):
+        self.template = Template(text)
+        for name in params:
+            if name not in self.template.positions:
+                raise ProtocolError("%s is not a parameter of %s" % (name, text))
+        self.params = list(params)
+
+    ## the query with the parameters bound to the values (text constants or numbers)
+    def bind(self, values):
+        if len(values) != len(self.params):
+            raise ProtocolError("%d parameters, got %d values" % (len(self.params), len(values)))
+        return self.template.bind(dict(zip(self.params, values)))
+
+def answers(kb, expr, limit):
+    if not limit:
+        return kb.query(expr)
+    return list(kb.solve(expr, limit)) or ["No"]
+
+class Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        statements = {}
+        buffer = bytearray()
+        while True:
+            data = self.request.recv(1 << 16)
+            if not data:
+                return
+            buffer += data
+            frames, used = read_frames(buffer)
+            del buffer[:used]
+            ## the answers of the requests received together are sent together
+            out = [self.answer(statements, kind, rid, value) for kind, rid, value in frames]
+            if out:
+                self.request.sendall(b"".join(out))
+
+    def answer(self, statements, kind, rid, value):
+        kb = self.server.kb
+        try:
+            if kind == EXECUTE:
+                sid, values, limit = value
+                statement = statements.get(sid)
+                if statement is None:
+                    raise ProtocolError("no statement %r" % sid)
+                result = answers(kb, statement.bind(values), limit)
+            elif kind == QUERY:
+                text, limit = value
+                result = answers(kb, text, limit)
+            elif kind == PREPARE:
+                sid, text, params = value
+                statements[sid] = Statement(text, params)
+                result = None
+            elif kind == CLOSE:
+                statements.pop(value, None)
+                result = None
+            else:
+                raise ProtocolError("unknown request %d" % kind)
+        except Exception as e:
+            return frame(ERROR, rid, "%s: %s" % (type(e).__name__, e))
+        return frame(OK, rid, result)
+
+## a server answering the queries of local clients on the unix socket at `path`,
+## a thread per connection (clients keep their connections, see client.Pool)
+class IPCServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, kb, path):
+        if os.path.exists(path):
+            os.remove(path)
+        self.kb = kb
+        socketserver.UnixStreamServer.__init__(self, path, Handler)
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+def serve_unix(kb, path):
+    server = IPCServer(kb, path)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
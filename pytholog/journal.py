@@ -0,0 +1,248 @@
+import os
+import re
+import sys
+import json
+import zlib
+import threading
+from . import snapshot
+from .columns import ColumnStore
+from .external import SQLiteTable
+
+## append-only journal of the clauses asserted into and retracted from a knowledge
+## base, so persisting a change costs the change and not a rewrite of the knowledge
+## base. a knowledge base is restored from its last snapshot and the journal after it.
+##
+## every record is a line "<crc32> <op> <clause text>" with op "+" (assert) or
+## "-" (retract), or "<crc32> t <json>" for the rows of a table imported at once
+## (see table_record). a record torn by a crash fails its checksum, it and what
+## follows are dropped when the journal is opened again.
+##
+## records are written and synced to disk by policy:
+##   always  every change is written and synced before the call returns
+##   batch   group commit: changes are buffered and written and synced together,
+##           when batch_size are waiting or interval seconds after the first one
+##   never   every change is written, syncing is left to the OS
+##
+## compaction writes a new snapshot and starts a new journal. journals are numbered
+## by epoch: the current one is at `path`, the ones being compacted at path.<epoch>,
+## and a snapshot keeps the first epoch it does not include, so after a crash at any
+## point of a compaction the journals already in the snapshot are not replayed.
+
+HEADER = "%%pytholog journal %d\n"
+_HEADER = re.compile(r"%pytholog journal (\d+)\n")
+POLICIES = ("always", "batch", "never")
+
+class JournalError(ValueError):
+    pass
+
+def _record(op, text):
+    body = "%s %s" % (op, text)
+    return "%08x %s\n" % (zlib.crc32(body.encode("utf-8")), body)
+
+## the text of a "t" record: [predicate, [[args, terms], ...]] with the numbers of the
+## rows kept as numbers and their terms (the text they were read from, see tabular.py),
+## None for rows of text only
+def table_record(predicate, facts):
+    return json.dumps([predicate, [[f.lh.args, None if f.lh.terms is f.lh.args else f.lh.terms]
+                                   for f in facts]])
+
+def _table_rows(text):
+    predicate, rows = json.loads(text)
+    batch = []
+    for args, terms in rows:
+        args = tuple(sys.intern(a) if isinstance(a, str) else a for a in args)
+        if terms is not None:
+            terms = tuple(a if isinstance(a, str) else t for a, t in zip(args, terms))
+        batch.append((args, terms))
+    return predicate, [batch]
+
+## epoch and (op, clause) records of a journal file, and the size of its valid part
+def read(path):
+    records = []
+    with open(path, "rb") as f:
+        data = f.read()
+    end = data.find(b"\n") + 1
+    header = _HEADER.fullmatch(data[:end].decode("utf-8", "replace"))
+    if header is None:
+        raise JournalError("%s is not a pytholog journal" % path)
+    while end < len(data):
+        stop = data.find(b"\n", end)
+        if stop < 0: break ## torn last record
+        line = data[end:stop]
+        crc, _, body = line.partition(b" ")
+        if crc != b"%08x" % zlib.crc32(body):
+            break
+        op, _, text = body.decode("utf-8").partition(" ")
+        records.append((op, text))
+        end = stop + 1
+    return int(header.group(1)), records, end
+
+def _sync_dir(path):
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+class Journal:
+    def __init__(self, path, epoch, sync = "batch", batch_size = 1000, interval = 0.05):
+        if sync not in POLICIES:
+            raise JournalError("sync is one of %s, got %r" % (", ".join(POLICIES), sync))
+        self.path = path
+        self.epoch = epoch
+        self.sync = sync
+        self.batch_size = batch_size
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._pending = []
+        self._timer = None
+        self._file = self._open()
+
+    def _open(self):
+        exists = os.path.exists(self.path)
+        f = open(self.path, "a", encoding = "utf-8")
+        if not exists:
+            f.write(HEADER % self.epoch)
+            f.flush()
+            os.fsync(f.fileno())
+            _sync_dir(self.path)
+        return f
+
+    ## log the clause texts of a change (before it is applied to the knowledge base)
+    def append(self, op, texts):
+        with self._lock:
+            self._pending.extend(_record(op, t) for t in texts)
+            if self.sync != "batch" or len(self._pending) >= self.batch_size:
+                self._write()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _write(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending: return
+        self._file.write("".join(self._pending))
+        self._pending = []
+        self._file.flush()
+        if self.sync != "never":
+            os.fsync(self._file.fileno())
+
+    ## write and sync what is waiting for its group commit
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._write()
+                if self.sync == "never":
+                    os.fsync(self._file.fileno())
+
+    ## start the journal of the next epoch, the current one is kept as path.<epoch>
+    ## until the snapshot including it is written
+    def rotate(self):
+        with self._lock:
+            self._write()
+            self._file.close()
+            os.replace(self.path, "%s.%d" % (self.path, self.epoch))
+            self.epoch += 1
+            self._file = self._open()
+            return self.epoch
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __repr__(self):
+        return "Journal(%s, epoch %d, %s)" % (self.path, self.epoch, self.sync)
+
+def _rotated(path):
+    folder = os.path.dirname(os.path.abspath(path))
+    name = re.compile(re.escape(os.path.basename(path)) + r"\.(\d+)")
+    found = []
+    for f in os.listdir(folder):
+        m = name.fullmatch(f)
+        if m:
+            found.append((int(m.group(1)), os.path.join(folder, f)))
+    return sorted(found)
+
+## replay the records of a journal file into the knowledge base (not journaled again)
+def _replay(kb, records):
+    added = []
+    for op, text in records:
+        if op == "+":
+            added.append(text)
+            continue
+        if added:
+            kb.add_kn(added)
+            added = []
+        if op == "t":
+            kb._load_rows(*_table_rows(text))
+        else:
+            kb.retract(text)
+    if added:
+        kb.add_kn(added)
+
+## replay the journals after the snapshot the knowledge base was loaded from
+## (its epoch) and open the current one for the next changes
+def open_journal(kb, path, sync = "batch", batch_size = 1000, interval = 0.05):
+    base = kb._journal_epoch
+    epoch = base
+    for e, rotated in _rotated(path):
+        if e < base: ## already in the snapshot
+            os.remove(rotated)
+            continue
+        _, records, _ = read(rotated)
+        _replay(kb, records)
+        epoch = e + 1
+    if os.path.exists(path):
+        epoch, records, end = read(path)
+        if epoch < base:
+            raise JournalError("%s (epoch %d) is older than the snapshot (epoch %d)" % (path, epoch, base))
+        _replay(kb, records)
+        if end < os.path.getsize(path):
+            os.truncate(path, end) ## drop a torn record
+    return Journal(path, epoch, sync, batch_size, interval)
+
+## the state of the knowledge base when a compaction starts, written in the background
+## (stores and tables are read-only, the snapshot keeps where they are attached)
+class _Frozen:
+    def __init__(self, kb):
+        self.name = kb.name
+        self._databases = dict(kb._databases)
+        self.db = {pred: {"facts": _frozen(bucket["facts"]), "rules": bucket["rules"]}
+                   for pred, bucket in kb.db.items()}
+
+def _frozen(facts):
+    return facts if isinstance(facts, (ColumnStore, SQLiteTable)) else list(facts)
+
+## write a snapshot of the knowledge base and drop the journals it includes.
+## the knowledge base is copied (the clause lists, not the clauses) before returning,
+## the snapshot is written in a thread when background is true (it is returned)
+def compact(kb, path, background = True):
+    journal = kb.journal
+    ## no change is logged in the old journal and applied after the copy, or applied
+    ## before the copy and logged in the new journal too
+    with kb._writing:
+        epoch = journal.rotate()
+        frozen = _Frozen(kb)
+    def write():
+        tmp = path + ".tmp"
+        snapshot.save(frozen, tmp, epoch)
+        with open(tmp, "rb+") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        _sync_dir(path)
+        for e, rotated in _rotated(journal.path):
+            if e < epoch:
+                os.remove(rotated)
+    if not background:
+        write()
+        return None
+    thread = threading.Thread(target = write, name = "pytholog-compaction")
+    thread.start()
+    return thread
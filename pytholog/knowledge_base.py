@@ -1,7 +1,22 @@
-from .util import term_checker, get_path, prob_parser, pl_read
+from .util import term_checker, get_path, prob_parser, paused_gc
 from .fact import Fact
+from .reader import read_clauses, text_stream
+from . import snapshot, journal, lazy
+from .metrics import Metrics
+from .prepared import PreparedQuery
+from .shapes import shaped
+from time import perf_counter
+from .columns import ColumnStore, StoreError, write_store
+from .external import SQLiteTable
+from .tabular import csv_batches, frame_batches
+import sqlite3
+import threading
+from collections import Counter
+import sys
+import os
+from more_itertools import chunked
+from itertools import islice
 from .expr import Expr
-from .goal import Goal
 from .unify import unify
 from functools import wraps #, lru_cache
 from .pq import SearchQueue, FactHeap
@@ -22,38 +37,120 @@ class KnowledgeBase(object):
         KnowledgeBase.__id += 1
         self.name = name
         self._cache = {}
+        self._databases = {}
+        self._plans = {}  ## rules compiled to SQL (see sqlplan.py)
+        self._shapes = {}  ## plans of the queries by their shape (see shapes.py)
+        self._callers = None  ## predicates calling each predicate in their rules (see _affected)
+        self.journal = None  ## changes are logged to it when it is open (see journal.py)
+        self._compaction = None
+        self._journal_epoch = 0  ## first journal epoch not in the snapshot it was loaded from
+        self.metrics = None  ## what the engine does, once enable_metrics() is called (see metrics.py)
+        self.max_loops = MAX_LOOPS  ## goals a search takes before it is aborted, None for no limit
+        self._version = 0  ## counts the changes, prepared queries choose their plan again after one
+        ## changes are logged and applied under it, a compaction rotates the journal and
+        ## copies the knowledge base under it, so a change is in the snapshot or the new journal
+        self._writing = threading.RLock()
     
     ## the main function that adds new entries or append existing ones
-    ## it creates "facts", "goals" and "terms" buckets for each predicate
+    ## it creates a "facts" bucket for each predicate (facts and rules sorted for
+    ## binary search) and counts its "rules" so queries know if they need the search.
+    ## the clauses are added to their buckets in bulk (see FactHeap). a batch is
+    ## parsed and checked whole before anything is changed, so a bad clause adds none
     def add_kn(self, kn):
+        kn = [i if isinstance(i, Fact) else Fact(i) for i in kn]
+        added = {}
         for i in kn:
-            i = Fact(i)
-            ## rhs are stored as Expr here we change class to Goal
-            g = [Goal(Fact(r.to_string())) for r in i.rhs]
-            if i.lh.predicate in self.db:
-                self.db[i.lh.predicate]["facts"].push(i)
-                self.db[i.lh.predicate]["terms"].push(i.terms)
-                self.db[i.lh.predicate]["goals"].push(g)
-                #self.db[i.lh.predicate]["terms"].append(i.terms)
-            else:
-                self.db[i.lh.predicate] = {}
-                self.db[i.lh.predicate]["facts"] = FactHeap()
-                self.db[i.lh.predicate]["facts"].push(i)
-                self.db[i.lh.predicate]["goals"] = FactHeap()
-                self.db[i.lh.predicate]["goals"].push(g)
-                self.db[i.lh.predicate]["terms"] = FactHeap()
-                self.db[i.lh.predicate]["terms"].push(i.terms)
-                #self.db[i.lh.predicate]["goals"] = [g]
-                #self.db[i.lh.predicate]["terms"] = [i.terms]
+            added.setdefault(i.lh.predicate, []).append(i)
+        with self._writing:
+            for pred in added:
+                if pred in self.db and not isinstance(self.db[pred]["facts"], FactHeap):
+                    raise TypeError("%s is read-only (%r)" % (pred, self.db[pred]["facts"]))
+            if self.journal is not None:
+                self.journal.append("+", [i.fact for i in kn])
+            rules = False
+            for pred, facts in added.items():
+                if pred not in self.db:
+                    self.db[pred] = {"facts": FactHeap(), "rules": 0}
+                count = sum(1 for i in facts if i.rhs)
+                self.db[pred]["rules"] += count
+                rules = rules or count > 0
+                self.db[pred]["facts"].extend(facts)
+            self._invalidate(added, rules)
             
     def __call__(self, args):
         self.add_kn(args)
 
+    ## remove the first clause with the same text, True if there was one.
+    ## only a clause that was removed is journaled
+    def retract(self, clause):
+        clause = Fact(clause)
+        with self._writing:
+            bucket = self.db.get(clause.lh.predicate)
+            if bucket is None:
+                return False
+            if not isinstance(bucket["facts"], FactHeap):
+                raise TypeError("%s is read-only (%r)" % (clause.lh.predicate, bucket["facts"]))
+            if not bucket["facts"].remove(clause):
+                return False
+            if self.journal is not None:
+                self.journal.append("-", [clause.fact])
+            if clause.rhs:
+                bucket["rules"] -= 1
+            self._invalidate([clause.lh.predicate], bool(clause.rhs))
+        return True
+
     ## query method will only call rule_query which will call the decorators chain
-    ## it is only to be user intuitive readable method                                      
+    ## it is only to be user intuitive readable method.
+    ## the query is an Expr or its text; the queries of the same shape (the same but
+    ## for their constants) share their compiled goal and plan (see shapes.py)
     def query(self, expr, cut = False, show_path = False):
-        return rule_query(self, expr, cut, show_path)
+        if show_path:
+            expr = Expr(expr) if isinstance(expr, str) else expr
+            plan = columns = None
+        else:
+            expr, plan, columns = shaped(self, expr)
+        metrics = self.metrics
+        if metrics is None:
+            return self._answers(expr, plan, columns, cut, show_path)
+        start = perf_counter()
+        try:
+            return self._answers(expr, plan, columns, cut, show_path)
+        finally:
+            metrics.observe(expr.predicate, perf_counter() - start)
+
+    def _answers(self, expr, plan, columns, cut, show_path):
+        if plan is None:
+            return rule_query(self, expr, cut, show_path)
+        return cached(self, expr, lambda: planned_query(self, expr, plan, cut, columns))
+
+    ## the answers of a query as they are found, at most limit of them: the search
+    ## only goes as far as they are read (see solve in querizer.py).
+    ## a query text is compiled by its shape, like the ones of query
+    def solve(self, expr, limit = None):
+        if isinstance(expr, str):
+            expr = shaped(self, expr)[0]
+        return islice(solve(self, expr), limit)
         
+    ## record what the engine does (calls, inferences, cache hits, latency...), it
+    ## costs a little on every query so it is off until it is enabled
+    def enable_metrics(self, enabled = True):
+        if not enabled:
+            self.metrics = None
+        elif self.metrics is None:
+            self.metrics = Metrics()
+        return self.metrics
+
+    ## the metrics recorded since they were enabled (see metrics.py), {} when they are off
+    def stats(self):
+        if self.metrics is None:
+            return {}
+        return self.metrics.snapshot()
+
+    ## a query read once and run with its parameters (the variables that are its
+    ## args) bound: prepare("path(X, Y, P)").execute(X = "seattle") (see prepared.py)
+    def prepare(self, query):
+        return PreparedQuery(self, query)
+
     def rule_search(self, expr):
         if expr.predicate not in self.db:
             return "Rule does not exist!"
@@ -65,18 +162,270 @@ class KnowledgeBase(object):
                 res.append(rule_f["facts"][f])
         return res
 
-    def from_file(self, file):
-        pl_read(self, file)
+    ## consult a prolog file (it can be gzip'd): clauses are read as a stream and
+    ## added batch_size at a time, progress(clauses, bytes) is called after each batch.
+    ## lazy consults of plain files read a predicate the first time it is used (see
+    ## lazy.py), they are not journaled so a journaled knowledge base reads it all
+    def from_file(self, file, progress = None, batch_size = 10000, lazy = False):
+        if lazy and self.journal is None:
+            with open(file, "rb") as raw:
+                compressed = raw.peek(2)[:2] == b"\x1f\x8b"
+            if not compressed:
+                return self._consult_lazy(file, progress, batch_size)
+        count = 0
+        with paused_gc(), open(file, "rb") as raw, text_stream(raw) as stream:
+            for batch in chunked(read_clauses(stream), batch_size):
+                self.add_kn(batch)
+                count += len(batch)
+                if progress is not None:
+                    progress(count, raw.tell())
+        return count
+
+    def _consult_lazy(self, file, progress, batch_size):
+        index = lazy.read_index(file)
+        count = 0
+        if index is None: ## first consult: read it all and index it
+            indexer = lazy.Indexer(file)
+            with paused_gc(), open(file, "rb") as raw:
+                for batch in chunked(indexer.clauses(raw), batch_size):
+                    self.add_kn(batch)
+                    count += len(batch)
+                    if progress is not None:
+                        progress(count, raw.tell())
+            indexer.write()
+            return count
+        for pred, entry in index.items():
+            if pred in self.db:
+                self.db[pred]["facts"].extend(lazy.read_ranges(file, entry["ranges"]))
+                self.db[pred]["rules"] += entry["rules"]
+            else:
+                self.db[pred] = {"facts": lazy.LazyFacts(file, entry["ranges"], entry["calls"]),
+                                 "rules": entry["rules"]}
+            count += entry["clauses"]
+        self._invalidate(index, True)
+        if progress is not None:
+            progress(count, os.path.getsize(file))
+        return count
+
+    ## sort in the facts added in bulk and read the lazy predicates now rather than
+    ## on their first query, e.g. before the knowledge base is shared by forked workers
+    def materialize(self):
+        for bucket in self.db.values():
+            if isinstance(bucket["facts"], FactHeap):
+                bucket["facts"].sort()
+
+    ## a copy of the knowledge base with clauses removed (the first ones with the same
+    ## text) and added, this one is left as it is so queries running on it end on it.
+    ## the predicates that do not change keep their buckets, already sorted and shared
+    ## with this one, and their cached answers and plans (see registry.py)
+    def revised(self, removed = (), added = ()):
+        if self.journal is not None:
+            raise journal.JournalError("%s is journaled, its changes are made in place" % self.name)
+        changed = {}
+        for i in removed:
+            i = i if isinstance(i, Fact) else Fact(i)
+            changed.setdefault(i.lh.predicate, ([], []))[0].append(i)
+        for i in added:
+            i = i if isinstance(i, Fact) else Fact(i)
+            changed.setdefault(i.lh.predicate, ([], []))[1].append(i)
+        for pred in changed:
+            if pred in self.db and not isinstance(self.db[pred]["facts"], FactHeap):
+                raise TypeError("%s is read-only (%r)" % (pred, self.db[pred]["facts"]))
+        kb = type(self)(self.name)
+        kb.db = {pred: dict(bucket) for pred, bucket in self.db.items()}
+        kb._databases = self._databases
+        kb.metrics = self.metrics
+        kb.max_loops = self.max_loops
+        rules = False
+        for pred, (gone, new) in changed.items():
+            kept = []
+            if pred in self.db:
+                old = self.db[pred]["facts"]
+                drop = Counter(i.fact for i in gone)
+                for j in range(len(old)):
+                    if drop[old[j].fact] > 0:
+                        drop[old[j].fact] -= 1
+                    else:
+                        kept.append(old[j])
+            if not kept and not new:
+                kb.db.pop(pred, None)
+            else:
+                facts = FactHeap()
+                facts.load(kept)
+                facts.extend(new)
+                kb.db[pred] = {"facts": facts, "rules": sum(1 for i in kept + new if i.rhs)}
+            rules = rules or any(i.rhs for i in gone + new)
+        affected = self._affected(changed)
+        ## (listed first: queries still running on this one can cache answers meanwhile)
+        kb._cache = {key: value for key, value in list(self._cache.items())
+                     if key.partition("(")[0] not in affected}
+        kb._plans = {pred: plan for pred, plan in list(self._plans.items()) if pred not in affected}
+        kb._callers = None if rules else self._callers
+        return kb
+
+    ## tables imported as ground facts of a predicate without reading clause text:
+    ## the values of a row are its args, numbers as python numbers (see tabular.py).
+    ## they return the number of facts added
+    def load_csv(self, predicate, path, columns = None, header = True, delimiter = ","):
+        return self._load_rows(predicate, csv_batches(path, columns, header, delimiter))
+
+    def load_dataframe(self, predicate, df, columns = None):
+        return self._load_rows(predicate, frame_batches(df, columns))
+
+    def _load_rows(self, predicate, batches):
+        predicate = sys.intern(predicate)
+        with paused_gc():
+            ## a table that cannot be read whole adds none of its rows
+            rows = []
+            for batch in batches:
+                rows.extend([Fact.from_row(predicate, args, terms) for args, terms in batch])
+            with self._writing:
+                if predicate in self.db and not isinstance(self.db[predicate]["facts"], FactHeap):
+                    raise TypeError("%s is read-only (%r)" % (predicate, self.db[predicate]["facts"]))
+                if self.journal is not None:
+                    self.journal.append("t", [journal.table_record(predicate, rows)])
+                if predicate not in self.db:
+                    self.db[predicate] = {"facts": FactHeap(), "rules": 0}
+                facts = self.db[predicate]["facts"]
+                facts.extend(rows)
+                facts.sort()
+                self._invalidate([predicate])
+        return len(rows)
+
+    ## binary snapshot of the compiled clauses (see snapshot.py), loading it
+    ## is much faster than reading the prolog text again
+    def save_snapshot(self, path):
+        snapshot.save(self, path)
+
+    @classmethod
+    def load_snapshot(cls, path):
+        with paused_gc():
+            return snapshot.load(cls(), path)
+
+    ## journaling (see journal.py): the journal after the snapshot the knowledge base
+    ## was loaded from is replayed, then the clauses added and retracted are logged
+    def open_journal(self, path, sync = "batch", batch_size = 1000, interval = 0.05):
+        self.journal = None
+        self.journal = journal.open_journal(self, path, sync, batch_size, interval)
+        return self.journal
+
+    ## a knowledge base from its snapshot (if there is one) and its journal
+    @classmethod
+    def restore(cls, snapshot_path, journal_path, name = None, **options):
+        if os.path.exists(snapshot_path):
+            kb = cls.load_snapshot(snapshot_path)
+            if name: kb.name = name
+        else:
+            kb = cls(name)
+        kb.open_journal(journal_path, **options)
+        return kb
+
+    ## write a new snapshot and start a new journal, in the background by default
+    def compact(self, snapshot_path, background = True):
+        if self.journal is None:
+            raise journal.JournalError("%s has no journal to compact" % self.name)
+        if self._compaction is not None:
+            self._compaction.join()
+        self._compaction = journal.compact(self, snapshot_path, background)
+        return self._compaction
+
+    ## column stores (see columns.py): the ground facts of a predicate in a
+    ## memory-mapped file, queried in place instead of being loaded
+    def save_store(self, predicate, path):
+        bucket = self.db.get(predicate)
+        if bucket is None:
+            raise StoreError("unknown predicate %s" % predicate)
+        if bucket["rules"]:
+            raise StoreError("%s has rules, only ground facts can be stored" % predicate)
+        facts = bucket["facts"]
+        def rows():
+            for i in range(len(facts)):
+                row = facts[i].row()
+                if row is None:
+                    raise StoreError("%s is not a ground fact" % facts[i].to_string())
+                yield row
+        write_store(path, predicate, rows())
+
+    ## the predicate of the store, its facts in this knowledge base are replaced
+    def attach_store(self, path):
+        store = ColumnStore(path)
+        self.db[store.predicate] = {"facts": store, "rules": 0}
+        self.clear_cache()
+        return store.predicate
+
+    ## an external predicate answered from a SQLite table (see external.py):
+    ## its args are the columns (all of them by default), `index` creates an
+    ## index on each of them. the connection is shared by the tables of a database
+    def external(self, predicate, arity, path, table, columns = None, index = False):
+        self.db[predicate] = {"facts": SQLiteTable.table(predicate, arity, self._database(path),
+                                                         table, columns, index),
+                              "rules": 0}
+        self.clear_cache()
+
+    ## the connection to a database, shared by its tables
+    def _database(self, path):
+        if path not in self._databases:
+            self._databases[path] = sqlite3.connect(path, check_same_thread = False)
+        return self._databases[path]
 
     def __str__(self):
         return "KnowledgeBase: " + self.name
         
     def clear_cache(self):
+        self._version += 1
         self._cache.clear()
+        self._plans.clear()
+        self._shapes.clear()
+        self._callers = None
+
+    ## the cached answers and plans of the changed predicates, and of the ones whose
+    ## rules call them, are dropped; the others stay. `rules` tells if rules changed
+    def _invalidate(self, predicates, rules = False):
+        self._version += 1
+        if rules:
+            self._callers = None
+        if not self._cache and not self._plans and not self._shapes:
+            return
+        affected = self._affected(predicates)
+        for key in list(self._cache):
+            if key.partition("(")[0] in affected:
+                self._cache.pop(key, None)
+        for pred in affected:
+            self._plans.pop(pred, None)
+        for key, shape in list(self._shapes.items()):
+            if key.partition("(")[0] in affected:
+                shape.plan = None
+
+    ## the predicates and the ones calling them in their rules, directly or not.
+    ## the lazy predicates are not read for it, the calls of their rules are in the index
+    def _affected(self, predicates):
+        if self._callers is None:
+            callers = {}
+            for pred, bucket in self.db.items():
+                if not bucket["rules"]: continue
+                for called in _rule_calls(bucket["facts"]):
+                    callers.setdefault(called, set()).add(pred)
+            self._callers = callers
+        affected = set(predicates)
+        todo = list(affected)
+        while todo:
+            for caller in self._callers.get(todo.pop(), ()):
+                if caller not in affected:
+                    affected.add(caller)
+                    todo.append(caller)
+        return affected
 
     __repr__ = __str__
     
 
+## the predicates the rules of a bucket call
+def _rule_calls(facts):
+    calls = getattr(facts, "calls", None)  ## (a lazy bucket, until it is read)
+    if calls is not None:
+        return calls
+    return {goal.predicate for i in range(len(facts)) for goal in facts[i].rhs}
+
+
 class DeprecationHelper(object):
     def __init__(self, new_target):
         self.new_target = new_target
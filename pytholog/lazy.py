@@ -0,0 +1,137 @@
+import io
+import os
+import json
+from .fact import Fact
+from .pq import FactHeap, _merging
+from .reader import read_clauses, clause_spans
+from .util import paused_gc
+
+## lazy consulting: a prolog file is indexed once (a sidecar <file>.idx with the
+## byte ranges of the clauses of each predicate, its rules count and the predicates
+## its rules call, see KnowledgeBase._affected) and later
+## consults only register the predicates. the clauses of a predicate are read from
+## the file the first time it is queried, so the first query does not wait for
+## the whole file. the index is rebuilt when the size or mtime of the file change.
+##
+## consecutive clauses of a predicate are one range, so the index size follows
+## the number of predicates (and how they are spread), not the number of clauses.
+
+INDEX_VERSION = 2
+
+def index_path(path):
+    return path + ".idx"
+
+def _stamp(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+## the index of a file if it is the one of its current content, otherwise None
+def read_index(path):
+    try:
+        with open(index_path(path)) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if index.get("version") != INDEX_VERSION or index.get("file") != _stamp(path):
+        return None
+    return index["predicates"]
+
+## the clauses of a file with the index built along: yields them in batches of
+## (clause text, predicate) and writes the index when the file has been read
+class Indexer:
+    def __init__(self, path):
+        self.path = path
+        self.predicates = {}
+        self._calls = {}
+        self._last = None
+
+    def clauses(self, raw):
+        for text, start, end in clause_spans(raw):
+            fact = Fact(text)
+            pred = fact.lh.predicate
+            entry = self.predicates.get(pred)
+            if entry is None:
+                entry = self.predicates[pred] = {"clauses": 0, "rules": 0, "ranges": []}
+            if self._last == pred:
+                entry["ranges"][-1][1] = end
+            else:
+                entry["ranges"].append([start, end])
+            entry["clauses"] += 1
+            entry["rules"] += bool(fact.rhs)
+            if fact.rhs:
+                self._calls.setdefault(pred, set()).update(goal.predicate for goal in fact.rhs)
+            self._last = pred
+            yield fact
+
+    def write(self):
+        for pred, entry in self.predicates.items():
+            entry["calls"] = sorted(self._calls.get(pred, ()))
+        index = {"version": INDEX_VERSION, "file": _stamp(self.path), "predicates": self.predicates}
+        tmp = index_path(self.path) + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp, index_path(self.path))
+
+## the clauses in byte ranges of a file
+def read_ranges(path, ranges):
+    texts = []
+    with open(path, "rb") as f:
+        for start, end in ranges:
+            f.seek(start)
+            texts.append(f.read(end - start).decode("utf-8"))
+    texts.append("")
+    return [Fact(c) for c in read_clauses(io.StringIO(".\n".join(texts)))]
+
+## the facts of a predicate not read yet: the first use reads its clauses from the
+## file, then it is a plain FactHeap (its class is switched so later uses cost nothing).
+## concurrent first uses read it once (the methods call LazyFacts.materialize as a
+## thread may get here after another one switched the class)
+class LazyFacts(FactHeap):
+    def __init__(self, path, ranges, calls = ()):
+        FactHeap.__init__(self)
+        self.path = path
+        self.ranges = ranges
+        self.calls = calls  ## the predicates its rules call, known without reading them
+
+    def materialize(self):
+        with _merging:
+            if self.__class__ is not LazyFacts: return
+            with paused_gc():
+                self._pending.extend(read_ranges(self.path, self.ranges))
+            del self.path, self.ranges, self.calls
+            self.__class__ = FactHeap
+
+    def push(self, item):
+        LazyFacts.materialize(self)
+        self.push(item)
+
+    def extend(self, items):
+        LazyFacts.materialize(self)
+        self.extend(items)
+
+    def load(self, items):
+        LazyFacts.materialize(self)
+        self.load(items)
+
+    def remove(self, item):
+        LazyFacts.materialize(self)
+        return self.remove(item)
+
+    def sort(self):
+        LazyFacts.materialize(self)
+        self.sort()
+
+    def __getitem__(self, item):
+        LazyFacts.materialize(self)
+        return self[item]
+
+    def __len__(self):
+        LazyFacts.materialize(self)
+        return len(self)
+
+    def probe(self, bound):
+        LazyFacts.materialize(self)
+        return self.probe(bound)
+
+    def __repr__(self):
+        return "LazyFacts(%s, %d ranges)" % (self.path, len(self.ranges))
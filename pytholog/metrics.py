@@ -0,0 +1,122 @@
+import threading
+from bisect import bisect_left
+from collections import Counter
+
+## what the engine does, per knowledge base: kb.enable_metrics() starts recording,
+## kb.stats() reads it (prometheus() renders it as text for a /metrics endpoint).
+## the engine counts in local variables and adds them here once per query or search,
+## so recording costs a lock per query; when it is off (kb.metrics is None) the
+## engine only checks for it once per query.
+##
+##   queries               kb.query calls, with their latency (seconds) in a histogram
+##   calls                 per predicate: its queries and the goals searched on it
+##   inferences            goals searched and facts tried
+##   unifications          clause heads and facts unified with a goal, and
+##   unification_failures  the ones that did not unify
+##   cache_hits / misses   kb.query answers found in the cache or searched for
+##   index_probes / scans  fact lookups by their first arg or store selections, and
+##                         the ones going through every clause of a predicate
+##   searches_aborted      searches stopped at the loop limit (see search)
+##   peak_queue_depth      the most goals waiting in a search queue
+
+COUNTERS = ("queries", "inferences", "unifications", "unification_failures",
+            "cache_hits", "cache_misses", "index_probes", "scans", "searches_aborted")
+
+## upper bounds (seconds) of the latency buckets
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+           0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Metrics:
+    def __init__(self, buckets = BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = dict.fromkeys(COUNTERS, 0)
+            self.calls = Counter()
+            self.latency = [0] * (len(self.buckets) + 1)  ## the last one is +Inf
+            self.latency_sum = 0.0
+            self.peak_queue_depth = 0
+
+    ## add the counts of a query or search: name -> count, predicate -> calls
+    def add(self, counts, calls = None, queue_depth = 0):
+        with self._lock:
+            for name, n in counts.items():
+                self.counters[name] += n
+            if calls:
+                self.calls.update(calls)
+            if queue_depth > self.peak_queue_depth:
+                self.peak_queue_depth = queue_depth
+
+    ## a kb.query on predicate that took `seconds`
+    def observe(self, predicate, seconds):
+        with self._lock:
+            self.counters["queries"] += 1
+            self.calls[predicate] += 1
+            self.latency[bisect_left(self.buckets, seconds)] += 1
+            self.latency_sum += seconds
+
+    def snapshot(self):
+        with self._lock:
+            cumulative, count = [], 0
+            for bound, n in zip(self.buckets + (float("inf"),), self.latency):
+                count += n
+                cumulative.append((bound, count))
+            stats = dict(self.counters)
+            stats["calls"] = dict(self.calls)
+            stats["latency"] = {"buckets": cumulative, "sum": self.latency_sum, "count": count}
+            stats["peak_queue_depth"] = self.peak_queue_depth
+            return stats
+
+_HELP = {
+    "queries": "Queries answered.",
+    "inferences": "Goals searched and facts tried.",
+    "unifications": "Clause heads and facts unified with a goal.",
+    "unification_failures": "Unifications that failed.",
+    "cache_hits": "Queries answered from the cache.",
+    "cache_misses": "Queries searched for.",
+    "index_probes": "Lookups by an index.",
+    "scans": "Lookups through every clause of a predicate.",
+    "searches_aborted": "Searches stopped at the loop limit.",
+}
+
+def _labels(labels):
+    if not labels:
+        return ""
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{%s}" % ",".join('%s="%s"' % (k, escape(v)) for k, v in labels.items())
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+## stats (from kb.stats()) in the prometheus text format, every sample labelled
+## with `labels` (e.g. {"kb": name}). gauges and extra series can be added as
+## (name, help, value) in `gauges`
+def prometheus(stats, labels = None, prefix = "pytholog", gauges = ()):
+    labels = dict(labels or {})
+    lines = []
+    def family(name, kind, help):
+        lines.append("# HELP %s_%s %s" % (prefix, name, help))
+        lines.append("# TYPE %s_%s %s" % (prefix, name, kind))
+    for name in COUNTERS:
+        family(name + "_total", "counter", _HELP[name])
+        lines.append("%s_%s_total%s %d" % (prefix, name, _labels(labels), stats[name]))
+    family("calls_total", "counter", "Queries and goals per predicate.")
+    for pred, n in sorted(stats["calls"].items()):
+        lines.append("%s_calls_total%s %d" % (prefix, _labels(dict(labels, predicate = pred or "_")), n))
+    family("query_seconds", "histogram", "Latency of the queries.")
+    latency = stats["latency"]
+    for bound, n in latency["buckets"]:
+        lines.append("%s_query_seconds_bucket%s %d" % (prefix, _labels(dict(labels, le = _number(bound))), n))
+    lines.append("%s_query_seconds_sum%s %s" % (prefix, _labels(labels), _number(latency["sum"])))
+    lines.append("%s_query_seconds_count%s %d" % (prefix, _labels(labels), latency["count"]))
+    for name, help, value in (("peak_queue_depth", "The most goals waiting in a search.",
+                               stats["peak_queue_depth"]),) + tuple(gauges):
+        family(name, "gauge", help)
+        lines.append("%s_%s%s %s" % (prefix, name, _labels(labels), _number(value)))
+    return "\n".join(lines) + "\n"
@@ -1,5 +1,7 @@
 from collections import deque 
-from bisect import insort
+from itertools import chain
+import threading
+from .util import bisect_key
 
 ## the queue object we will use to store goals we need to search
 ## FIFO (First In First Out)
@@ -19,22 +21,124 @@ class SearchQueue():
         self._container.append(expr)
     def pop(self):
         return self._container.pop()  # LIFO pop: depth-first search
+    def __len__(self):
+        return len(self._container)
     def __repr__(self):
         return repr(self._container)
         
-## to store facts and sort them for binary search in queries 
+## to store facts and sort them for binary search in queries.
+## facts added in bulk are only appended, they are sorted in on the next read
+## so loading n facts costs one sort instead of n sorted insertions
 class FactHeap():
     def __init__(self):
         self._container = []
+        self._pending = []
+        self._indexes = None  ## (the sorted facts, column -> index), see probe
 
     def push(self, item):
-        insort(self._container, item) # in by sort
+        if self._pending: self._merge()
+        self._indexes = None
+        self._container.insert(bisect_key(self._container, _sort_key(item), _sort_key, right = True), item)
+
+    def extend(self, items):
+        self._pending.extend(items)
+
+    ## facts that are already sorted (a snapshot)
+    def load(self, items):
+        self._indexes = None
+        self._container.extend(items)
+
+    ## remove the first fact with the same clause text, True if there was one
+    def remove(self, item):
+        if self._pending: self._merge()
+        key = _sort_key(item)
+        i = bisect_key(self._container, key, _sort_key)
+        while i < len(self._container) and _sort_key(self._container[i]) == key:
+            if self._container[i].fact == item.fact:
+                self._indexes = None
+                del self._container[i]
+                return True
+            i += 1
+        return False
+
+    ## sort the facts added in bulk now rather than on the next read
+    ## (bulk loads do it while the garbage collector is paused)
+    def sort(self):
+        if self._pending: self._merge()
+
+    ## a stable sort keeps facts with the same key in the order they were added.
+    ## threads reading while a merge is done wait for it (see _merging).
+    ## a few facts (single inserts) are put in place, sorting would cost a key per fact
+    def _merge(self):
+        with _merging:
+            if not self._pending: return
+            self._indexes = None
+            if len(self._pending) <= SMALL_MERGE:
+                for item in self._pending:
+                    key = _sort_key(item)
+                    self._container.insert(bisect_key(self._container, key, _sort_key, right = True), item)
+            else:
+                container = self._container + self._pending
+                container.sort(key = _sort_key)
+                self._container = container
+            self._pending = []
         
     def __getitem__(self, item):
-         return self._container[item]
+        if self._pending: self._merge()
+        return self._container[item]
+
+    ## the facts that may match args bound to text constants, [(column, text)...]:
+    ## by the index of the column with the fewest of them, the facts whose arg is
+    ## the text and the ones whose arg is not a text (a variable, a number or a
+    ## list, unifying tells), in their order (all of them when that is most). the
+    ## index of a column is built the first time it is probed and dropped when the
+    ## facts change
+    def probe(self, bound):
+        if self._pending: self._merge()
+        container, indexes = self._container, self._indexes
+        if indexes is None or indexes[0] is not container:
+            indexes = self._indexes = (container, {})
+        best = None
+        for column, key in bound:
+            index = indexes[1].get(column)
+            if index is None:
+                index = indexes[1][column] = _column_index(container, column)
+            found, other = index[0].get(key, ()), index[1]
+            if best is None or len(found) + len(other) < len(best[0]) + len(best[1]):
+                best = (found, other)
+        if not best[1]:
+            return [container[i] for i in best[0]]
+        if 2 * (len(best[0]) + len(best[1])) > len(container):
+            return container  ## most of them, reading them through costs less
+        return [container[i] for i in sorted(chain(*best))]
     
     def __len__(self):
-         return len(self._container)
+        return len(self._container) + len(self._pending)
     
     def __repr__(self):
-        return repr(self._container)
\ No newline at end of file
+        if self._pending: self._merge()
+        return repr(self._container)
+
+## merges (and lazy reads, see lazy.py) of concurrent readers are done one at a
+## time: the sorted facts are swapped in before the pending ones are dropped, so a
+## reader sees either facts still pending (and waits here) or all of them sorted
+_merging = threading.RLock()
+
+SMALL_MERGE = 16
+
+## positions of the facts by their text arg at column, and the ones whose arg
+## there is not a text (facts with fewer args never match, they are left out)
+def _column_index(facts, column):
+    found, other = {}, []
+    for i, fact in enumerate(facts):
+        args = fact.lh.args
+        if column >= len(args): continue
+        if isinstance(args[column], str):
+            found.setdefault(args[column], []).append(i)
+        else:
+            other.append(i)
+    return found, other
+
+## facts are sorted on their first term (see Fact.__lt__)
+def _sort_key(fact):
+    return fact.lh.terms[:1]
@@ -0,0 +1,91 @@
+from itertools import islice
+from time import perf_counter
+from .expr import Expr
+from .util import is_variable
+from .term import term_var_indices
+from .querizer import cached, plan_query, planned_query, solve
+
+## queries prepared once and run many times with their parameters bound (see
+## KnowledgeBase.prepare). the query is read once: running it binds the
+## parameters in its compiled args, so nothing is parsed, and the way its
+## answers are found (facts only, one SQL query or the search, see plan_query)
+## is chosen once and again only when the knowledge base changes.
+## the parameters are the variables that are args of the query, the ones left
+## unbound when it is run are answered like the variables of any query.
+
+class BindError(ValueError):
+    pass
+
+## a query read once, bound to values as many times as needed
+class Template:
+    def __init__(self, query):
+        self.expr = query if isinstance(query, Expr) else Expr(query)
+        if self.expr.arith is not None:
+            raise BindError("only queries on a predicate can be prepared")
+        ## a variable nested in an arg would stay unbound there, it is not a parameter
+        nested = set()
+        for a in self.expr.args:
+            if getattr(a, "name", None) is None:
+                nested |= {self.expr.varnames[v] for v in term_var_indices(a)}
+        self.positions = {}
+        for i, a in enumerate(self.expr.args):
+            name = getattr(a, "name", None)
+            if name is not None and name != "_" and name not in nested:
+                self.positions.setdefault(name, []).append(i)
+        self.params = tuple(self.positions)
+
+    ## the query with parameters bound to values (text constants or numbers)
+    def bind(self, values):
+        if not values:
+            return self.expr
+        bound = []
+        for name, value in values.items():
+            positions = self.positions.get(name)
+            if positions is None:
+                raise BindError("%s is not a parameter of %s" % (name, self.expr))
+            if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+                raise BindError("parameters are text constants or numbers, got %r" % (value,))
+            if isinstance(value, str) and is_variable(value):
+                raise BindError("%r would be read as a variable" % value)
+            bound.extend((i, str(value)) for i in positions)
+        return self.expr.replaced(bound)
+
+    def __repr__(self):
+        return "Template(%s)" % self.expr
+
+class PreparedQuery:
+    def __init__(self, kb, query):
+        self.kb = kb
+        self.template = Template(query)
+        self.params = self.template.params
+        self._plan()
+
+    def _plan(self):
+        self.version = self.kb._version
+        self.plan = plan_query(self.kb, self.template.expr.predicate)
+
+    ## the answers (like kb.query gives them, cached the same way) with the parameters
+    ## bound to the values, at most limit of them (see kb.solve) when it is given
+    def execute(self, limit = None, cut = False, **values):
+        expr = self.template.bind(values)
+        kb = self.kb
+        if limit:
+            return list(islice(solve(kb, expr), limit)) or ["No"]
+        if self.version != kb._version:
+            self._plan()
+        plan = self.plan
+        metrics = kb.metrics
+        if metrics is None:
+            return cached(kb, expr, lambda: planned_query(kb, expr, plan, cut))
+        start = perf_counter()
+        try:
+            return cached(kb, expr, lambda: planned_query(kb, expr, plan, cut))
+        finally:
+            metrics.observe(expr.predicate, perf_counter() - start)
+
+    ## the answers for each dict of values
+    def executemany(self, rows, limit = None, cut = False):
+        return [self.execute(limit, cut, **values) for values in rows]
+
+    def __repr__(self):
+        return "PreparedQuery(%s, %s, %s)" % (self.template.expr, ", ".join(self.params), self.plan[0])
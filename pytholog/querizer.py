@@ -2,54 +2,81 @@ from .util import term_checker, get_path, prob_parser, is_number, is_variable, a
 from .fact import Fact
 from .expr import Expr
 from .goal import Goal
-from .unify import unify
+from .unify import unify_args
+from .domain import Bindings
+from .term import Var, term_value
 from functools import wraps #, lru_cache
-from .pq import SearchQueue
+from .pq import SearchQueue, FactHeap
+from .columns import ColumnStore
+from .external import SQLiteTable
+from .sqlplan import sql_plan
 from .search_util import *
 # importing deepcopy 
 from copy import deepcopy
 
 
+## predicates whose rows are probed where they are stored (see store_matches)
+STORES = (ColumnStore, SQLiteTable)
+
+## the goals a search may take before it is aborted, the default of kb.max_loops.
+## tail calls run in constant memory (see child_assigned), so this only bounds the
+## time of a search: a countdown from 10^5 takes about 3 * 10^5 goals and runs with
+## kb.max_loops = None (no limit). a search that found answers before the limit ends
+## with them (e.g. the first answers of a query that has infinitely many)
+MAX_LOOPS = 10 ** 4
+
+## a search that reached kb.max_loops goals without an answer: whether it has one
+## is not known, so it is not answered No
+class SearchAborted(RuntimeError):
+    pass
+
 ## memory decorator which will be called first once .query() method is called
 ## it takes the Expr and checks in cache {} whether it exists or not
 def memory(querizer):
 
     @wraps(querizer)
     def memorize_query(kb, arg1, cut, show_path):
+        return cached(kb, arg1, lambda: querizer(kb, arg1, cut, show_path))
 
-        # canonicalize query to a lookup key
-        indx, look_up = term_checker(arg1)
+    return memorize_query
+
+## the answers of a query from the cache, compute() finds them when they are not
+## there yet (see memory, and prepared queries in prepared.py)
+def cached(kb, arg1, compute):
+    # canonicalize query to a lookup key
+    indx, look_up = term_checker(arg1)
+
+    # If we have cached results, deep-copy them so we never mutate cache entries
+    hit = look_up in kb._cache
+    if kb.metrics is not None:
+        kb.metrics.add({"cache_hits": 1} if hit else {"cache_misses": 1})
+    if hit:
+        entry = deepcopy(kb._cache[look_up])
+    else:
+        # compute results and store a deep-copy in cache
+        new_entry = compute()
+        kb._cache[look_up] = deepcopy(new_entry)
+        entry = deepcopy(new_entry)
 
-        # If we have cached results, deep-copy them so we never mutate cache entries
-        if look_up in kb._cache:
-            cached = deepcopy(kb._cache[look_up])
+    # Now produce results adapted to the current query variable names
+    adapted_results = []
+
+    for d in entry:
+        # only dict results (variable bindings) need remapping
+        if isinstance(d, dict):
+            old_keys = list(d.keys())
+            # Build a fresh dict mapping the current query's vars to the cached values
+            newd = {}
+            # The existing logic appears to map positions in `indx` to keys in the cached dict.
+            # Reuse same mapping but operate on a fresh dict.
+            for i, j in zip(indx, range(len(old_keys))):
+                newd[arg1.terms[i]] = d[old_keys[j]]
+            adapted_results.append(newd)
         else:
-            # compute results and store a deep-copy in cache
-            new_entry = querizer(kb, arg1, cut, show_path)
-            kb._cache[look_up] = deepcopy(new_entry)
-            cached = deepcopy(new_entry)
-
-        # Now produce results adapted to the current query variable names
-        adapted_results = []
-
-        for d in cached:
-            # only dict results (variable bindings) need remapping
-            if isinstance(d, dict):
-                old_keys = list(d.keys())
-                # Build a fresh dict mapping the current query's vars to the cached values
-                newd = {}
-                # The existing logic appears to map positions in `indx` to keys in the cached dict.
-                # Reuse same mapping but operate on a fresh dict.
-                for i, j in zip(indx, range(len(old_keys))):
-                    newd[arg1.terms[i]] = d[old_keys[j]]
-                adapted_results.append(newd)
-            else:
-                # leave non-dict (e.g., 'No' or other markers) unchanged
-                adapted_results.append(d)
-
-        return adapted_results
+            # leave non-dict (e.g., 'No' or other markers) unchanged
+            adapted_results.append(d)
 
-    return memorize_query
+    return adapted_results
 
 
 ## querizer decorator is called whenever there's a new query
@@ -63,107 +90,279 @@ def querizer(simple_query):
         def prepare_query(kb, arg1, cut, show_path):
             pred = arg1.predicate
             if pred in kb.db:
-                goals_len = 0.0
-                for i in kb.db[pred]["goals"]:
-                    goals_len += len(i)
-                if goals_len == 0:
+                if kb.db[pred]["rules"] == 0:
                     # Only simple facts, no rules - use simple_query
                     return simple_query(kb, arg1)
-                else:
-                    # There are rules - use rule_query which will find both facts and rule results
-                    return rule_query(kb, arg1, cut, show_path)
+                ## rules compiled to one SQL query are answered by the database
+                store = None if show_path else sql_plan(kb, pred)
+                if store is not None:
+                    _count(kb, index_probes = 1)
+                    return store_query(store, arg1, cut)
+                # There are rules - use rule_query which will find both facts and rule results
+                return rule_query(kb, arg1, cut, show_path)
+            elif pred in BUILTINS:
+                return rule_query(kb, arg1, cut, show_path)
+            ## nothing is known about the predicate
+            return ["No"]
         return prepare_query 
     return wrap 
 
 ## simple function it unifies the query with the corresponding facts
-def simple_query(kb, expr):
+## (looked up by the bound args at columns, see fact_solutions)
+def simple_query(kb, expr, columns = None):
+    search_base = kb.db[expr.predicate]["facts"]
+    if isinstance(search_base, STORES):
+        _count(kb, index_probes = 1)
+        return store_query(search_base, expr)
+    result = list(fact_solutions(kb, expr, columns = columns))
+    if len(result) == 0: result.append("No")
+    return result
+
+## the answers of a query on facts only, as they are found.
+## with ticks a None is yielded for every fact tried too (see solve).
+## columns are the ones of the bound args other than the first (kb.query knows them
+## from the shape of the query, see shapes.py), None to find them from the args
+def fact_solutions(kb, expr, ticks = False, columns = None):
     pred = expr.predicate
     ind = expr.terms[expr.index]
     search_base = kb.db[pred]["facts"]
-    result = []
+    if isinstance(search_base, STORES):
+        _count(kb, index_probes = 1)
+        yield from store_solutions(search_base, expr)
+        return
+    facts = search_base
     if not is_variable(ind):
         key = ind
         first, last = fact_binary_search(search_base, key)
     else:
-        first, last = (0, len(search_base))
+        ## the first arg is not bound, another one may be (see FactHeap.probe)
+        if columns is None:
+            columns = [c for c, a in enumerate(expr.args) if c and isinstance(a, str)]
+        if columns:
+            facts = search_base.probe([(c, expr.args[c]) for c in columns])
+        first, last = (0, len(facts))
         
-    for i in range(first, last):
-        # Skip rules (facts with RHS) - simple_query should only match facts
-        if len(search_base[i].rhs) > 0:
-            continue
-        res = {}
-        # Unify with the left-hand side of the fact
-        uni = unify(expr, search_base[i].lh, res)
-        if uni:
-            if len(res) == 0: result.append("Yes")
-            else: result.append(res)
-    if len(result) == 0: result.append("No")
-    return result
+    metrics = kb.metrics
+    i, found = first - 1, 0
+    try:
+        for i in range(first, last):
+            if ticks: yield None
+            # Skip rules (facts with RHS) - simple_query should only match facts
+            if len(facts[i].rhs) > 0:
+                continue
+            # Unify with the left-hand side of the fact, renamed apart after the query variables
+            res = Bindings(expr.nvars)
+            if unify_args(facts[i].lh.args, expr.nvars, expr.args, 0, res):
+                found += 1
+                yield answer_bindings(expr, res) or "Yes"
+    finally:
+        if metrics is not None:
+            tried = i - first + 1
+            probed = facts is not search_base or not is_variable(ind)
+            metrics.add({"inferences": tried, "unifications": tried, "unification_failures": tried - found,
+                         "index_probes" if probed else "scans": 1})
+
+## the answers of a query from the rows of a store
+def store_query(store, expr, cut = False):
+    result = []
+    for answer in store_solutions(store, expr):
+        result.append(answer)
+        if cut: break
+    return answer_handler(result)
+
+def store_solutions(store, expr):
+    for res in store_matches(store, expr.args, 0, Bindings(expr.nvars)):
+        yield answer_bindings(expr, res) or "Yes"
+
+## the answer of a query: the values its variables are bound to in the domain
+def answer_bindings(expr, domain, offset = 0):
+    answer = {}
+    for i, name in enumerate(expr.varnames):
+        if name == "_" or name in answer: continue
+        value = term_value(Var(i, name), offset, domain, unbound = _unbound)
+        if value is not _unbound:
+            answer[name] = value
+    return answer
+
+_unbound = object()
 
 ## rule_query() is the main search function
 @memory
 @querizer(simple_query)
 def rule_query(kb, expr, cut, show_path):
-    #pdb.set_trace() # I used to trace every step in the search that consumed me to figure out :D
-    rule = Fact(expr.to_string()) # change expr to rule class
+    return search_query(kb, expr, cut, show_path)
+
+## the answers of a query found by the search
+def search_query(kb, expr, cut, show_path):
+    path = [] if show_path else None
     answer = []
-    path = []
+    for found in search(kb, expr, path):
+        answer.append(found)
+        if cut and found != "Yes": break
+    
+    answer = answer_handler(answer)
+    
+    if show_path: 
+        path = get_path(kb.db, expr, path)
+        return answer, path
+    else:
+        return answer
+
+## the answers of a query as they are found: the search only goes as far as they
+## are read (see solve), the steps of the answers are added to `path` if it is a list.
+## with ticks a None is yielded for every goal searched too (see solve)
+def search(kb, expr, path = None, ticks = False):
+    show_path = path is not None
+    #pdb.set_trace() # I used to trace every step in the search that consumed me to figure out :D
     ## start from a random point (goal) outside the tree
-    start = Goal(Fact("start(search):-from(random_point)"))
     ## put the expr as a goal in the random point to connect it with the tree
-    start.fact.rhs = [expr]
+    ## the query variables come first in the domain (offset 0)
+    start = Goal(Fact.query(expr), domain = Bindings(expr.nvars))
     queue = SearchQueue() ## start the queue and fill with first random point
     queue.push(start)
     loop_counter = 0
-    MAX_LOOPS = 2000
-    while not queue.empty: ## keep searching until it is empty meaning nothing left to be searched
-        current_goal = queue.pop()
-        loop_counter += 1
-        if loop_counter % 200 == 0:
-            print(f"[DEBUG] loop {loop_counter}, queue size approx unknown, current goal: {current_goal.fact} ind={current_goal.ind} domain={current_goal.domain}")
-        if loop_counter > MAX_LOOPS:
-            print(f"[DEBUG] reached max loop {MAX_LOOPS}, aborting search to avoid infinite loop")
-            break
-        if current_goal.ind >= len(current_goal.fact.rhs): ## all rule goals have been searched
-            if current_goal.parent == None: ## no more parents 
-                if current_goal.domain:  ## if there is an answer return it
-                    answer.append(current_goal.domain)
-                    if cut: break
-                else: 
-                    answer.append("Yes") ## if no returns Yes
-                continue ## if no answer found go back to the parent a step above again    
+    ## a search stops after kb.max_loops goals (counted as searches_aborted, see metrics.py)
+    max_loops = kb.max_loops
+    ## what the search does is counted here and added to kb.metrics when it ends
+    metrics = kb.metrics
+    calls = None if metrics is None else {}
+    tried = unified = probes = scans = peak = aborted = found = 0
+    try:
+        while not queue.empty: ## keep searching until it is empty meaning nothing left to be searched
+            if calls is not None and len(queue) > peak:
+                peak = len(queue)
+            current_goal = queue.pop()
+            loop_counter += 1
+            if ticks: yield None
+            if max_loops is not None and loop_counter > max_loops:
+                aborted = 1
+                if found: break
+                raise SearchAborted("%s was aborted after %d goals (see max_loops)" % (expr, max_loops))
+            if current_goal.ind >= len(current_goal.fact.rhs): ## all rule goals have been searched
+                if current_goal.parent == None: ## no more parents 
+                    ## the answer if there are bindings, otherwise Yes
+                    found += 1
+                    yield answer_bindings(expr, current_goal.domain) or "Yes"
+                    continue ## go back to the parent a step above again    
+                
+                if show_path: 
+                    path.append(answer_bindings(current_goal.fact, current_goal.domain, current_goal.offset))
+                ## father which is the main rule takes unified child's domain from facts
+                child_to_parent(current_goal, queue)
+                continue
             
-            ## father which is the main rule takes unified child's domain from facts
-            child_to_parent(current_goal, queue)
-            if show_path: path.append(current_goal.domain)
-            continue
-        
-        ## get the rh expr from the current goal to look for its predicate in database
-        rule = current_goal.fact.rhs[current_goal.ind]
-        
-        # inequality
-        if rule.predicate == "neq":
-            filter_eq(rule, current_goal, queue)
-            continue
+            ## get the rh expr from the current goal to look for its predicate in database
+            rule = current_goal.fact.rhs[current_goal.ind]
             
-        # Check if predicate exists in database (including empty predicate for no-arg predicates)
-        if rule.predicate in kb.db:
-            ## search relevant buckets so it speeds up search
-            rule_f = kb.db[rule.predicate]["facts"]
-            if current_goal.parent == None:
-                # parent gets query inputs from grandfather to start search
-                parent_inherits(rule, rule_f, current_goal, queue)
-            else:
+            # inequality
+            if rule.predicate == "neq":
+                filter_eq(rule, current_goal, queue)
+                continue
+                
+            # Check if predicate exists in database (including empty predicate for no-arg predicates)
+            if rule.predicate in kb.db:
+                ## search relevant buckets so it speeds up search
+                rule_f = kb.db[rule.predicate]["facts"]
+                if calls is not None:
+                    calls[rule.predicate] = calls.get(rule.predicate, 0) + 1
+                if not show_path:
+                    store = rule_f if isinstance(rule_f, STORES) else sql_plan(kb, rule.predicate)
+                    if store is not None:
+                        ## rows are probed in place, there is no fact frame to search
+                        probes += 1
+                        rows_assigned(rule, store, current_goal, queue)
+                        continue
+                ## a big bucket is probed by the bound args, only the clauses that may unify are read
+                probed = False
+                if isinstance(rule_f, FactHeap) and len(rule_f) > PROBE_SIZE:
+                    bound = bound_args(rule, current_goal)
+                    if bound:
+                        rule_f = rule_f.probe(bound)
+                        probed = True
                 # a child to search facts in kb
-                child_assigned(rule, rule_f, current_goal, queue)
-        ## Probabilities and numeric evaluation (arithmetic expressions with no predicate)
-        elif rule.predicate == "": ## if there is no predicate and it's not in db
-            prob_calc(current_goal, rule, queue)
-    
-    answer = answer_handler(answer)
-    
-    if show_path: 
-        path = get_path(kb.db, expr, path)
-        return answer, path
-    else:
-        return answer
\ No newline at end of file
+                # (rule frames are kept when the path is requested as it is read from them)
+                if calls is None:
+                    child_assigned(rule, rule_f, current_goal, queue, last_call = not show_path)
+                    continue
+                ## the clauses are unified one by one, the ones that unify are queued
+                depth = len(queue)
+                child_assigned(rule, rule_f, current_goal, queue, last_call = not show_path)
+                if probed:
+                    probes += 1
+                else:
+                    scans += 1
+                tried += len(rule_f)
+                unified += len(queue) - depth
+            elif rule.predicate == "length":
+                list_len(rule, current_goal, queue)
+            ## Probabilities and numeric evaluation (arithmetic expressions with no predicate)
+            elif rule.predicate == "": ## if there is no predicate and it's not in db
+                prob_calc(current_goal, rule, queue)
+    finally:
+        if metrics is not None:
+            metrics.add({"inferences": loop_counter, "unifications": tried,
+                         "unification_failures": tried - unified, "index_probes": probes,
+                         "scans": scans, "searches_aborted": aborted}, calls, peak)
+
+## add counts to the metrics of the knowledge base, if they are recorded
+def _count(kb, **counts):
+    if kb.metrics is not None:
+        kb.metrics.add(counts)
+
+def _called(kb, pred):
+    if kb.metrics is not None:
+        kb.metrics.add({}, {pred: 1})
+
+## how the answers of a query on pred are found, the way the querizer goes:
+## ("facts", None) facts only, ("sql", store) rules compiled to one SQL query,
+## ("search", None) the search, ("none", None) nothing is known about pred.
+## a prepared query chooses it once (see prepared.py), kb.query once for each
+## shape of query (see shapes.py)
+def plan_query(kb, pred):
+    if pred in kb.db:
+        if kb.db[pred]["rules"] == 0:
+            return "facts", None
+        store = sql_plan(kb, pred)
+        if store is not None:
+            return "sql", store
+        return "search", None
+    elif pred in BUILTINS:
+        return "search", None
+    return "none", None
+
+## the answers of a query the way the plan finds them
+def planned_query(kb, expr, plan, cut = False, columns = None):
+    how, store = plan
+    if how == "facts":
+        return simple_query(kb, expr, columns)
+    if how == "sql":
+        _count(kb, index_probes = 1)
+        return store_query(store, expr, cut)
+    if how == "search":
+        return search_query(kb, expr, cut, False)
+    return ["No"]
+
+## buckets with more clauses than this are probed by the bound args of a goal
+PROBE_SIZE = 8
+
+## the lazy engine: the answers of a query (bindings or Yes, nothing when there are
+## none) as they are found, they are not cached and the search stops where they
+## stop being read. it takes the same ways as the querizer.
+## with ticks it also yields None for every inference (a goal searched or a fact
+## tried), so whoever runs it can count them and stop between any two (see scheduler.py)
+## the goal of the query is counted as a call of pred, as the search counts its goals
+def solve(kb, expr, ticks = False):
+    pred = expr.predicate
+    if pred in kb.db:
+        if kb.db[pred]["rules"] == 0:
+            _called(kb, pred)
+            return fact_solutions(kb, expr, ticks)
+        store = sql_plan(kb, pred)
+        if store is not None:
+            _called(kb, pred)
+            _count(kb, index_probes = 1)
+            return store_solutions(store, expr)
+        return search(kb, expr, ticks = ticks)
+    elif pred in BUILTINS:
+        return search(kb, expr, ticks = ticks)
+    return iter(())
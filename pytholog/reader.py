@@ -0,0 +1,484 @@
+import re
+import io
+import gzip
+from sys import intern
+from .term import PList, NIL, Arith, hashcons
+
+## clause reader: one pass of a tokenizer over the clause text and an operator
+## precedence parser building a small syntax tree, which is compiled straight into
+## the clause parts (predicate, term texts, compiled args or arithmetic template).
+## tree nodes are tuples:
+##   ("var", name), ("const", text), ("list", elems, tail or None),
+##   ("compound", name, args), ("op", name, operands), ("paren", node)
+
+class PrologSyntaxError(ValueError):
+    def __init__(self, message, text):
+        ValueError.__init__(self, "%s in %r" % (message, text))
+        self.text = text
+
+## one regex pass over the text: the dots ending a clause, or a token and
+## the "(" immediately following it (which makes a name a functor)
+_token = re.compile(r"""\s*(?:
+    (\.+)(?=\s|$)
+   |(\d+(?:\.\d+)?(?:[eE][+-]?\d+)?
+    |[A-Za-z_][A-Za-z0-9_]*
+    |'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.)*"
+    |!=|[+\-*/\\^<>=~:.?@\#&$%]+
+    |\S)(\(?))""", re.X)
+
+SYMBOL_CHARS = frozenset("+-*/\\^<>=~:.?@#&$%")
+
+## kind of a token from its first character
+_KINDS = {}
+_KINDS.update((c, "num") for c in "0123456789")
+_KINDS.update((c, "var") for c in "ABCDEFGHIJKLMNOPQRSTUVWXYZ_")
+_KINDS.update((c, "atom") for c in "abcdefghijklmnopqrstuvwxyz")
+_KINDS.update((c, "str") for c in "'\"")
+_KINDS.update((c, "punct") for c in "()[]{},|")
+_KINDS.update((c, "sym") for c in SYMBOL_CHARS | set("!;"))
+_NAMES = frozenset(("atom", "sym"))
+
+## tokens are (kind, text) pairs ending with ("eof", ""). a name immediately followed
+## by "(" is a functor. a "." followed by layout or the end of the text ends the
+## clause, as do the trailing dots the old parser used to strip
+def tokenize(text):
+    tokens = []
+    append = tokens.append
+    for end, tok, paren in _token.findall(text):
+        if end:
+            append(_END)
+            continue
+        kind = _KINDS.get(tok[0])
+        if kind is None or kind == "str" and len(tok) == 1:
+            raise PrologSyntaxError("unexpected character %r" % tok, text)
+        if paren:
+            if kind in _NAMES or kind == "str" and tok[0] == "'":
+                kind = "functor"
+            append((kind, tok))
+            append(_OPEN)
+        else:
+            append((kind, tok))
+    append(_EOF)
+    return tokens
+
+_END = ("end", ".")
+_OPEN = ("punct", "(")
+_EOF = ("eof", "")
+
+## operator table: name -> (priority, type), as in standard prolog, plus the python
+## keywords and comparisons arithmetic goals have always accepted
+INFIX = {
+    ":-": (1200, "xfx"), ";": (1100, "xfy"), "->": (1050, "xfy"), ",": (1000, "xfy"),
+    ## "is" takes the whole python expression on its right, comparisons included
+    "is": (770, "xfx"), "or": (760, "xfy"), "and": (740, "xfy"),
+    "=": (700, "xfx"), "\\=": (700, "xfx"), "==": (700, "xfx"), "\\==": (700, "xfx"),
+    "<": (700, "xfx"), ">": (700, "xfx"), "=<": (700, "xfx"), "<=": (700, "xfx"),
+    ">=": (700, "xfx"), "=:=": (700, "xfx"), "=\\=": (700, "xfx"), "!=": (700, "xfx"),
+    "in": (700, "xfx"),
+    "+": (500, "yfx"), "-": (500, "yfx"), "/\\": (500, "yfx"), "\\/": (500, "yfx"),
+    "*": (400, "yfx"), "/": (400, "yfx"), "//": (400, "yfx"), "%": (400, "yfx"),
+    "mod": (400, "yfx"), "rem": (400, "yfx"), "<<": (400, "yfx"), ">>": (400, "yfx"),
+    "**": (200, "xfx"), "^": (200, "xfy"),
+}
+PREFIX = {
+    ":-": (1200, "fx"), "\\+": (900, "fy"), "not": (750, "fy"),
+    "-": (200, "fy"), "+": (200, "fy"), "\\": (200, "fy"),
+}
+
+## operators evaluated by python in arithmetic goals, with the prolog spellings
+## python does not know
+ARITH_OPS = {
+    "or": "or", "and": "and", "not": "not", "in": "in", "is": "is",
+    "<": "<", ">": ">", "=<": "<=", "<=": "<=", ">=": ">=", "==": "==",
+    "=:=": "==", "=\\=": "!=", "!=": "!=", "=": "=",
+    "+": "+", "-": "-", "*": "*", "/": "/", "//": "//", "%": "%", "mod": "%",
+    "**": "**", "^": "**", "<<": "<<", ">>": ">>", "/\\": "&", "\\/": "|", "\\": "~",
+}
+
+_OPERATOR_KINDS = frozenset(("atom", "sym", "punct", "functor"))
+_TERM_END = frozenset(")]}|,")
+_LEAVES = frozenset(("var", "num", "str", "atom"))
+_ARG_END = frozenset(("punct", c) for c in ",)|]")
+
+class Reader:
+    def __init__(self, text):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.pos = 0
+
+    def error(self, message):
+        return PrologSyntaxError("%s near %r" % (message, self.tokens[self.pos][1]), self.text)
+
+    def expect(self, text):
+        tok = self.tokens[self.pos]
+        if tok[1] != text or tok[0] != "punct":
+            raise self.error("expected %r" % text)
+        self.pos += 1
+
+    ## the next clause of the text: the term up to its end token (or the end of the text)
+    def clause(self):
+        node, _ = self.term(1200)
+        kind = self.tokens[self.pos][0]
+        if kind == "end":
+            self.pos += 1
+        elif kind != "eof":
+            raise self.error("operator expected")
+        return node
+
+    @property
+    def at_end(self):
+        return self.tokens[self.pos] is _EOF
+
+    def term(self, maxprec):
+        left, lprec = self.primary(maxprec)
+        tokens = self.tokens
+        while True:
+            kind, text = tokens[self.pos]
+            if kind not in _OPERATOR_KINDS:
+                break
+            op = INFIX.get(text)
+            if op is None:
+                break
+            prec, opkind = op
+            if prec > maxprec or lprec > (prec - 1 if opkind[0] == "x" else prec):
+                break
+            self.pos += 1
+            right, _ = self.term(prec - 1 if opkind[2] == "x" else prec)
+            left = ("op", text, (left, right))
+            lprec = prec
+        return left, lprec
+
+    def primary(self, maxprec):
+        kind, text = self.tokens[self.pos]
+        self.pos += 1
+        if kind == "var":
+            return ("var", text), 0
+        if kind == "num" or kind == "str":
+            return ("const", text), 0
+        if kind == "functor":
+            ## functional notation: the name is immediately followed by "("
+            self.pos += 1
+            args = []
+            if not self.close(")"):
+                args.append(self.arg())
+                while self.close(","):
+                    args.append(self.arg())
+                self.expect(")")
+            return ("compound", text, tuple(args)), 0
+        if kind == "punct":
+            if text == "(":
+                node, _ = self.term(1200)
+                self.expect(")")
+                return ("paren", node), 0
+            if text == "[":
+                return self.list(), 0
+            self.pos -= 1
+            raise self.error("unexpected %r" % text)
+        if kind == "end" or kind == "eof":
+            self.pos -= 1
+            raise self.error("unexpected end of clause")
+        nkind, ntext = self.tokens[self.pos]
+        if text == "-" and nkind == "num":
+            self.pos += 1
+            return ("const", "-" + ntext), 0
+        op = PREFIX.get(text)
+        if op is not None and nkind != "end" and nkind != "eof" \
+                and not (nkind == "punct" and ntext in _TERM_END):
+            prec, opkind = op
+            if prec > maxprec:
+                prec = 999
+            operand, _ = self.term(prec - 1 if opkind == "fx" else prec)
+            return ("op", text, (operand,)), prec
+        return ("const", text), 0
+
+    ## an argument of a compound term or a list element. most are a single token,
+    ## those are read without going through the operators
+    def arg(self):
+        pos = self.pos
+        kind, text = self.tokens[pos]
+        if kind in _LEAVES and self.tokens[pos + 1] in _ARG_END:
+            self.pos = pos + 1
+            return ("var", text) if kind == "var" else ("const", text)
+        return self.term(999)[0]
+
+    ## consumes the punctuation text if it is the next token
+    def close(self, text):
+        tok = self.tokens[self.pos]
+        if tok[1] == text and tok[0] == "punct":
+            self.pos += 1
+            return True
+        return False
+
+    ## [a,b|T] with the tail lists merged in: [a|[b|T]] is read as [a,b|T]
+    def list(self):
+        if self.close("]"):
+            return ("list", (), None)
+        elems = [self.arg()]
+        tail = None
+        while self.close(","):
+            elems.append(self.arg())
+        if self.close("|"):
+            tail = self.arg()
+        self.expect("]")
+        if tail is not None and tail[0] == "list":
+            elems.extend(tail[1])
+            tail = tail[2]
+        return ("list", tuple(elems), tail)
+
+def read_clause(text):
+    reader = Reader(text)
+    node = reader.clause()
+    if not reader.at_end:
+        raise reader.error("end of clause expected")
+    return node
+
+## the head and the body goals of a clause. the body is read as the sequence of its
+## goals: "," and ";" both separate goals as they always did in pytholog
+def clause_goals(node):
+    node = _unparen(node)
+    if node[0] == "op" and node[1] == ":-" and len(node[2]) == 2:
+        head, body = node[2]
+        goals = []
+        _flatten(body, goals)
+        return _unparen(head), goals
+    return node, []
+
+def _flatten(node, goals):
+    node = _unparen(node)
+    if node[0] == "op" and node[1] in (",", ";") and len(node[2]) == 2:
+        _flatten(node[2][0], goals)
+        _flatten(node[2][1], goals)
+    else:
+        goals.append(node)
+
+def _unparen(node):
+    while node[0] == "paren":
+        node = node[1]
+    return node
+
+## the parts of an expr compiled from a goal node, variables numbered in table:
+## (predicate, term texts, compiled args, arithmetic or None, arithmetic text or None)
+def compile_goal(node, table):
+    node = _unparen(node)
+    kind = node[0]
+    if kind == "compound":
+        args = node[2]
+    elif kind == "const" and node[1][0].isalpha() or node == ("const", "!"):
+        args = ()
+    elif kind == "op" and node[1] not in ARITH_OPS:
+        args = node[2]
+    else:
+        return _compile_arith(node, table)
+    terms = []
+    compiled = []
+    for a in args:
+        kind = a[0]
+        if kind == "var":
+            terms.append(a[1])
+            compiled.append(table.var(a[1]))
+        elif kind == "const":
+            text = intern(a[1])
+            terms.append(text)
+            compiled.append(text)
+        else:
+            terms.append(intern(text_of(a)))
+            compiled.append(compile_arg(a, table))
+    return (intern(node[1]), tuple(terms), tuple(compiled), None, None)
+
+def _compile_arith(node, table):
+    target = None
+    expr = node
+    if node[0] == "op" and node[1] == "is" and len(node[2]) == 2:
+        target = compile_arg(node[2][0], table)
+        expr = node[2][1]
+    template = []
+    _template(expr, table, template)
+    leaves = []
+    _leaves(node, leaves)
+    return ("", tuple(hashcons(t) for t in leaves), (), Arith(target, template), text_of(node))
+
+## compiled term of an argument: variables, constants and lists are terms of their
+## own, other compound terms are kept as constants (their text)
+def compile_arg(node, table):
+    kind = node[0]
+    if kind == "var":
+        return table.var(node[1])
+    if kind == "const":
+        return hashcons(node[1])
+    if kind == "list":
+        elems = [compile_arg(e, table) for e in node[1]]
+        if node[2] is not None:
+            return PList(elems, compile_arg(node[2], table))
+        return hashcons(PList(elems)) if elems else NIL
+    return hashcons(text_of(node))
+
+## python text of an arithmetic expression as chunks of text and variables
+def _template(node, table, out):
+    kind = node[0]
+    if kind == "var":
+        out.append(table.var(node[1]))
+    elif kind == "const":
+        _text(out, node[1])
+    elif kind == "paren":
+        _text(out, "(")
+        _template(node[1], table, out)
+        _text(out, ")")
+    elif kind == "list" or kind == "compound":
+        _text(out, "[" if kind == "list" else node[1] + "(")
+        for i, e in enumerate(node[1] if kind == "list" else node[2]):
+            if i: _text(out, ",")
+            _template(e, table, out)
+        if kind == "list" and node[2] is not None:
+            ## python has no list tails, keep the prolog text
+            _text(out, "|")
+            _template(node[2], table, out)
+        _text(out, "]" if kind == "list" else ")")
+    else:
+        name = ARITH_OPS.get(node[1], node[1])
+        if len(node[2]) == 1:
+            _text(out, name + " ")
+            _template(node[2][0], table, out)
+        else:
+            _template(node[2][0], table, out)
+            _text(out, " " + name + " ")
+            _template(node[2][1], table, out)
+
+def _text(out, s):
+    if out and isinstance(out[-1], str):
+        out[-1] += s
+    else:
+        out.append(s)
+
+def _leaves(node, out):
+    kind = node[0]
+    if kind in ("var", "const"):
+        out.append(node[1])
+    elif kind == "paren":
+        _leaves(node[1], out)
+    elif kind == "list":
+        for e in node[1]: _leaves(e, out)
+        if node[2] is not None: _leaves(node[2], out)
+    else:
+        for e in node[2]: _leaves(e, out)
+
+## clause text of a node: no layout except around word operators, so it reads back
+## to the same node
+def text_of(node):
+    kind = node[0]
+    if kind == "var" or kind == "const":
+        return node[1]
+    if kind == "list":
+        s = ",".join(text_of(e) for e in node[1])
+        if node[2] is not None:
+            s += "|" + text_of(node[2])
+        return "[" + s + "]"
+    if kind == "compound":
+        return node[1] + "(" + ",".join(text_of(a) for a in node[2]) + ")"
+    if kind == "paren":
+        return "(" + text_of(node[1]) + ")"
+    name = node[1]
+    if len(node[2]) == 1:
+        return _join(name, text_of(node[2][0]), name[0].isalpha())
+    return _join(_join(text_of(node[2][0]), name, name[0].isalpha()),
+                 text_of(node[2][1]), name[0].isalpha())
+
+def _join(a, b, spaced):
+    if spaced or (a[-1] in SYMBOL_CHARS and b[0] in SYMBOL_CHARS):
+        return a + " " + b
+    return a + b
+
+
+## prolog source files: the text is scanned in chunks for the dots ending clauses,
+## skipping quoted atoms and dropping % and /* */ comments, so a clause can span
+## lines and only the unfinished clause is kept between chunks
+CHUNK_SIZE = 1 << 20
+
+_layout = re.compile(r"""
+    (?P<text>[^'"%/.]+|/(?![*]|\Z)|\.(?![\s%]|\Z))
+   |(?P<quoted>'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.)*")
+   |(?P<comment>%[^\n]*\n|/\*.*?\*/)
+   |(?P<end>\.(?=[\s%]))
+   |(?P<open>.)
+""", re.X | re.S)
+
+## clause texts of a text stream, without their ending dots
+def read_clauses(stream, chunk_size = CHUNK_SIZE):
+    rest = ""
+    while True:
+        chunk = stream.read(chunk_size)
+        ## the last line break ends a final clause or comment
+        text = rest + (chunk or "\n")
+        pieces = []
+        start = 0
+        for m in _layout.finditer(text):
+            kind = m.lastgroup
+            if kind == "text" or kind == "quoted":
+                pieces.append(m.group())
+            elif kind == "comment":
+                pieces.append(" ")
+            elif kind == "end":
+                clause = "".join(pieces).strip()
+                if clause:
+                    yield clause
+                pieces = []
+                start = m.end()
+            else:
+                ## a quoted atom or comment going on in the next chunk
+                if not chunk:
+                    raise PrologSyntaxError("unterminated quote or comment",
+                                            text[start:start + 80])
+                break
+        rest = text[start:]
+        if not chunk:
+            ## a last clause without its dot
+            clause = "".join(pieces).strip()
+            if clause:
+                yield clause
+            return
+
+## the same scan over the bytes of a file, for the byte offsets of the clauses
+## (utf-8 sequences never contain the ascii characters the scan looks for)
+_layout_bytes = re.compile(_layout.pattern.encode("ascii"), re.X | re.S)
+
+## (clause text, start, end) of the clauses of a binary file: the clause text
+## is its bytes from start to end (before its dot) without the comments
+def clause_spans(raw, chunk_size = CHUNK_SIZE, encoding = "utf-8"):
+    rest = b""
+    base = 0  ## offset of the rest in the file
+    while True:
+        chunk = raw.read(chunk_size)
+        text = rest + (chunk or b"\n")
+        pieces = []
+        start = 0
+        first = None  ## where the current clause starts
+        for m in _layout_bytes.finditer(text):
+            kind = m.lastgroup
+            if kind == "text" or kind == "quoted":
+                if first is None and not m.group().isspace():
+                    first = m.start() + len(m.group()) - len(m.group().lstrip())
+                pieces.append(m.group())
+            elif kind == "comment":
+                pieces.append(b" ")
+            elif kind == "end":
+                if first is not None:
+                    yield b"".join(pieces).strip().decode(encoding), base + first, base + m.start()
+                pieces = []
+                first = None
+                start = m.end()
+            else:
+                if not chunk:
+                    raise PrologSyntaxError("unterminated quote or comment",
+                                            text[start:start + 80].decode(encoding, "replace"))
+                break
+        if not chunk:
+            if first is not None:
+                yield b"".join(pieces).strip().decode(encoding), base + first, base + len(text) - 1
+            return
+        rest = text[start:]
+        base += start
+
+## text stream of a binary file, gzip'd files are recognized by their magic number
+def text_stream(raw, encoding = "utf-8"):
+    if raw.peek(2)[:2] == b"\x1f\x8b":
+        raw = gzip.GzipFile(fileobj = raw)
+    return io.TextIOWrapper(raw, encoding)
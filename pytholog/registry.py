@@ -0,0 +1,138 @@
+import os
+import threading
+from collections import Counter
+from .knowledge_base import KnowledgeBase
+from .reader import read_clauses, text_stream
+from .util import paused_gc
+
+## knowledge bases hosted by name (e.g. by a server), consulted from files that can
+## be reloaded while they are queried. a reload reads the changed files, compares
+## their clauses with the ones read last time and makes a revised copy of the
+## knowledge base with only the difference (see KnowledgeBase.revised): the
+## predicates that did not change keep their sorted facts and cached answers.
+## the copy replaces the knowledge base under its name at once, the queries already
+## running end on the one they started on. watch() reloads in the background.
+##
+## a clause moved within a file keeps its place, only the clauses removed and
+## added are applied. a file that cannot be read or parsed leaves the knowledge
+## base as it was (the error is kept in `errors`) until it changes again.
+
+class Registry:
+    def __init__(self, interval = 1.0):
+        self.interval = interval
+        self.errors = {}  ## file -> why its last change was not applied
+        self._kbs = {}
+        self._sources = {}  ## name -> {file: [its stamp, its clauses]}
+        self.lock = threading.RLock()  ## reloads (and writers that take it) one at a time
+        self._thread = None
+        self._stopping = threading.Event()
+
+    ## host a knowledge base (a new one by default) under name, consulted from files
+    def add(self, name, files = (), kb = None):
+        if kb is None:
+            kb = KnowledgeBase(name)
+        with self.lock:
+            sources = self._sources.setdefault(name, {})
+            for path in files:
+                stamp = _stamp(path)
+                clauses = _read(path)
+                with paused_gc():
+                    kb.add_kn(clauses)
+                sources[path] = [stamp, Counter(clauses)]
+            self._kbs[name] = kb
+        return kb
+
+    def remove(self, name):
+        with self.lock:
+            self._sources.pop(name, None)
+            return self._kbs.pop(name)
+
+    def __getitem__(self, name):
+        return self._kbs[name]
+
+    def __contains__(self, name):
+        return name in self._kbs
+
+    def __iter__(self):
+        return iter(list(self._kbs.values()))
+
+    def names(self):
+        return sorted(self._kbs)
+
+    ## apply the changes of the files of a knowledge base (all of them by default),
+    ## the names of the ones that were revised
+    def reload(self, name = None):
+        revised = []
+        with self.lock:
+            for n in ([name] if name is not None else list(self._sources)):
+                if self._reload(n):
+                    revised.append(n)
+        return revised
+
+    def _reload(self, name):
+        removed, added, read = [], [], []
+        for path, (stamp, clauses) in self._sources[name].items():
+            try:
+                now = _stamp(path)
+                if now == stamp: continue
+                new = _read(path)
+            except (OSError, ValueError) as e:  ## e.g. it is being written, it is read again next time
+                self.errors[path] = "%s: %s" % (type(e).__name__, e)
+                continue
+            ## the clauses still there use up the old ones, the rest are added
+            ## in the order of the file; the old ones left over are removed
+            left = Counter(clauses)
+            for text in new:
+                if left[text] > 0:
+                    left[text] -= 1
+                else:
+                    added.append(text)
+            removed.extend(left.elements())
+            read.append((path, now, Counter(new)))
+        if not removed and not added:
+            self._applied(name, read)
+            return False
+        try:
+            kb = self._kbs[name].revised(removed, added)
+        except Exception as e:
+            ## the files are not read again until they change, their clauses stay the old ones
+            for path, stamp, _ in read:
+                self._sources[name][path][0] = stamp
+                self.errors[path] = "%s: %s" % (type(e).__name__, e)
+            return False
+        self._applied(name, read)
+        self._kbs[name] = kb
+        return True
+
+    def _applied(self, name, read):
+        for path, stamp, clauses in read:
+            self._sources[name][path] = [stamp, clauses]
+            self.errors.pop(path, None)
+
+    ## reload every `interval` seconds in a background thread, until stop()
+    ## (a forked process starts its own)
+    def watch(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target = self._watch, name = "pytholog-registry", daemon = True)
+        self._thread.start()
+
+    def _watch(self):
+        while not self._stopping.wait(self.interval):
+            self.reload()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+def _stamp(path):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+## the clause texts of a prolog file (it can be gzip'd), in order
+def _read(path):
+    with open(path, "rb") as raw, text_stream(raw) as stream:
+        return list(read_clauses(stream))
@@ -0,0 +1,240 @@
+import sys
+import cProfile
+import pstats
+from collections import Counter
+from itertools import islice
+from pprint import pprint
+from time import perf_counter
+from .lazy import LazyFacts
+from .pq import FactHeap
+from .columns import ColumnStore
+from .external import SQLiteTable
+from .metrics import COUNTERS
+from .querizer import SearchAborted
+
+## the commands of an interactive session (see tool/Pytholog.py), to look into a
+## knowledge base while its rules are tuned without writing a script for it:
+##   :time QUERY             its answers, how long kb.query took and what the engine did
+##   :profile QUERY          its answers searched again (not cached) under cProfile: the
+##                           predicates called the most and the python functions taking the most time
+##   :stats [on|off|reset]   the metrics of the knowledge base (see metrics.py)
+##   :table                  the predicates: clauses, rules, where they are and their calls
+##   :indexes                how the facts of each predicate are looked up
+##   :cache [clear]          the cached answers and the plans of the query shapes
+##   QUERY;                  its first answer, then ";" for the next one: the search goes
+##                           only as far as the answers read (see solve), any other input ends it
+## a query ends with "?" (or "!" for its first answer only), as in the session.
+## the engine's counts are recorded for the query only when the metrics are off.
+
+HELP = """\
+:time QUERY            answers, elapsed time, inferences and cache behaviour
+:profile QUERY         the search of the answers under cProfile, with its hotspots
+:stats [on|off|reset]  what the engine did since the metrics were turned on
+:table                 the predicates, their clauses, storage and calls
+:indexes               how the facts of each predicate are looked up
+:cache [clear]         the cached answers and the plans of the query shapes
+QUERY;                 the first answer, then ; for the next one"""
+
+class Session:
+    def __init__(self, kb, out = None):
+        self.kb = kb
+        self.out = out or sys.stdout
+        self.answers = None  ## the ones left of the last QUERY;
+
+    def write(self, line = ""):
+        self.out.write(line + "\n")
+
+    ## run a command of the session, False when the line is not one
+    def command(self, line):
+        line = line.strip()
+        if line == ";":
+            self.next_answer()
+            return True
+        self.answers = None
+        if line.endswith(";"):
+            run, arg = Session.first_answer, line[:-1]
+        elif line.startswith(":"):
+            name, _, arg = line[1:].partition(" ")
+            run = COMMANDS.get(name)
+            if run is None:
+                self.write("unknown command :%s, :help lists them" % name)
+                return True
+        else:
+            return False
+        try:
+            run(self, arg.strip())
+        except (ValueError, SearchAborted) as e:  ## e.g. a query that cannot be read
+            self.write("%s: %s" % (type(e).__name__, e))
+        return True
+
+    def first_answer(self, arg):
+        self.answers = iter(self.kb.solve(query_text(arg)[0]))
+        self.next_answer()
+
+    def next_answer(self):
+        if self.answers is None:
+            self.write("no query to go on with, end one with ; to read its answers one at a time")
+            return
+        answer = next(self.answers, None)
+        if answer is None:
+            self.answers = None
+            self.write("No")
+        else:
+            self.write(answer_text(answer) + " ;")
+
+    def help(self, arg):
+        self.write(HELP)
+
+    def time(self, arg):
+        text, cut = query_text(arg)
+        answers, seconds, counts = measured(self.kb, lambda: self.kb.query(text, cut = cut))
+        pprint(answers, stream = self.out)
+        found = 0 if answers == ["No"] else len(answers)
+        cache = "hit" if counts["cache_hits"] else "miss"
+        self.write("%% %d answers in %s, %s, cache %s" % (found, elapsed(seconds), engine(counts), cache))
+
+    def profile(self, arg, top = 10):
+        text, cut = query_text(arg)
+        profiler = cProfile.Profile()
+        def run():
+            profiler.enable()
+            try:
+                return list(islice(self.kb.solve(text), 1 if cut else None))
+            finally:
+                profiler.disable()
+        answers, seconds, counts = measured(self.kb, run)
+        self.write("%% %d answers in %s, %s" % (len(answers), elapsed(seconds), engine(counts)))
+        self.hotspots(counts["calls"], top)
+        pstats.Stats(profiler, stream = self.out).sort_stats("tottime").print_stats(top)
+
+    def stats(self, arg):
+        kb = self.kb
+        if arg == "on":
+            kb.enable_metrics()
+        elif arg == "off":
+            kb.enable_metrics(False)
+        elif arg == "reset" and kb.metrics is not None:
+            kb.metrics.reset()
+        elif arg not in ("", "reset"):
+            raise ValueError(":stats takes on, off or reset, got %r" % arg)
+        stats = kb.stats()
+        if not stats:
+            self.write("% metrics are off, :stats on records them")
+            return
+        for name in COUNTERS:
+            self.write("%% %-22s %d" % (name, stats[name]))
+        latency = stats["latency"]
+        if latency["count"]:
+            self.write("%% %-22s %s per query" % ("latency", elapsed(latency["sum"] / latency["count"])))
+        self.write("%% %-22s %s" % ("cache hit rate", hit_rate(stats)))
+        self.write("%% %-22s %d" % ("peak_queue_depth", stats["peak_queue_depth"]))
+        self.hotspots(stats["calls"])
+
+    def hotspots(self, calls, top = 10):
+        if calls:
+            self.write("% predicates called the most:")
+            for pred, n in sorted(calls.items(), key = lambda item: (-item[1], item[0]))[:top]:
+                self.write("%%   %-24s %d" % (pred, n))
+
+    def table(self, arg):
+        calls = self.kb.stats().get("calls", {})
+        self.write("%% %-24s %8s %6s  %-12s %s" % ("predicate", "clauses", "rules", "storage", "calls"))
+        for pred, bucket in sorted(self.kb.db.items()):
+            facts = bucket["facts"]
+            clauses = "-" if type(facts) is LazyFacts else len(facts)  ## (not read until it is queried)
+            self.write("%% %-24s %8s %6d  %-12s %s" % (pred, clauses, bucket["rules"], type(facts).__name__,
+                                                       calls.get(pred, "-")))
+
+    def indexes(self, arg):
+        for pred, bucket in sorted(self.kb.db.items()):
+            for line in lookups(bucket["facts"]):
+                self.write("%% %-24s %s" % (pred, line))
+
+    def cache(self, arg):
+        kb = self.kb
+        if arg == "clear":
+            kb.clear_cache()
+        elif arg:
+            raise ValueError(":cache takes clear, got %r" % arg)
+        cached = Counter(key.partition("(")[0] for key in list(kb._cache))
+        self.write("%% %d cached answers%s" % (sum(cached.values()), "".join(
+            "%s %s %d" % ("," if i else ":", pred, n) for i, (pred, n) in enumerate(cached.most_common(10)))))
+        stats = kb.stats()
+        if stats:
+            self.write("%% %d hits, %d misses (hit rate %s)" % (stats["cache_hits"], stats["cache_misses"],
+                                                               hit_rate(stats)))
+        self.write("%% %d query shapes:" % len(kb._shapes))
+        for key, shape in sorted(list(kb._shapes.items())):
+            plan = "not planned" if shape.plan is None else shape.plan[0]
+            if plan == "facts" and shape.columns:
+                plan += ", looked up by arg %s" % ", ".join(str(c + 1) for c in shape.columns)
+            self.write("%%   %-24s %s" % (key, plan))
+
+COMMANDS = {"help": Session.help, "time": Session.time, "profile": Session.profile, "stats": Session.stats,
+            "table": Session.table, "indexes": Session.indexes, "cache": Session.cache}
+
+## the text of a query typed in the session and whether it is cut ("!" at its end)
+def query_text(line):
+    text = line.strip().rstrip("?.").strip()
+    if not text:
+        raise ValueError("a query is expected")
+    if text.endswith("!"):
+        return text[:-1], True
+    return text, False
+
+## what run() returns, how long it took and what the engine did meanwhile
+def measured(kb, run):
+    metrics = kb.metrics
+    if metrics is None:
+        kb.enable_metrics()
+    before = kb.stats()
+    start = perf_counter()
+    try:
+        result = run()
+    finally:
+        seconds = perf_counter() - start
+        after = kb.stats()
+        if metrics is None:
+            kb.enable_metrics(False)
+    counts = {name: after[name] - before[name] for name in COUNTERS}
+    counts["calls"] = Counter(after["calls"]) - Counter(before["calls"])
+    return result, seconds, counts
+
+def engine(counts):
+    return "%d inferences, %d unifications (%d failed), %d index probes, %d scans" % (
+        counts["inferences"], counts["unifications"], counts["unification_failures"],
+        counts["index_probes"], counts["scans"])
+
+def elapsed(seconds):
+    if seconds < 0.001:
+        return "%.1f us" % (seconds * 1e6)
+    if seconds < 1:
+        return "%.3f ms" % (seconds * 1e3)
+    return "%.3f s" % seconds
+
+def hit_rate(stats):
+    looked = stats["cache_hits"] + stats["cache_misses"]
+    return "%.0f%%" % (100.0 * stats["cache_hits"] / looked) if looked else "-"
+
+def answer_text(answer):
+    if isinstance(answer, dict):
+        return ", ".join("%s = %s" % item for item in answer.items()) or "Yes"
+    return str(answer)
+
+## how the facts of a bucket are looked up
+def lookups(facts):
+    if type(facts) is LazyFacts:
+        return ["not read yet (%d ranges of %s)" % (len(facts.ranges), facts.path)]
+    if isinstance(facts, ColumnStore):
+        return ["every arg, column store %s" % facts.path]
+    if isinstance(facts, SQLiteTable):
+        return ["by the indexes of the database (%s)" % facts.source]
+    if not isinstance(facts, FactHeap):
+        return [type(facts).__name__]
+    lines = ["arg 1, sorted"]
+    indexes = facts._indexes
+    if indexes is not None and indexes[0] is facts._container:
+        for column, (found, other) in sorted(list(indexes[1].items())):
+            lines.append("arg %d, %d values%s" % (column + 1, len(found),
+                                                  " (+%d not texts)" % len(other) if other else ""))
+    return lines
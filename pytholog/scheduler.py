@@ -0,0 +1,176 @@
+import threading
+from collections import deque, OrderedDict
+from .querizer import solve
+from .util import term_checker, answer_handler
+
+## a fair scheduler for the queries of a server: a long search does not hold up the
+## short lookups sent after it. queries run as resumable tasks (the lazy engine, see
+## solve) on one thread, a slice of `slice` inferences at a time, taking turns:
+##   - between priority classes by weight: in every round of 7 slices "high" gets 4,
+##     "normal" 2 and "low" 1 (a class with nothing to run gives its turn away),
+##   - between the clients of a class, then between the tasks of a client, round robin.
+## so a query that needs one slice waits for at most a slice of each class ahead of
+## it, whatever is running. admission control rejects a query (Overloaded) when
+## max_backlog queries are waiting or when its client has `quota` of them.
+## answers already cached by the knowledge base are returned without a task.
+
+PRIORITIES = ("high", "normal", "low")
+_ROUND = ("high", "normal", "high", "low", "high", "normal", "high")
+
+class Overloaded(RuntimeError):
+    pass
+
+class Task:
+    def __init__(self, kb, expr, limit, priority, client):
+        self.kb = kb
+        self.expr = expr
+        self.limit = limit
+        self.priority = priority
+        self.client = client
+        self.answers = []
+        self.inferences = 0
+        self.slices = 0
+        self.error = None
+        self.engine = None
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def finish(self, error = None):
+        self.error = error
+        self.engine = None
+        self._done.set()
+
+    ## the answers like kb.query gives them, once the task is done
+    def result(self, timeout = None):
+        if not self._done.wait(timeout):
+            raise TimeoutError("%s is still running" % self.expr)
+        if self.error is not None:
+            raise self.error
+        return answer_handler(list(self.answers))
+
+    def __repr__(self):
+        return "Task(%s, %s, %s, %d inferences)" % (self.expr, self.priority, self.client, self.inferences)
+
+class Scheduler:
+    def __init__(self, kb, slice = 500, max_backlog = 1000, quota = 100):
+        self.kb = kb
+        self.slice = slice
+        self.max_backlog = max_backlog
+        self.quota = quota
+        self.backlog = 0
+        self.peak_backlog = 0  ## the most queries waiting at once
+        self._waiting = {}  ## client -> its queries not done
+        self._queues = {p: OrderedDict() for p in PRIORITIES}  ## client -> deque of tasks
+        self._turn = 0
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread = threading.Thread(target = self._run, name = "pytholog-scheduler", daemon = True)
+        self._thread.start()
+
+    ## queue a query, its answers are task.result(). it is run on the scheduler's
+    ## knowledge base or on `kb` (e.g. when a server hosts several, see registry.py)
+    def submit(self, expr, limit = None, priority = "normal", client = None, kb = None):
+        if priority not in self._queues:
+            raise ValueError("priority is one of %s, got %r" % (", ".join(PRIORITIES), priority))
+        task = Task(self.kb if kb is None else kb, expr, limit, priority, client)
+        if limit is None and term_checker(expr)[1] in task.kb._cache:
+            task.answers = task.kb.query(expr)
+            task.finish()
+            return task
+        with self._cond:
+            if self._stopping:
+                raise Overloaded("the scheduler is stopped")
+            if self.backlog >= self.max_backlog:
+                raise Overloaded("%d queries are waiting" % self.backlog)
+            if self._waiting.get(client, 0) >= self.quota:
+                raise Overloaded("%s has %d queries waiting" % (client, self.quota))
+            self.backlog += 1
+            self.peak_backlog = max(self.peak_backlog, self.backlog)
+            self._waiting[client] = self._waiting.get(client, 0) + 1
+            self._queues[priority].setdefault(client, deque()).append(task)
+            self._cond.notify()
+        return task
+
+    def query(self, expr, limit = None, priority = "normal", client = None, timeout = None, kb = None):
+        return self.submit(expr, limit, priority, client, kb).result(timeout)
+
+    ## the next task to run a slice of: the class whose turn it is (or the next one
+    ## with something to run), its first client and that client's first task
+    def _next(self):
+        for i in range(len(_ROUND)):
+            queue = self._queues[_ROUND[(self._turn + i) % len(_ROUND)]]
+            if queue:
+                self._turn = (self._turn + i + 1) % len(_ROUND)
+                client, tasks = queue.popitem(last = False)
+                task = tasks.popleft()
+                if tasks:
+                    queue[client] = tasks  ## the client goes after the others
+                return task
+        return None
+
+    def _requeue(self, task):
+        queue = self._queues[task.priority]
+        if task.client in queue:
+            queue[task.client].append(task)
+        else:
+            queue[task.client] = deque([task])
+
+    def _done(self, task):
+        self.backlog -= 1
+        self._waiting[task.client] -= 1
+        if not self._waiting[task.client]:
+            del self._waiting[task.client]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                task = None
+                while not self._stopping:
+                    task = self._next()
+                    if task is not None: break
+                    self._cond.wait()
+                if task is None:
+                    return
+            finished = self._slice(task)
+            with self._cond:
+                if finished:
+                    self._done(task)
+                else:
+                    self._requeue(task)
+
+    ## run the task for a slice, True when it is done
+    def _slice(self, task):
+        try:
+            if task.engine is None:
+                task.engine = solve(task.kb, task.expr, ticks = True)
+            task.slices += 1
+            count = 0
+            for found in task.engine:
+                count += 1
+                if found is not None:
+                    task.answers.append(found)
+                    if task.limit and len(task.answers) >= task.limit:
+                        break
+                elif count >= self.slice:
+                    task.inferences += count
+                    return False
+            task.inferences += count
+            task.finish()
+        except Exception as e:
+            task.finish(e)
+        return True
+
+    ## stop after the running slice, the tasks left are ended with Overloaded
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join()
+        for queue in self._queues.values():
+            for tasks in queue.values():
+                for task in tasks:
+                    task.finish(Overloaded("the scheduler is stopped"))
+            queue.clear()
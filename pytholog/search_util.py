@@ -1,101 +1,146 @@
-from .unify import unify
+from .unify import unify_args, unify_terms
 from .goal import Goal
-from .util import prob_parser, substitute_vars
-from .fact import Fact
-import re
+from .domain import Bindings
+from .term import Var, PList, deref, term_value, term_var_indices, arith_source, list_length
        
-def parent_inherits(rl, rulef, currentgoal, Q):
-    for f in range(len(rulef)): ## loop over corresponding rules
+## the search works on compiled facts (see term.py): every branch carries one binding
+## store (the goal domain) and a called fact gets its variables renamed apart by taking
+## the next free ids of the store as its offset, nothing is parsed or renamed as text
+def child_assigned(rl, rulef, currentgoal, Q, last_call = True):
+    ## last-call optimisation: when this is the last goal of the rule, the rule has
+    ## nothing left to do once it is solved. Its children take its parent as their own
+    ## so the finished rule frame is released and tail recursion runs in constant memory.
+    ## the query frame is kept as answers are read from it. the bindings of the released
+    ## frames are trimmed from the child's domain too (see trim_domain), as a tail call
+    ## does not go back through child_to_parent until the recursion ends.
+    last = last_call and currentgoal.ind == len(currentgoal.fact.rhs) - 1
+    parent = currentgoal.parent if last and currentgoal.parent is not None else currentgoal
+    offset = currentgoal.domain.top
+    for f in range(len(rulef)): ## loop over corresponding facts
         ## take only the ones with the same predicate and same number of terms
-        if len(rl.terms) != len(rulef[f].lh.terms): continue
-        ## a father goal is the rule we need to search inheriting the domain of the grandfather    
-        father = Goal(rulef[f], currentgoal)
-        ## unify current rule fact lh with father rhs to get grandfather domain inherited
+        if len(rl.args) != len(rulef[f].lh.args): continue
         # Use a COPY of currentgoal.domain to avoid polluting it with bindings from failed unifications
-        currentgoal_domain_copy = currentgoal.domain.copy()
-        uni = unify(rulef[f].lh, rl,
-            father.domain, ## saving in father domain
-            currentgoal_domain_copy) ## using current goal domain (query input)
-        if uni:
-            Q.push(father) ## if unify succeeds add father to queue to be searched
-        
-def child_assigned(rl, rulef, currentgoal, Q):   
-    if len(currentgoal.domain) == 0 or all(i not in currentgoal.domain for i in rl.terms):
-        for f in range(len(rulef)): ## loop over corresponding facts
-            ## take only the ones with the same predicate and same number of terms
-            if len(rl.terms) != len(rulef[f].lh.terms): continue
-            ## a child goal from the current fact with current goal as parent    
-            child = Goal(rulef[f], currentgoal)
-            ### if there is nothing to unify then push to the queue directly
+        # (domains are persistent so the copy is an O(1) fork sharing the bindings)
+        domain = currentgoal.domain.fork()
+        ## unify current rule fact lh with current goal rhs to get child domain
+        if unify_args(rulef[f].lh.args, offset, rl.args, currentgoal.offset, domain):
+            domain.top = offset + rulef[f].nvars
+            ## a child goal from the current fact, searched from its first rh
+            child = Goal(rulef[f], parent, domain, 0, offset)
+            if parent is not currentgoal:
+                trim_domain(child)
             Q.push(child)
             
-    else:
-        # Use a full scan over candidate facts when we have domain info.
-        # Binary-search optimization is fragile when facts contain variables or list-structures,
-        # and can miss valid candidates. A full scan is correct and simpler.
-        first, last = (0, len(rulef))
-        for f in range(first, last): ## loop over only corresponding facts
-            ## take only the ones with the same predicate and same number of terms
-            if len(rl.terms) != len(rulef[f].lh.terms): continue
-            ## a child goal from the current fact with current goal as parent    
-            child = Goal(rulef[f], currentgoal)
-            
-            ## unify current rule fact lh with current goal rhs to get child domain
-            # Use a COPY of currentgoal.domain to avoid polluting it
-            currentgoal_domain_copy = currentgoal.domain.copy()
-            uni = unify(rulef[f].lh, rl,
-                        child.domain, ## saving in child domain
-                        currentgoal_domain_copy) ## using current goal domain
-            
-            if uni:
-                Q.push(child) ## if unify succeeds add child to queue to be searched
-                
-            
+## the args of a goal that are bound to text constants, [(column, text)...]
+## (a bucket of facts is probed by them rather than read through, see FactHeap.probe)
+def bound_args(rl, currentgoal):
+    bound = []
+    for c, a in enumerate(rl.args):
+        t, _ = deref(a, currentgoal.offset, currentgoal.domain)
+        if isinstance(t, str):
+            bound.append((c, t))
+    return bound
+
+## the domains binding the args (called at off) to the rows of a store (a column
+## store or an external table). text constants select the rows in the store (by
+## its indexes or in SQL), the other args are unified with the selected rows
+def store_matches(store, args, off, domain):
+    if len(args) != store.arity: return
+    args = [deref(a, off, domain) for a in args]
+    rows = store.select([t if isinstance(t, str) else None for t, _ in args])
+    unified = [(c, t, toff) for c, (t, toff) in enumerate(args) if not isinstance(t, str)]
+    for row in rows:
+        child = domain.fork()
+        for c, t, toff in unified:
+            if not unify_terms(t, toff, store.value(row, c), 0, child): break
+        else:
+            yield child
+
+## a goal on a store: the rows are ground facts without a body, so the goal
+## is solved as soon as they are unified and its clause moves on to the next goal
+def rows_assigned(rl, store, currentgoal, Q):
+    for domain in store_matches(store, rl.args, currentgoal.offset, currentgoal.domain):
+        Q.push(Goal(currentgoal.fact, currentgoal.parent, domain,
+                    currentgoal.ind + 1, currentgoal.offset))
+
 def child_to_parent(child, Q): # which is the current goal
-    parent = child.parent.__copy__() #to ensure that parent's domain is different without affecting children's
-    
-    # Simply unify parent's current RHS goal with child's LH using their respective domains
-    # This propagates bindings from the child back to the parent
-    unify(parent.fact.rhs[parent.ind], ## unify parent goals
-          child.fact.lh,  ## with their children to go step down
-          parent.domain,
-          child.domain)
-    parent.ind += 1 ## next rh in the same goal object (lateral move) 
-    Q.push(parent) ## add the parent to the queue to be searched
+    ## the child bindings are already in its domain, the parent only moves on
+    parent = child.parent
+    resumed = Goal(parent.fact, parent.parent, child.domain, 
+                   parent.ind + 1, ## next rh in the same goal object (lateral move) 
+                   parent.offset)
+    trim_domain(resumed)
+    Q.push(resumed) ## add the parent to the queue to be searched
+
+## the domain is only trimmed once it has grown this much since the last trimming
+TRIM_SIZE = 64
 
+## environment trimming: drop the bindings no live goal can reach anymore.
+## the roots are the variables the goal and its parents still mention (head and
+## remaining goals) and all the query variables as they are the answer.
+def trim_domain(goal):
+    domain = goal.domain
+    if len(domain) < max(TRIM_SIZE, 2 * domain.trimmed):
+        return
+    roots = []
+    g, ind = goal, goal.ind
+    while g is not None:
+        live = range(g.fact.nvars) if g.parent is None else g.fact.live_vars(ind)
+        roots.extend(g.offset + i for i in live)
+        g, ind = g.parent, g.parent.ind + 1 if g.parent is not None else 0
+    kept = Bindings(domain.top)
+    while roots:
+        vid = roots.pop()
+        if vid in kept: continue
+        binding = domain.get(vid)
+        if binding is None: continue
+        kept[vid] = binding
+        term, off = binding
+        roots.extend(off + i for i in term_var_indices(term))
+    kept.trimmed = len(kept)
+    goal.domain = kept
 
 def prob_calc(currentgoal, rl, Q):
     ## Probabilities and numeric evaluation
-    rule_str = rl.to_string()
-    
-    # Check if this is an assignment (has "is") or just a constraint check
-    if "is" in rule_str:
-        # Assignment: Var is Expression
-        key, value = prob_parser(currentgoal.domain, rule_str, rl.terms)
-        value = eval(value)
-        currentgoal.domain[key] = value  # Bind the variable to the result
-        prob_child = Goal(Fact(rule_str),
-                          parent = currentgoal,
-                          domain = currentgoal.domain)
-        Q.push(prob_child)
+    domain = currentgoal.domain.fork()
+    value = eval(arith_source(rl.arith, currentgoal.offset, domain))
+    if rl.arith.target is not None:
+        # Assignment: Var is Expression, bind the variable to the result
+        ok = unify_terms(rl.arith.target, currentgoal.offset, value, 0, domain)
     else:
         # Constraint check: Expression (e.g., X > 5)
-        # Substitute all variables and evaluate
-        value = rule_str
-        for term in rl.terms:
-            if term in currentgoal.domain:
-                value = re.sub(term, str(currentgoal.domain[term]), value)
-        result = eval(value)
-        
-        # Only continue if the constraint is satisfied
-        if result:
-            prob_child = Goal(Fact(rule_str),
-                              parent = currentgoal,
-                              domain = currentgoal.domain)
-            Q.push(prob_child)
-        # If result is False, don't push anything - this path fails
+        ok = value
+    # Only continue if it holds - otherwise this path fails
+    if ok:
+        Q.push(Goal(currentgoal.fact, currentgoal.parent, domain,
+                    currentgoal.ind + 1, currentgoal.offset))
 
 
+## predicates the search knows without them being in the knowledge base
+## (a knowledge base defining them itself takes precedence)
+BUILTINS = ("neq", "length")
+
+## length(List, N): lists know their length so this is O(1) for a proper list.
+## an unbound list with a known length becomes a list of fresh variables
+def list_len(rule, currentgoal, Q):
+    if len(rule.args) != 2: return
+    lst, n = rule.args
+    off = currentgoal.offset
+    domain = currentgoal.domain.fork()
+    size = list_length(lst, off, domain)
+    if size is None:
+        size = term_value(n, off, domain)
+        if isinstance(size, str):
+            if not size.isdigit(): return
+            size = int(size)
+        top = domain.top
+        domain.top += size
+        fresh = PList([Var(i, "_L") for i in range(size)])
+        if not unify_terms(lst, off, fresh, top, domain): return
+    if unify_terms(n, off, size, 0, domain):
+        Q.push(Goal(currentgoal.fact, currentgoal.parent, domain,
+                    currentgoal.ind + 1, currentgoal.offset))
+
 def fact_binary_search(facts, key):
     # search for the indices of the key in the facts heap
     # start to get last occurrence index at the right side
@@ -126,9 +171,7 @@ def fact_binary_search(facts, key):
     
 def filter_eq(rule, currentgoal, Q):
     # apply inequality check
-    currentgoal.domain = {k:v for k,v in currentgoal.domain.items() if currentgoal.domain[rule.terms[0]] != currentgoal.domain[rule.terms[1]]}
-
-    prob_child = Goal(Fact(rule.to_string()),
-                      parent = currentgoal,
-                      domain = currentgoal.domain)
-    Q.push(prob_child)
\ No newline at end of file
+    a, b = (term_value(t, currentgoal.offset, currentgoal.domain) for t in rule.args)
+    if a != b:
+        Q.push(Goal(currentgoal.fact, currentgoal.parent, currentgoal.domain,
+                    currentgoal.ind + 1, currentgoal.offset))
@@ -0,0 +1,235 @@
+import io
+import os
+import sys
+import gc
+import signal
+import socket
+import threading
+import traceback
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import unquote
+
+## a pre-forking WSGI server (standard library only) for serving a knowledge base:
+## the parent binds the socket and forks the workers after the knowledge base is
+## loaded, so they share its pages (copy on write, the objects are moved out of the
+## garbage collector's reach first so it does not write to them) and no worker reads
+## it again. a worker answers connections from `threads` threads that accept on the
+## shared socket themselves, so a worker only takes the connections it has a thread
+## for. connections are kept alive (HTTP/1.1) between requests until they are idle
+## for keep_alive seconds; responses without a length are sent chunked.
+##
+## the workers are separate processes: what a request changes in the knowledge base
+## is only changed in the worker that answered it, so the knowledge base they serve
+## is meant to be read only. a worker that dies is replaced.
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "pytholog"
+
+    def setup(self):
+        self.timeout = self.server.keep_alive
+        BaseHTTPRequestHandler.setup(self)
+
+    def log_message(self, format, *args):
+        if self.server.access_log:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def _environ(self):
+        path, _, query = self.path.partition("?")
+        environ = dict(self.server.base_environ)
+        environ["REQUEST_METHOD"] = self.command
+        environ["PATH_INFO"] = unquote(path, "iso-8859-1")
+        environ["QUERY_STRING"] = query
+        environ["SERVER_PROTOCOL"] = self.request_version
+        environ["REMOTE_ADDR"] = self.client_address[0] if self.client_address else ""
+        for key, value in self.headers.items():
+            key = key.upper().replace("-", "_")
+            if key not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+                key = "HTTP_" + key
+            if key in environ:
+                value = environ[key] + "," + value
+            environ[key] = value
+        ## the body is read whole so the next request of the connection is where it starts
+        length = int(self.headers.get("Content-Length") or 0)
+        environ["wsgi.input"] = io.BytesIO(self.rfile.read(length) if length else b"")
+        environ["wsgi.errors"] = sys.stderr
+        return environ
+
+    def _run(self):
+        if "chunked" in self.headers.get("Transfer-Encoding", "").lower():
+            self.send_error(411, "Length Required")
+            return
+        response = {"status": None, "headers": None, "sent": False, "chunked": False}
+
+        def start_response(status, headers, exc_info = None):
+            if exc_info and response["sent"]:
+                raise exc_info[1].with_traceback(exc_info[2])
+            response["status"], response["headers"] = status, headers
+            return write
+
+        def send_headers():
+            code, _, reason = response["status"].partition(" ")
+            self.send_response(int(code), reason)
+            names = set()
+            for name, value in response["headers"]:
+                names.add(name.lower())
+                self.send_header(name, value)
+            if "content-length" not in names and self.command != "HEAD":
+                if self.request_version == "HTTP/1.1":
+                    response["chunked"] = True
+                    self.send_header("Transfer-Encoding", "chunked")
+                else:
+                    self.close_connection = True
+            if self.close_connection:
+                self.send_header("Connection", "close")
+            self.end_headers()
+            response["sent"] = True
+
+        def write(data):
+            if not response["sent"]:
+                send_headers()
+            if not data or self.command == "HEAD":
+                return
+            if response["chunked"]:
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            else:
+                self.wfile.write(data)
+
+        try:
+            result = self.server.app(self._environ(), start_response)
+            try:
+                for data in result:
+                    write(data)
+                if not response["sent"]:
+                    response["headers"] = list(response["headers"]) + [("Content-Length", "0")]
+                    send_headers()
+                if response["chunked"]:
+                    self.wfile.write(b"0\r\n\r\n")
+            finally:
+                if hasattr(result, "close"):
+                    result.close()
+        except (ConnectionError, socket.timeout):
+            self.close_connection = True
+        except Exception:
+            traceback.print_exc()
+            self.close_connection = True
+            if not response["sent"]:
+                self.send_error(500)
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_PATCH = do_HEAD = do_OPTIONS = _run
+
+
+class Server:
+    def __init__(self, app, host = "127.0.0.1", port = 8000, workers = 1, threads = 8,
+                 keep_alive = 5, backlog = 1024, access_log = False):
+        if workers > 1 and not hasattr(os, "fork"):
+            raise OSError("more than one worker needs os.fork")
+        self.app = app
+        self.workers = workers
+        self.threads = threads
+        self.keep_alive = keep_alive
+        self.access_log = access_log
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((host, port))
+        self.socket.listen(backlog)
+        ## accepts wake up now and then to see if the worker is stopping
+        self.socket.settimeout(0.5)
+        self.address = self.socket.getsockname()
+        self.base_environ = {
+            "SERVER_NAME": socket.getfqdn(self.address[0]),
+            "SERVER_PORT": str(self.address[1]),
+            "SCRIPT_NAME": "",
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": "http",
+            "wsgi.multithread": threads > 1,
+            "wsgi.multiprocess": workers > 1,
+            "wsgi.run_once": False,
+        }
+        self._stopping = threading.Event()
+        self._children = {}
+
+    def _accept(self):
+        while not self._stopping.is_set():
+            try:
+                conn, address = self.socket.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                if self._stopping.is_set(): break
+                continue
+            conn.settimeout(None)
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            try:
+                Handler(conn, address, self)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                try:
+                    conn.shutdown(socket.SHUT_WR)
+                except OSError:
+                    pass
+                conn.close()
+
+    ## answer connections until stop() (or a signal in a forked worker)
+    def serve_worker(self):
+        pool = [threading.Thread(target = self._accept, name = "pytholog-worker-%d" % i, daemon = True)
+                for i in range(self.threads)]
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+
+    def stop(self, *args):
+        self._stopping.set()
+
+    def _fork(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                signal.signal(signal.SIGTERM, self.stop)
+                signal.signal(signal.SIGINT, self.stop)
+                self.serve_worker()
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        self._children[pid] = True
+
+    ## fork the workers and replace the ones that die until the parent is stopped
+    def serve(self):
+        if self.workers <= 1:
+            return self.serve_worker()
+        gc.collect()
+        if hasattr(gc, "freeze"):
+            gc.freeze()
+        previous = {s: signal.signal(s, self.stop) for s in (signal.SIGTERM, signal.SIGINT)}
+        try:
+            for _ in range(self.workers):
+                self._fork()
+            while not self._stopping.wait(0.2):
+                for pid in list(self._children):
+                    done, _ = os.waitpid(pid, os.WNOHANG)
+                    if done:
+                        del self._children[pid]
+                        self._fork()
+        finally:
+            for pid in list(self._children):
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+            for pid in list(self._children):
+                try:
+                    os.waitpid(pid, 0)
+                except ChildProcessError:
+                    pass
+            self._children.clear()
+            for s, handler in previous.items():
+                signal.signal(s, handler)
+            self.socket.close()
+
+def serve(app, host = "127.0.0.1", port = 8000, workers = 1, threads = 8, keep_alive = 5, **options):
+    Server(app, host, port, workers, threads, keep_alive, **options).serve()
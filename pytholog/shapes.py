@@ -0,0 +1,93 @@
+import re
+from .expr import Expr
+from .term import Var
+from .querizer import plan_query
+
+## query shapes: a query with its constants taken out, e.g. "path(?,Y,P)" for
+## path(seattle, Y, P). kb.query keeps a plan for each shape it has answered (see
+## shaped), so the queries differing only by their constants share:
+##   - the compiled goal: a query text of a known shape is not read again, its
+##     constants are put in the args of the goal read the first time,
+##   - the way its answers are found (facts only, one SQL query or the search, see
+##     plan_query) and the columns of the bound args the facts are looked up by.
+## the plans of the changed predicates, and of the ones calling them, are dropped
+## with their cached answers (see KnowledgeBase._invalidate); the goals stay.
+## only flat query texts (a predicate on names, variables and numbers) are compiled
+## by their shape, the others are read by the reader.
+
+MAX_SHAPES = 1024  ## the shapes are forgotten when there are more
+
+_FLAT = re.compile(r"\s*([a-z][A-Za-z0-9_]*)\(([^()]*)\)\s*\.?\s*$")
+_ARG = re.compile(r"\s*(?:([A-Z_][A-Za-z0-9_]*)|([a-z][A-Za-z0-9_]*|-?[0-9]+(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?))\s*$")
+
+class Shape:
+    __slots__ = ("key", "goal", "slots", "columns", "plan")
+
+    def __init__(self, key, goal):
+        self.key = key
+        self.goal = goal  ## a query of the shape, compiled
+        self.slots = tuple(i for i, a in enumerate(goal.args) if not isinstance(a, Var))
+        self.columns = tuple(i for i in self.slots if i)  ## the first arg is binary searched
+        self.plan = None  ## (see plan_query), None until it is chosen again
+
+    def planned(self, kb):
+        plan = self.plan
+        if plan is None:
+            plan = self.plan = plan_query(kb, self.goal.predicate)
+        return plan
+
+    def __repr__(self):
+        return "Shape(%s, %s)" % (self.key, "unplanned" if self.plan is None else self.plan[0])
+
+## the shape of a flat query text and its constants, None when it is not flat
+def read_flat(text):
+    m = _FLAT.match(text)
+    if m is None:
+        return None
+    names, consts = [], []
+    for arg in m.group(2).split(","):
+        a = _ARG.match(arg)
+        if a is None:
+            return None
+        var, const = a.groups()
+        if var is None:
+            names.append("?")
+            consts.append(const)
+        else:
+            names.append(var)
+    return "%s(%s)" % (m.group(1), ",".join(names)), consts
+
+## the shape of a compiled query, None for arithmetic or args that are lists
+def shape_of(expr):
+    if expr.arith is not None:
+        return None
+    names = []
+    for a, t in zip(expr.args, expr.terms):
+        if isinstance(a, Var):
+            names.append(t)
+        elif isinstance(a, str):
+            names.append("?")
+        else:
+            return None
+    return "%s(%s)" % (expr.predicate, ",".join(names)) if names else expr.predicate
+
+## a query (text or Expr) compiled, with the plan of its shape and the columns
+## its facts are looked up by (None: found from the args)
+def shaped(kb, query):
+    shapes = kb._shapes
+    if isinstance(query, str):
+        flat = read_flat(query)
+        if flat is not None:
+            shape = shapes.get(flat[0])
+            if shape is not None:
+                return shape.goal.replaced(zip(shape.slots, flat[1])), shape.planned(kb), shape.columns
+        query = Expr(query)
+    key = shape_of(query)
+    if key is None:
+        return query, plan_query(kb, query.predicate), None
+    shape = shapes.get(key)
+    if shape is None:
+        if len(shapes) >= MAX_SHAPES:
+            shapes.clear()
+        shape = shapes[key] = Shape(key, query)
+    return query, shape.planned(kb), shape.columns
@@ -0,0 +1,321 @@
+import sys
+import struct
+from itertools import islice, repeat
+from array import array
+from .fact import Fact
+from .expr import Expr
+from .term import Var, PList, NIL, Arith, hashcons
+from .pq import FactHeap
+from .columns import ColumnStore
+from .external import SQLiteTable
+
+## knowledge base snapshots: the compiled clauses of every predicate in a compact
+## binary file, so a process can start without reading and compiling prolog text.
+##
+##   header      magic, format version, journal epoch (see journal.py)
+##   symbols     count, byte size, the utf-8 symbols separated by \0
+##   name        symbol id of the knowledge base name
+##   predicates  count, then for each: predicate symbol, rules count, row arity,
+##               runs size, rows size, code size, then the three int arrays
+##   attached    count, then for each: kind (STORE or TABLE), predicate, path symbols,
+##               and for a TABLE its source and column count, then the column symbols
+##
+## predicates attached to a column store or a database table (see attach_store and
+## external) are saved as where they are attached, not as their rows: loading the
+## snapshot attaches them again.
+##
+## the clauses of a predicate are kept in their sorted order as alternating runs of
+## rows and coded clauses. rows are the ground facts with text args of the row
+## arity, stored as a table of symbol ids (so reading them is a bulk array read).
+## facts with numbers in their args (imported tables, see tabular.py) are coded
+## clauses, their numbers are coded as INT or FLOAT with the symbol of their repr.
+## the code of other clauses is a stream of 32 bit ints (little endian):
+##   clause   nvars, varname symbols, body size, head expr, body exprs
+##   expr     CALL nvars predicate nargs (term symbol, term)...
+##            ARITH nvars text nleaves leaves... target? [term] ntemplate (CHUNK symbol | VAR index)...
+##   term     CONST symbol | VAR index | LIST n tail? elems... [tail] | INT symbol | FLOAT symbol
+
+MAGIC = b"PYTHOLOG"
+VERSION = 4
+
+_HEADER = struct.Struct("<8sI")
+_COUNT = struct.Struct("<I")
+_PREDICATE = struct.Struct("<IIIIII")
+
+CONST, VAR, LIST, INT, FLOAT = 0, 1, 2, 3, 4
+CALL, ARITH = 0, 1
+CHUNK = 0
+STORE, TABLE = 0, 1
+
+class SnapshotError(ValueError):
+    pass
+
+## "i" is 32 bits on the platforms python supports
+def _ints(data = b""):
+    code = array("i")
+    code.frombytes(data)
+    if sys.byteorder == "big":
+        code.byteswap()
+    return code
+
+class _Encoder:
+    def __init__(self):
+        self.symbols = {}
+        self.code = None
+
+    def sym(self, s):
+        if not isinstance(s, str):
+            raise SnapshotError("only text constants can be saved, got %r" % (s,))
+        i = self.symbols.get(s)
+        if i is None:
+            if "\0" in s:
+                raise SnapshotError("symbol with a NUL character: %r" % s)
+            i = self.symbols[s] = len(self.symbols)
+        return i
+
+    def clause(self, fact):
+        code = self.code
+        code.append(fact.nvars)
+        code.extend(self.sym(v) for v in fact.varnames)
+        code.append(len(fact.rhs))
+        self.expr(fact.lh)
+        for goal in fact.rhs:
+            self.expr(goal)
+
+    def expr(self, expr):
+        code = self.code
+        if expr.arith is None:
+            code.extend((CALL, expr.nvars, self.sym(expr.predicate), len(expr.args)))
+            for text, arg in zip(expr.terms, expr.args):
+                code.append(self.sym(text))
+                self.term(arg)
+            return
+        arith = expr.arith
+        code.extend((ARITH, expr.nvars, self.sym(expr._text), len(expr.terms)))
+        code.extend(self.sym(t) for t in expr.terms)
+        code.append(arith.target is not None)
+        if arith.target is not None:
+            self.term(arith.target)
+        code.append(len(arith.template))
+        for part in arith.template:
+            if isinstance(part, Var):
+                code.extend((VAR, part.index))
+            else:
+                code.extend((CHUNK, self.sym(part)))
+
+    def term(self, term):
+        code = self.code
+        if isinstance(term, Var):
+            code.extend((VAR, term.index))
+        elif isinstance(term, PList):
+            code.extend((LIST, term.length, term.tail is not None))
+            for e in term.elems:
+                self.term(e)
+            if term.tail is not None:
+                self.term(term.tail)
+        elif isinstance(term, (int, float)) and not isinstance(term, bool):
+            code.extend((INT if isinstance(term, int) else FLOAT, self.sym(repr(term))))
+        else:
+            code.extend((CONST, self.sym(term)))
+
+## where a store or table is attached: (kind, predicate, path, source, columns) symbols
+def _attached(enc, pred, facts, databases):
+    if isinstance(facts, ColumnStore):
+        return [STORE, enc.sym(pred), enc.sym(facts.path)]
+    path = databases.get(id(facts.connection))
+    if path is None or path == ":memory:":
+        raise SnapshotError("%s is in a database that cannot be opened again" % pred)
+    return ([TABLE, enc.sym(pred), enc.sym(path), enc.sym(facts.source), len(facts.columns)] +
+            [enc.sym(c) for c in facts.columns])
+
+## `epoch` is the first journal epoch the snapshot does not include
+def save(kb, path, epoch = 0):
+    enc = _Encoder()
+    name = enc.sym(kb.name)
+    predicates = []
+    attached = []
+    databases = {id(connection): p for p, connection in kb._databases.items()}
+    for pred, bucket in kb.db.items():
+        facts = bucket["facts"]
+        if isinstance(facts, (ColumnStore, SQLiteTable)):
+            attached.append(_attached(enc, pred, facts, databases))
+            continue
+        enc.code, runs, rows = _ints(), _ints(), _ints()
+        arity = None
+        coded = False  ## kind of the current run, runs start with rows
+        run = 0
+        for i in range(len(facts)):
+            row = facts[i].row()
+            if row is not None and not all(isinstance(a, str) for a in facts[i].lh.args):
+                row = None  ## (numbers keep their type as coded terms)
+            if row is not None and arity is None:
+                arity = len(row)
+            is_row = row is not None and len(row) == arity
+            if is_row == coded:
+                runs.append(run)
+                coded, run = not coded, 0
+            run += 1
+            if is_row:
+                rows.extend(enc.sym(t) for t in row)
+            else:
+                enc.clause(facts[i])
+        runs.append(run)
+        predicates.append((enc.sym(pred), bucket["rules"], arity or 0, runs, rows, enc.code))
+    blob = "\0".join(enc.symbols).encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION) + _COUNT.pack(epoch))
+        f.write(_COUNT.pack(len(enc.symbols)) + _COUNT.pack(len(blob)))
+        f.write(blob)
+        f.write(_COUNT.pack(name) + _COUNT.pack(len(predicates)))
+        for pred, rules, arity, *arrays in predicates:
+            f.write(_PREDICATE.pack(pred, rules, arity, *(len(a) for a in arrays)))
+            for a in arrays:
+                if sys.byteorder == "big":
+                    a.byteswap()
+                f.write(a.tobytes())
+        f.write(_COUNT.pack(len(attached)))
+        for a in attached:
+            f.write(b"".join(map(_COUNT.pack, a)))
+
+class _Decoder:
+    def __init__(self, symbols):
+        self.symbols = symbols
+        self.code = None
+        self.pos = 0
+
+    def clause(self):
+        code, syms = self.code, self.symbols
+        nvars = code[self.pos]
+        varnames = [syms[i] for i in code[self.pos + 1:self.pos + 1 + nvars]]
+        nbody = code[self.pos + 1 + nvars]
+        self.pos += nvars + 2
+        ## one Var per clause variable, shared by its occurrences
+        self.vars = [Var(i, v) for i, v in enumerate(varnames)]
+        fact = object.__new__(Fact)
+        fact._live = None
+        fact.varnames = varnames or ()
+        fact.nvars = nvars
+        fact.lh = self.expr(fact.varnames)
+        fact.rhs = [self.expr(fact.varnames) for _ in range(nbody)]
+        return fact
+
+    def expr(self, varnames):
+        code, syms = self.code, self.symbols
+        kind, nvars, sym, n = code[self.pos:self.pos + 4]
+        self.pos += 4
+        expr = object.__new__(Expr)
+        expr.varnames = varnames if nvars else ()
+        expr.nvars = nvars
+        if kind == CALL:
+            expr.predicate = syms[sym]
+            expr.arith = None
+            expr._text = None
+            terms = []
+            args = []
+            for _ in range(n):
+                terms.append(syms[code[self.pos]])
+                self.pos += 1
+                args.append(self.term())
+            expr.terms = tuple(terms)
+            expr.args = tuple(args)
+            return expr
+        expr.predicate = ""
+        expr.args = ()
+        expr._text = syms[sym]
+        expr.terms = tuple(syms[i] for i in code[self.pos:self.pos + n])
+        self.pos += n + 1
+        target = self.term() if code[self.pos - 1] else None
+        size = code[self.pos]
+        self.pos += 1
+        template = []
+        for _ in range(size):
+            kind, value = code[self.pos], code[self.pos + 1]
+            self.pos += 2
+            template.append(self.vars[value] if kind == VAR else syms[value])
+        expr.arith = Arith(target, template)
+        return expr
+
+    def term(self):
+        code = self.code
+        kind, value = code[self.pos], code[self.pos + 1]
+        if kind == CONST:
+            self.pos += 2
+            return self.symbols[value]
+        if kind == VAR:
+            self.pos += 2
+            return self.vars[value]
+        if kind == INT or kind == FLOAT:
+            self.pos += 2
+            return (int if kind == INT else float)(self.symbols[value])
+        has_tail = code[self.pos + 2]
+        self.pos += 3
+        elems = [self.term() for _ in range(value)]
+        if has_tail:
+            return PList(elems, self.term())
+        return hashcons(PList(elems)) if elems else NIL
+
+def load(kb, path):
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < _HEADER.size:
+        raise SnapshotError("%s is not a pytholog snapshot" % path)
+    magic, version = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise SnapshotError("%s is not a pytholog snapshot" % path)
+    if version not in (1, 2, 3, VERSION):
+        raise SnapshotError("snapshot format %d is not supported (expected %d)" % (version, VERSION))
+    pos = _HEADER.size
+    kb._journal_epoch = 0
+    if version > 1:
+        kb._journal_epoch = _COUNT.unpack_from(data, pos)[0]
+        pos += _COUNT.size
+    nsyms, size = _COUNT.unpack_from(data, pos)[0], _COUNT.unpack_from(data, pos + 4)[0]
+    pos += 8
+    symbols = list(map(sys.intern, data[pos:pos + size].decode("utf-8").split("\0"))) if nsyms else []
+    pos += size
+    name, npreds = _COUNT.unpack_from(data, pos)[0], _COUNT.unpack_from(data, pos + 4)[0]
+    pos += 8
+    kb.name = symbols[name]
+    dec = _Decoder(symbols)
+    for _ in range(npreds):
+        pred, rules, arity, nruns, nrows, ncode = _PREDICATE.unpack_from(data, pos)
+        pos += _PREDICATE.size
+        arrays = []
+        for n in (nruns, nrows, ncode):
+            arrays.append(_ints(data[pos:pos + 4 * n]))
+            pos += 4 * n
+        runs, rows, dec.code = arrays[0], arrays[1], arrays[2].tolist()
+        dec.pos = 0
+        pred = symbols[pred]
+        ## the args of all the rows at once, cut into one tuple per fact
+        values = iter(list(map(symbols.__getitem__, rows)))
+        table = zip(*[values] * arity) if arity else repeat(())
+        clauses = []
+        for i, run in enumerate(runs):
+            if i % 2:
+                clauses.extend(dec.clause() for _ in range(run))
+            else:
+                clauses.extend(Fact.from_row(pred, args) for args in islice(table, run))
+        facts = FactHeap()
+        facts.load(clauses)
+        kb.db[pred] = {"facts": facts, "rules": rules}
+    if version > 2:
+        _attach(kb, data, pos, symbols)
+    return kb
+
+def _attach(kb, data, pos, symbols):
+    def ints(n):
+        nonlocal pos
+        values = struct.unpack_from("<%dI" % n, data, pos)
+        pos += 4 * n
+        return values
+    for _ in range(ints(1)[0]):
+        kind, pred, path = ints(3)
+        pred, path = symbols[pred], symbols[path]
+        if kind == STORE:
+            facts = ColumnStore(path)
+        else:
+            source, ncolumns = ints(2)
+            columns = [symbols[c] for c in ints(ncolumns)]
+            facts = SQLiteTable(pred, kb._database(path), symbols[source], columns)
+        kb.db[pred] = {"facts": facts, "rules": 0}
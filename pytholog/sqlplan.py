@@ -0,0 +1,138 @@
+from .term import Var
+from .external import SQLiteTable, quote
+
+## rules over external predicates compiled into SQL: when every clause of a predicate
+## only calls tables of one SQLite database (or predicates that compile themselves),
+## the predicate becomes one query run by the database instead of a nested loop join
+## in the search. a clause is a SELECT of its head args from its body calls joined on
+## their shared variables, the clauses are a UNION ALL.
+## a predicate calling itself (linear recursion such as a transitive closure) is a
+## WITH RECURSIVE query: a UNION (distinct rows) so it also ends on cyclic data.
+##
+## only calls with constant or variable args and neq are compiled, clauses with
+## arithmetic, lists, in memory facts or other builtins are left to the search.
+
+class _NotSQL(Exception):
+    pass
+
+def literal(value):
+    if not isinstance(value, str):
+        raise _NotSQL(value)
+    return "'%s'" % value.replace("'", "''")
+
+def _columns(arity):
+    return ["a%d" % i for i in range(arity)]
+
+class _Planner:
+    def __init__(self, kb):
+        self.kb = kb
+        self.connection = None
+        self.visiting = set()
+
+    ## the store answering a predicate: its table or its compiled rules
+    def store(self, predicate):
+        bucket = self.kb.db.get(predicate)
+        if bucket is None:
+            raise _NotSQL(predicate)
+        facts = bucket["facts"]
+        if isinstance(facts, SQLiteTable) and not bucket["rules"]:
+            store = facts
+        elif not bucket["rules"]:
+            raise _NotSQL(predicate)
+        elif predicate in self.kb._plans:
+            store = self.kb._plans[predicate]
+            if store is None:
+                raise _NotSQL(predicate)
+        else:
+            if predicate in self.visiting: ## mutual recursion
+                raise _NotSQL(predicate)
+            self.visiting.add(predicate)
+            try:
+                store = self.kb._plans[predicate] = self.compile(predicate, facts)
+            finally:
+                self.visiting.discard(predicate)
+        if self.connection is None:
+            self.connection = store.connection
+        elif store.connection is not self.connection:
+            raise _NotSQL(predicate)
+        return store
+
+    def compile(self, predicate, clauses):
+        arity = len(clauses[0].lh.args)
+        cte = quote("pytholog_" + predicate)
+        base, recursive = [], []
+        for i in range(len(clauses)):
+            clause = clauses[i]
+            if len(clause.lh.args) != arity or clause.lh.arith is not None:
+                raise _NotSQL(predicate)
+            calls = sum(goal.predicate == predicate for goal in clause.rhs)
+            if calls > 1:
+                raise _NotSQL(predicate)
+            (recursive if calls else base).append(self.select(clause, predicate, cte, arity))
+        if self.connection is None: ## no table to query
+            raise _NotSQL(predicate)
+        columns = _columns(arity)
+        if not recursive:
+            sql = " UNION ALL ".join(base)
+        elif base:
+            sql = "WITH RECURSIVE %s(%s) AS (%s) SELECT %s FROM %s" % (
+                cte, ", ".join(columns), " UNION ".join(base + recursive), ", ".join(columns), cte)
+        else:
+            raise _NotSQL(predicate)
+        return SQLiteTable(predicate, self.connection, "(%s)" % sql, columns)
+
+    ## the SELECT of a clause: its body calls are joined on their shared variables
+    def select(self, clause, predicate, cte, arity):
+        tables, where = [], []
+        bound = {}  ## column of the first occurrence of each variable
+        for i, goal in enumerate(clause.rhs):
+            if goal.predicate == "neq" and len(goal.args) == 2:
+                continue
+            if goal.arith is not None or not goal.predicate:
+                raise _NotSQL(goal)
+            if goal.predicate == predicate:
+                source, columns = cte, _columns(arity)
+            else:
+                store = self.store(goal.predicate)
+                source, columns = store.source, store.columns
+            if len(goal.args) != len(columns):
+                raise _NotSQL(goal)
+            alias = "t%d" % i
+            tables.append("%s AS %s" % (source, alias))
+            for column, arg in zip(columns, goal.args):
+                column = "%s.%s" % (alias, quote(column))
+                if not isinstance(arg, Var):
+                    where.append("%s = %s" % (column, literal(arg)))
+                elif arg.name == "_":
+                    continue
+                elif arg.index in bound:
+                    where.append("%s = %s" % (column, bound[arg.index]))
+                else:
+                    bound[arg.index] = column
+        def value(arg):
+            if not isinstance(arg, Var):
+                return literal(arg)
+            if arg.index not in bound: ## not range restricted
+                raise _NotSQL(arg)
+            return bound[arg.index]
+        for goal in clause.rhs:
+            if goal.predicate == "neq":
+                where.append("%s <> %s" % tuple(value(arg) for arg in goal.args))
+        sql = "SELECT " + ", ".join("%s AS a%d" % (value(arg), i) for i, arg in enumerate(clause.lh.args))
+        if tables:
+            sql += " FROM " + ", ".join(tables)
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        return sql
+
+## the compiled rules of a predicate as an external table, None if they do not compile.
+## plans are kept until the knowledge base changes
+def sql_plan(kb, predicate):
+    if not kb._databases or not kb.db[predicate]["rules"]:
+        return None
+    if predicate not in kb._plans:
+        try:
+            _Planner(kb).store(predicate)
+        except _NotSQL:
+            kb._plans[predicate] = None
+    return kb._plans[predicate]
@@ -0,0 +1,90 @@
+import re
+import csv
+import sys
+from itertools import islice
+
+## bulk import of tables (csv files, pandas data frames) as ground facts without
+## writing and reading clause text: every row is the args of a fact made directly
+## (see Fact.from_row). tables are read in batches of columns: repeated values are
+## the same interned object, numbers are kept as python numbers and their text is
+## the term used to sort and index the facts.
+
+_INT = re.compile(r"-?(0|[1-9][0-9]*)")
+_FLOAT = re.compile(r"-?[0-9]+\.[0-9]+([eE][-+]?[0-9]+)?")
+
+## the shared value of each text read from a table: a number or the interned text
+class _Values(dict):
+    def __missing__(self, text):
+        if _INT.fullmatch(text):
+            value = int(text)
+        elif _FLOAT.fullmatch(text):
+            value = float(text)
+        else:
+            value = sys.intern(text)
+        self[text] = value
+        return value
+
+## values of a column: a column of integers is converted at once when its text is
+## the one python writes (no leading zeros or signs), otherwise value by value
+def _column(cells, values):
+    try:
+        ints = list(map(int, cells))
+    except ValueError:
+        return list(map(values.__getitem__, cells))
+    if tuple(map(str, ints)) == cells:
+        return ints
+    return list(map(values.__getitem__, cells))
+
+## the (args, terms) rows of a batch of columns, terms are None for rows of text only
+def _rows(columns, texts):
+    if not texts:
+        return zip(zip(*columns), [None] * len(columns[0]))
+    return zip(zip(*columns), zip(*texts))
+
+## batches of rows of a csv file, `columns` are names (of the header) or positions to keep
+def csv_batches(path, columns = None, header = True, delimiter = ",", batch_size = 100000):
+    values = _Values()
+    with open(path, newline = "", encoding = "utf-8") as f:
+        reader = csv.reader(f, delimiter = delimiter)
+        names = next(reader, []) if header else []
+        width = len(names) if header else None  ## every row has the fields of the first line
+        positions = None
+        if columns is not None:
+            for c in columns:
+                if isinstance(c, str) and c not in names:
+                    raise ValueError("%s has no column %s" % (path, c))
+            positions = [names.index(c) if isinstance(c, str) else c for c in columns]
+        while True:
+            batch = []
+            for row in islice(reader, batch_size):
+                if not row: continue
+                if width is None:
+                    width = len(row)
+                if len(row) != width:
+                    raise ValueError("%s line %d has %d fields, expected %d" % (path, reader.line_num, len(row), width))
+                batch.append(row)
+            if not batch:
+                return
+            cells = list(zip(*batch))
+            if positions is not None:
+                cells = [cells[i] for i in positions]
+            converted = [_column(col, values) for col in cells]
+            ## the text of the numbers is the one read, other values are their own text
+            texts = [col if set(map(type, col)) <= {str} else text
+                     for col, text in zip(converted, cells)]
+            numeric = any(col is not text for col, text in zip(texts, converted))
+            yield _rows(converted, texts if numeric else None)
+
+## batches of rows of a data frame: numeric columns as numbers, the others as text
+def frame_batches(df, columns = None, batch_size = 100000):
+    columns = list(df.columns) if columns is None else list(columns)
+    numeric = [df[c].dtype.kind in "iuf" for c in columns]
+    for start in range(0, len(df), batch_size):
+        cells, texts = [], []
+        for c, number in zip(columns, numeric):
+            col = df[c].iloc[start:start + batch_size].tolist()
+            if not number:
+                col = [sys.intern(str(v)) for v in col]
+            cells.append(col)
+            texts.append([str(v) for v in col] if number else col)
+        yield _rows(cells, texts if any(numeric) else None)
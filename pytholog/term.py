@@ -0,0 +1,223 @@
+import sys
+from weakref import WeakValueDictionary
+from .util import parse_term
+
+## compiled terms used by the search engine.
+## clause variables are numbered when the clause is compiled, so renaming a clause
+## apart for a new resolution step is just choosing an offset in the binding store:
+## variable i of a clause called at offset o is stored under the id o + i.
+## constants stay as the python values read from the clause text.
+
+## a clause variable, its index is relative to the offset of the clause call
+class Var:
+    __slots__ = ("index", "name")
+
+    def __init__(self, index, name):
+        self.index = index
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+## a list of elements with an optional tail for patterns like [H|T].
+## it is a view on a shared tuple of items from `start`, so taking the rest of a
+## list is O(1) and does not copy anything. its length (the number of elements
+## before the tail) and whether it is ground are known without walking it.
+## ground lists also keep the hash of every suffix, computed once for the items
+class PList:
+    __slots__ = ("items", "start", "tail", "length", "ground", "hashes", "__weakref__")
+
+    def __init__(self, elems, tail = None, start = 0, ground = None, hashes = None):
+        self.items = tuple(elems)
+        self.start = start
+        self.tail = tail
+        self.length = len(self.items) - start
+        if ground is None:
+            ground = tail is None and all(is_ground(e) for e in self.items[start:])
+        self.ground = ground
+        if ground and hashes is None:
+            hashes = [0] * (len(self.items) + 1)
+            for i in range(len(self.items) - 1, start - 1, -1):
+                hashes[i] = hash((self.items[i], hashes[i + 1]))
+        self.hashes = hashes
+
+    ## the elements after the first n ones, as a view on the same items
+    def rest(self, n = 1):
+        if n == self.length:
+            return NIL if self.tail is None else self.tail
+        return PList(self.items, self.tail, self.start + n, self.ground, self.hashes)
+
+    ## structural hash of a ground list, usable as an index key
+    def __hash__(self):
+        if self.hashes is None:
+            return id(self)
+        return self.hashes[self.start]
+
+    @property
+    def elems(self):
+        return self.items[self.start:]
+
+    def __len__(self):
+        return self.length
+
+    def __repr__(self):
+        s = ",".join(repr(e) for e in self.elems)
+        if self.tail is not None:
+            s += "|" + repr(self.tail)
+        return "[" + s + "]"
+
+def is_ground(term):
+    if isinstance(term, Var):
+        return False
+    if isinstance(term, PList):
+        return term.ground
+    return True
+
+NIL = PList(())
+
+## hash-consing table: structurally identical ground lists are stored once.
+## lists are interned bottom-up so their elements are already the shared ones
+## and the key only needs their identities. entries go away with their last user
+_ground_terms = WeakValueDictionary()
+
+def hashcons(term):
+    if isinstance(term, str):
+        return sys.intern(term)
+    if isinstance(term, PList) and term.ground and term.start == 0:
+        key = tuple((type(e), e) for e in term.items)
+        shared = _ground_terms.get(key)
+        if shared is None:
+            _ground_terms[key] = shared = term
+        return shared
+    return term
+
+## equality of two ground lists: the same items are equal without looking at them,
+## different suffix hashes or lengths are different, otherwise elements are compared
+def ground_equal(a, b):
+    if a.items is b.items and a.start == b.start:
+        return True
+    if a.length != b.length or a.hashes[a.start] != b.hashes[b.start]:
+        return False
+    for i in range(a.length):
+        x, y = a.items[a.start + i], b.items[b.start + i]
+        if isinstance(x, PList) and isinstance(y, PList):
+            if not ground_equal(x, y): return False
+        elif x != y:
+            return False
+    return True
+
+## variables of a clause: names to indices, every anonymous variable is a new one
+class VarTable:
+    def __init__(self):
+        self.names = []
+        self.index = {}
+
+    def var(self, name):
+        if name == "_":
+            self.names.append(name)
+            return Var(len(self.names) - 1, name)
+        if name not in self.index:
+            self.index[name] = len(self.names)
+            self.names.append(name)
+        return Var(self.index[name], name)
+
+    def __len__(self):
+        return len(self.names)
+
+def compile_term(token, table):
+    return _compile_node(parse_term(token), table)
+
+def _compile_node(node, table):
+    t = node["type"]
+    if t == "var":
+        ## parse_term names each anonymous variable apart
+        name = "_" if node["name"].startswith("_G") else node["name"]
+        return table.var(name)
+    if t == "list":
+        elems = [_compile_node(e, table) for e in node["elems"]]
+        return hashcons(PList(elems)) if elems else NIL
+    if t == "list_pat":
+        head = _compile_node(node["head"], table)
+        tail = _compile_node(node["tail"], table)
+        if isinstance(tail, PList): ## [a|[b|T]] is [a,b|T]
+            lst = PList((head,) + tail.elems, tail.tail) if tail.length else PList((head,))
+            return hashcons(lst)
+        return PList((head,), tail)
+    return hashcons(node["value"])
+
+## variable indices mentioned in a compiled term
+def term_var_indices(term):
+    if isinstance(term, Var):
+        return {term.index}
+    if isinstance(term, PList):
+        found = set()
+        if term.ground:
+            return found
+        for e in term.elems:
+            found |= term_var_indices(e)
+        if term.tail is not None:
+            found |= term_var_indices(term.tail)
+        return found
+    return set()
+
+## arithmetic goals such as "W is W1 + W2" or "X > 5": the optional target of "is"
+## and the python expression split into text chunks and variables, so evaluating it
+## only joins the values of the variables (see reader for how it is built)
+class Arith:
+    __slots__ = ("target", "template")
+
+    def __init__(self, target, template):
+        self.target = target
+        self.template = template
+
+    def vars(self):
+        found = {v.index for v in self.template if isinstance(v, Var)}
+        if self.target is not None:
+            found |= term_var_indices(self.target)
+        return found
+
+## dereference a term called at an offset through the binding store:
+## the store maps variable ids to (term, offset) pairs
+def deref(term, off, store):
+    while isinstance(term, Var):
+        b = store.get(off + term.index)
+        if b is None:
+            return term, off
+        term, off = b
+    return term, off
+
+## python value of a term for answers: constants as they are, lists as prolog text
+## and unbound variables as _<id>. `unbound` is returned for a top level unbound variable
+def term_value(term, off, store, unbound = None):
+    term, off = deref(term, off, store)
+    if isinstance(term, Var):
+        return unbound if unbound is not None else "_%d" % (off + term.index)
+    if isinstance(term, PList):
+        elems = []
+        while True:
+            elems.extend(str(term_value(term.items[i], off, store)) 
+                         for i in range(term.start, len(term.items)))
+            if term.tail is None:
+                return "[" + ",".join(elems) + "]"
+            tail, toff = deref(term.tail, off, store)
+            if isinstance(tail, PList):
+                term, off = tail, toff
+                continue
+            return "[" + ",".join(elems) + "|" + str(term_value(tail, toff, store)) + "]"
+    return term
+
+## number of elements of a list through its tails, None if it is not a proper list
+def list_length(term, off, store):
+    n = 0
+    term, off = deref(term, off, store)
+    while isinstance(term, PList):
+        n += term.length
+        if term.tail is None:
+            return n
+        term, off = deref(term.tail, off, store)
+    return None
+
+## text to be evaluated by python for a compiled arithmetic goal
+def arith_source(arith, off, store):
+    return "".join(str(term_value(p, off, store)) if isinstance(p, Var) else p
+                   for p in arith.template)
@@ -1,4 +1,5 @@
-from .util import parse_term, term_to_string, is_var_node, unifiable_check
+from .util import parse_term, term_to_string, is_var_node, unifiable_check, same_number
+from .term import Var, PList, deref, ground_equal
 
 
 def unify(lh, rh, lh_domain=None, rh_domain=None):
@@ -12,17 +13,23 @@ def unify(lh, rh, lh_domain=None, rh_domain=None):
         return False
 
     # substitution map: keys are tuples ('L', name) or ('R', name), values are nodes or other var-keys
+    # pre-bound domain values are parsed lazily the first time a variable is dereferenced
+    # so the cost does not depend on the size of the domains
     subs = {}
-
-    # initialize subs with pre-bound domain values
-    for k, v in (lh_domain or {}).items():
-        subs[('L', k)] = parse_term(v, side='L')
-    for k, v in (rh_domain or {}).items():
-        subs[('R', k)] = parse_term(v, side='R')
+    domains = {'L': lh_domain, 'R': rh_domain}
 
     def _key_for_var(node):
         return (node['side'], node['name'])
 
+    def _lookup(key):
+        if key not in subs:
+            side, name = key
+            value = domains[side].get(name)
+            if value is None:
+                return None
+            subs[key] = parse_term(value, side=side)
+        return subs[key]
+
     def _deref(node):
         # dereference var nodes recursively via subs, protect against cycles
         visited = set()
@@ -32,7 +39,7 @@ def unify(lh, rh, lh_domain=None, rh_domain=None):
                 if key in visited:
                     return n
                 visited.add(key)
-                val = subs.get(key)
+                val = _lookup(key)
                 if val is None:
                     return n
                 if isinstance(val, dict):
@@ -94,7 +101,7 @@ def unify(lh, rh, lh_domain=None, rh_domain=None):
 
         # both const
         if a['type'] == 'const' and b['type'] == 'const':
-            return a['value'] == b['value']
+            return a['value'] == b['value'] or same_number(a['value'], b['value'])
 
         # list pattern vs concrete list
         if a['type'] == 'list_pat' and b['type'] == 'list':
@@ -154,11 +161,82 @@ def unify(lh, rh, lh_domain=None, rh_domain=None):
     for (side, name), val in list(subs.items()):
         node = val
         resolved = _resolve_to_value(node)
-        if resolved is not None:
-            if side == 'L':
-                lh_domain[name] = resolved
-            else:
-                rh_domain[name] = resolved
+        if resolved is not None and domains[side].get(name) != resolved:
+            domains[side][name] = resolved
+
+    return True
+
+
+
+## unification of compiled terms (see term.py) used by the search.
+## each side is a term with the offset of the clause call it belongs to,
+## bindings are added to the store as variable id -> (term, offset)
+def unify_args(lh_args, lh_off, rh_args, rh_off, store):
+    if len(lh_args) != len(rh_args):
+        return False
+    for a, b in zip(lh_args, rh_args):
+        if not unify_terms(a, lh_off, b, rh_off, store):
+            return False
+    return True
 
+def unify_terms(a, a_off, b, b_off, store):
+    stack = [(a, a_off, b, b_off)]
+    while stack:
+        a, a_off, b, b_off = stack.pop()
+        a, a_off = deref(a, a_off, store)
+        b, b_off = deref(b, b_off, store)
+        if isinstance(a, Var):
+            if a.name == "_": continue ## anonymous variables match anything
+            if isinstance(b, Var) and (b.name == "_" or a_off + a.index == b_off + b.index):
+                continue
+            if not _bind(a, a_off, b, b_off, store):
+                return False
+        elif isinstance(b, Var):
+            if b.name == "_": continue
+            if not _bind(b, b_off, a, a_off, store):
+                return False
+        elif isinstance(a, PList):
+            if not isinstance(b, PList):
+                return False
+            if a.ground and b.ground: ## hash-consed, mostly an identity check
+                if not ground_equal(a, b):
+                    return False
+                continue
+            ## proper lists of different lengths never unify
+            if a.tail is None and b.tail is None and a.length != b.length:
+                return False
+            n = min(a.length, b.length)
+            if n == 0: ## one of them is the empty list
+                if a.length or b.length:
+                    return False
+                continue
+            for i in range(n):
+                stack.append((a.items[a.start + i], a_off, b.items[b.start + i], b_off))
+            ## the rests are views on the same items, O(1) for [H|T]
+            stack.append((a.rest(n), a_off, b.rest(n), b_off))
+        elif isinstance(b, PList):
+            return False
+        elif not (a is b or a == b or same_number(a, b)):
+            return False
+    return True
+
+def _bind(var, off, term, toff, store):
+    vid = off + var.index
+    ## occurs check, ground lists cannot contain the variable
+    if not (isinstance(term, PList) and term.ground) and _occurs(vid, term, toff, store):
+        return False
+    store[vid] = (term, toff)
     return True
 
+def _occurs(vid, term, off, store):
+    stack = [(term, off)]
+    while stack:
+        term, off = deref(*stack.pop(), store)
+        if isinstance(term, Var):
+            if off + term.index == vid:
+                return True
+        elif isinstance(term, PList) and not term.ground:
+            stack.extend((term.items[i], off) for i in range(term.start, len(term.items)))
+            if term.tail is not None:
+                stack.append((term.tail, off))
+    return False
@@ -1,4 +1,6 @@
 import re
+import gc
+from contextlib import contextmanager
 from itertools import chain
 from more_itertools import unique_everseen
 
@@ -158,6 +160,15 @@ def is_number(s):
     except ValueError:
         return False        
         
+## numbers computed by arithmetic goals should match the same numbers written in facts
+def same_number(a, b):
+    if isinstance(a, str) == isinstance(b, str):
+        return False
+    try:
+        return float(a) == float(b)
+    except (TypeError, ValueError):
+        return False
+        
 ## it parses the operations and returns the keys and the values to be evaluated        
 def prob_parser(domain, rule_string, rule_terms):
     if "is" in rule_string:
@@ -202,7 +213,7 @@ def rule_terms(rule_string):  ## getting list of unique terms
 def term_checker(expr):
     #if not isinstance(expr, Expr):
     #    expr = Expr(expr)
-    terms = expr.terms[:]
+    terms = list(expr.terms)
     indx = [x for x,y in enumerate(terms) if is_variable(y)]
     for i in indx:
         ## give the same value for any uppercased variable in the same index
@@ -219,16 +230,35 @@ def get_path(db, expr, path):
             pathe.append(v)
     return set(pathe)
 
+## bulk loads create millions of objects without cycles: collecting while they are
+## created only rescans them over and over, so the garbage collector waits
+@contextmanager
+def paused_gc():
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if collecting:
+            gc.enable()
+
+## position of x in seq sorted by key(item), like bisect_left (or bisect_right):
+## the key argument of bisect needs python 3.10
+def bisect_key(seq, x, key, right = False, lo = 0, hi = None):
+    if hi is None:
+        hi = len(seq)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        k = key(seq[mid])
+        if x < k if right else not k < x:
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+## kept for old callers, see KnowledgeBase.from_file
 def pl_read(kb, file):
-    file = open(file, "r")
-    lines = file.readlines()
-    facts = []
-    for i in lines:
-        i = i.strip()
-        i = re.sub(r'\.+$', "", i)
-        facts.append(i)
-    kb(facts)
-    print(f"facts and rules have been added to {kb.name}.db")
+    kb.from_file(file)
 
 
 def rh_val_get(rh_arg, lh_arg, rh_domain):
@@ -0,0 +1,46 @@
+"""
+Column store tests for Pytholog.
+The ground facts of a predicate saved to a memory-mapped column store answer
+queries like the facts they were saved from.
+"""
+
+import pytest
+import pytholog as pl
+from pytholog.columns import ColumnStore, StoreError
+
+RULES = ["path(X, Y, W) :- edge(X, Y, W)",
+         "path(X, Y, W) :- edge(X, Z, W1), path(Z, Y, W2), W is W1 + W2",
+         "loop(X) :- edge(X, X, _)"]
+QUERIES = ["edge(a, Y, W)", "edge(X, c, W)", "edge(a, c, 5)", "edge(z, Y, W)",
+           "edge(X, Y, 2)", "path(a, c, W)", "path(a, c, 3)", "loop(X)"]
+
+
+def test_store_answers_like_facts(tmp_path):
+    kb = pl.KnowledgeBase("memory")
+    kb(["edge(a, b, 1)", "edge(b, c, 2)", "edge(a, c, 5)", "edge(d, d, 1)"] + RULES)
+    path = str(tmp_path / "edge.cols")
+    kb.save_store("edge", path)
+    mapped = pl.KnowledgeBase("mapped")
+    mapped(RULES)
+    assert mapped.attach_store(path) == "edge"
+    for q in QUERIES:
+        assert mapped.query(pl.Expr(q)) == kb.query(pl.Expr(q)), q
+    store = mapped.db["edge"]["facts"]
+    assert [f.fact for f in store] == [f.fact for f in kb.db["edge"]["facts"]]
+    assert list(store.select(["a", None, "5"])) == [1]
+    with pytest.raises(TypeError):
+        mapped(["edge(e, f, 1)"])
+    store.close()
+
+
+def test_store_only_takes_ground_facts(tmp_path):
+    kb = pl.KnowledgeBase("rules")
+    kb(["first([H|_], H)", "edge(a, b, 1)"] + RULES)
+    path = str(tmp_path / "bad.cols")
+    with pytest.raises(StoreError, match = "ground fact"):
+        kb.save_store("first", path)
+    with pytest.raises(StoreError, match = "rules"):
+        kb.save_store("path", path)
+    (tmp_path / "other.cols").write_bytes(b"edge(a, b, 1).")
+    with pytest.raises(StoreError):
+        ColumnStore(str(tmp_path / "other.cols"))
@@ -0,0 +1,42 @@
+"""
+Compact storage tests for Pytholog.
+Clauses keep only their compiled form and a knowledge base keeps one bucket per predicate.
+"""
+
+import pytholog as pl
+from pytholog.goal import Goal
+from pytholog.domain import Bindings
+from pytholog.term import Var, PList
+
+
+def test_objects_have_no_instance_dict():
+    fact = pl.Fact("route(a, b, 3)")
+    objects = [fact, fact.lh, Goal(fact), Bindings(), Var(0, "X"), PList(["a"])]
+    for obj in objects:
+        assert not hasattr(obj, "__dict__")
+
+
+def test_text_is_derived_from_compiled_clause():
+    rule = pl.Fact("path(X, Y) :- edge(X, Z), path(Z, Y)")
+    assert rule.lh.string == "path(X,Y)"
+    assert [g.string for g in rule.rhs] == ["edge(X,Z)", "path(Z,Y)"]
+    assert pl.Fact("likes(noor, [a,b])").lh.terms == ("noor", "[a,b]")
+
+
+def test_forked_bindings_keep_top():
+    domain = Bindings(5)
+    domain[0] = ("a", 0)
+    child = domain.fork()
+    child.top = 9
+    assert child[0] == ("a", 0) and domain.top == 5
+
+
+def test_db_buckets_count_rules():
+    kb = pl.KnowledgeBase("compact")
+    kb(["edge(a, b)", "edge(b, c)",
+        "path(X, Y) :- edge(X, Y)",
+        "path(X, Y) :- edge(X, Z), path(Z, Y)"])
+    assert set(kb.db["edge"]) == {"facts", "rules"}
+    assert kb.db["edge"]["rules"] == 0
+    assert kb.db["path"]["rules"] == 2
+    assert kb.query(pl.Expr("path(a, c)")) == ["Yes"]
@@ -0,0 +1,59 @@
+"""
+Consult tests for Pytholog.
+Prolog files are streamed clause by clause: comments, multi-line clauses and gzip.
+"""
+
+import io
+import gzip
+import pytholog as pl
+from pytholog.reader import read_clauses
+
+SOURCE = """% foods
+food_type(gouda, cheese).   % trailing comment
+food_type('ritz. crackers', cracker).
+/* a block comment.
+   with dots. */
+food_flavor(X, Y) :-
+    food_type(X, Z),
+    flavor(Y, Z).
+flavor(savory, cheese). flavor(sweet, cracker).
+"""
+
+
+def test_clauses_across_chunks():
+    expected = ["food_type(gouda, cheese)", "food_type('ritz. crackers', cracker)",
+                "food_flavor(X, Y) :-\n    food_type(X, Z),\n    flavor(Y, Z)",
+                "flavor(savory, cheese)", "flavor(sweet, cracker)"]
+    for chunk_size in (1, 2, 5, 1 << 20):
+        assert list(read_clauses(io.StringIO(SOURCE), chunk_size)) == expected
+
+
+def test_last_clause_without_dot():
+    assert list(read_clauses(io.StringIO("a(1).\nb(2)"))) == ["a(1)", "b(2)"]
+
+
+def test_from_file_with_progress(tmp_path):
+    path = tmp_path / "foods.pl"
+    path.write_text(SOURCE)
+    calls = []
+    kb = pl.KnowledgeBase("consult")
+    assert kb.from_file(str(path), progress = lambda n, b: calls.append(n), batch_size = 2) == 5
+    assert calls == [2, 4, 5]
+    assert kb.query(pl.Expr("food_flavor(gouda, F)")) == [{"F": "savory"}]
+
+
+def test_from_gzip_file(tmp_path):
+    path = tmp_path / "foods.pl.gz"
+    with gzip.open(str(path), "wt") as f:
+        f.write(SOURCE)
+    kb = pl.KnowledgeBase("consult_gz")
+    assert kb.from_file(str(path)) == 5
+    assert kb.query(pl.Expr("flavor(F, cracker)")) == [{"F": "sweet"}]
+
+
+def test_bulk_loaded_facts_keep_order():
+    kb = pl.KnowledgeBase("bulk")
+    kb(["edge(b, x)", "edge(a, y)", "edge(b, z)"])
+    kb(["edge(a, w)"])
+    assert [f.fact for f in kb.db["edge"]["facts"]] == \
+        ["edge(a,y)", "edge(a,w)", "edge(b,x)", "edge(b,z)"]
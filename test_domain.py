@@ -0,0 +1,64 @@
+"""
+Persistent goal domain tests for Pytholog.
+Forking a domain must be cheap and branches must never see each other's bindings.
+"""
+
+import pytholog as pl
+from pytholog.domain import Domain
+from pytholog.goal import Goal
+
+
+def test_fork_isolates_branches():
+    parent = Domain({"X": "a"})
+    left = parent.fork()
+    right = parent.fork()
+    left["Y"] = "b"
+    right["Y"] = "c"
+    parent["Z"] = "d"
+    assert dict(parent) == {"X": "a", "Z": "d"}
+    assert dict(left) == {"X": "a", "Y": "b"}
+    assert dict(right) == {"X": "a", "Y": "c"}
+
+
+def test_forks_share_frames():
+    parent = Domain({"X": "a", "Y": "b"})
+    child = parent.fork()
+    assert child._frame is parent._frame
+
+
+def test_delete_and_len():
+    d = Domain({"X": 1, "Y": 2})
+    child = d.fork()
+    del child["X"]
+    assert "X" not in child and "X" in d
+    assert len(child) == 1 and len(d) == 2
+    child["X"] = 3
+    assert child["X"] == 3 and len(child) == 2
+    assert child.get("W") is None
+
+
+def test_long_chains_are_compacted():
+    d = Domain()
+    for i in range(Domain.MAX_DEPTH * 3):
+        d["V%d" % i] = i
+        d = d.fork()
+    assert d._depth <= Domain.MAX_DEPTH
+    assert len(d) == Domain.MAX_DEPTH * 3
+    assert d["V0"] == 0
+
+
+def test_goal_copies_are_independent():
+    g = Goal(pl.Fact("likes(X, Y)"), domain = {"X": "noor"})
+    c = g.__copy__()
+    c.domain["Y"] = "sausage"
+    assert "Y" not in g.domain
+    assert c.domain == {"X": "noor", "Y": "sausage"}
+
+
+def test_answers_are_plain_dicts():
+    kb = pl.KnowledgeBase("domain_answers")
+    kb(["likes(noor, sausage)", "likes(melissa, pasta)",
+        "likes_food(X, F) :- likes(X, F)"])
+    result = kb.query(pl.Expr("likes_food(Who, pasta)"))
+    assert result == [{"Who": "melissa"}]
+    assert type(result[0]) is dict
@@ -0,0 +1,57 @@
+"""
+External predicate tests for Pytholog.
+Predicates declared on SQLite tables answer like the same facts in the
+knowledge base, with the bound arguments of a call pushed into the SQL.
+"""
+
+import sqlite3
+import pytest
+import pytholog as pl
+from pytholog.external import ExternalError
+
+RENTALS = [(1, "ann", "alien"), (2, "bob", "alien"), (3, "ann", "brazil")]
+FILMS = [("alien", "scifi"), ("brazil", "comedy")]
+RULES = ["watched(C, G) :- rental(_, C, F), genre(F, G)"]
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = str(tmp_path / "dvd.db")
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE rental (rental_id INTEGER, customer TEXT, film TEXT)")
+    db.execute("CREATE TABLE film (title TEXT, category TEXT, length INTEGER)")
+    db.executemany("INSERT INTO rental VALUES (?, ?, ?)", RENTALS)
+    db.executemany("INSERT INTO film VALUES (?, ?, 90)", FILMS)
+    db.commit()
+    db.close()
+    return path
+
+
+def test_external_answers_like_facts(database):
+    kb = pl.KnowledgeBase("memory")
+    kb(["rental(%d, %s, %s)" % r for r in RENTALS] + ["genre(%s, %s)" % f for f in FILMS] + RULES)
+    ext = pl.KnowledgeBase("external")
+    ext.external("rental", 3, database, "rental", index = True)
+    ext.external("genre", 2, database, "film", ["title", "category"])
+    ext(RULES)
+    for q in ["rental(I, ann, F)", "rental(2, C, F)", "rental(I, C, brazil)",
+              "rental(_, zoe, F)", "watched(ann, G)", "watched(C, scifi)"]:
+        got = [{k: str(v) for k, v in a.items()} if isinstance(a, dict) else a
+               for a in ext.query(pl.Expr(q))]
+        ## rules over external tables are answered by SQL, in its own order
+        assert sorted(map(str, got)) == sorted(map(str, kb.query(pl.Expr(q)))), q
+    assert ext.query(pl.Expr("rental(I, bob, alien)")) == [{"I": 2}]
+    assert [f.fact for f in ext.db["genre"]["facts"]] == ["genre(alien,scifi)", "genre(brazil,comedy)"]
+
+
+def test_external_pushes_bound_args(database):
+    kb = pl.KnowledgeBase("pushdown")
+    kb.external("rental", 3, database, "rental")
+    statements = []
+    kb._databases[database].set_trace_callback(lambda sql: statements.append(sql))
+    kb.query(pl.Expr("rental(I, ann, brazil)"))
+    assert statements[-1].endswith('WHERE "customer" = \'ann\' AND "film" = \'brazil\'')
+    with pytest.raises(ExternalError):
+        kb.external("rental", 2, database, "rental")
+    with pytest.raises(ExternalError):
+        kb.external("rental", 1, database, "nothing")
@@ -0,0 +1,63 @@
+"""
+Hash-consing tests for Pytholog.
+Structurally identical ground terms are stored once and compared by identity.
+"""
+
+import pytholog as pl
+from pytholog.term import VarTable, compile_term, ground_equal, hashcons
+from pytholog.unify import unify_terms
+from pytholog.domain import Bindings
+
+
+def test_identical_ground_lists_are_shared():
+    kb = pl.KnowledgeBase("shared")
+    kb(["category(laptop, [electronics,computers])",
+        "category(desktop, [electronics,computers])",
+        "category(novel, [books,fiction])"])
+    facts = kb.db["category"]["facts"]
+    paths = [f.lh.args[1] for f in facts]
+    laptop = [p for p, f in zip(paths, facts) if f.lh.terms[0] == "laptop"][0]
+    desktop = [p for p, f in zip(paths, facts) if f.lh.terms[0] == "desktop"][0]
+    novel = [p for p, f in zip(paths, facts) if f.lh.terms[0] == "novel"][0]
+    assert laptop is desktop
+    assert laptop is not novel
+
+
+def test_nested_lists_are_shared():
+    a = compile_term("[[a,b],[c]]", VarTable())
+    b = compile_term("[[a,b],[c]]", VarTable())
+    assert a is b
+    assert compile_term("[a,b]", VarTable()) is a.items[0]
+
+
+def test_term_text_is_shared():
+    f1 = pl.Fact("likes(noor, sausage)")
+    f2 = pl.Fact("food_type(sausage, meat)")
+    assert f1.lh.terms[1] is f2.lh.terms[0]
+    assert f1.lh.args[1] is f2.lh.args[0]
+
+
+def test_suffix_views_hash_and_compare_structurally():
+    long = compile_term("[x,a,b]", VarTable())
+    short = compile_term("[a,b]", VarTable())
+    view = long.rest()
+    assert view is not short
+    assert hash(view) == hash(short)
+    assert ground_equal(view, short)
+    assert not ground_equal(long, short)
+
+
+def test_ground_unification():
+    store = Bindings()
+    a = compile_term("[a,b,c]", VarTable())
+    b = compile_term("[a,b,c]", VarTable())
+    c = compile_term("[a,b,d]", VarTable())
+    assert unify_terms(a, 0, b, 0, store)
+    assert not unify_terms(a, 0, c, 0, store)
+
+
+def test_non_ground_lists_are_not_shared():
+    a = compile_term("[a,X]", VarTable())
+    b = compile_term("[a,X]", VarTable())
+    assert a is not b
+    assert hashcons(a) is a
@@ -0,0 +1,70 @@
+"""
+Bulk insert tests for Pytholog.
+A batch of clauses is parsed before any is added, and adding clauses drops the
+cached answers of their predicates and of the rules calling them, not the others.
+"""
+
+import pytest
+import pytholog as pl
+from pytholog.reader import PrologSyntaxError
+from pytholog.columns import write_store
+from pytholog.pq import FactHeap
+from pytholog.lazy import LazyFacts
+
+
+def family():
+    kb = pl.KnowledgeBase("family")
+    kb(["parent(ann, bob)", "parent(bob, cy)", "likes(ann, tea)",
+        "grand(X, Z) :- parent(X, Y), parent(Y, Z)"])
+    return kb
+
+
+def test_inserts_drop_the_affected_answers():
+    kb = family()
+    assert kb.query(pl.Expr("grand(ann, G)")) == [{"G": "cy"}]
+    assert kb.query(pl.Expr("likes(ann, L)")) == [{"L": "tea"}]
+    assert kb.query(pl.Expr("parent(cy, C)")) == ["No"]
+    kb(["parent(bob, dan)", "parent(cy, eve)"])
+    ## grand calls parent so its answers are dropped with parent's, likes is kept
+    assert set(kb._cache) == {"likes(ann,Var1)"}
+    assert sorted(a["G"] for a in kb.query(pl.Expr("grand(ann, G)"))) == ["cy", "dan"]
+    assert kb.query(pl.Expr("parent(cy, C)")) == [{"C": "eve"}]
+    kb.retract("parent(cy, eve)")
+    assert kb.query(pl.Expr("parent(cy, C)")) == ["No"]
+
+
+def test_new_rules_are_followed():
+    kb = family()
+    kb.query(pl.Expr("grand(ann, G)"))
+    kb.query(pl.Expr("likes(ann, L)"))
+    kb(["ancestor(X, Y) :- grand(X, Y)", "likes(bob, coffee)"])
+    assert set(kb._cache) == {"grand(ann,Var1)"}
+    kb.query(pl.Expr("ancestor(ann, A)"))
+    kb(["parent(cy, eve)"])
+    assert set(kb._cache) == set()  ## ancestor calls grand which calls parent
+
+
+def test_a_bad_batch_adds_nothing(tmp_path):
+    kb = family()
+    with pytest.raises(PrologSyntaxError):
+        kb(["parent(cy, eve)", "parent(eve, "])
+    assert kb.query(pl.Expr("parent(cy, C)")) == ["No"]
+    path = str(tmp_path / "route.col")
+    write_store(path, "route", [("a", "b")])
+    kb.attach_store(path)
+    with pytest.raises(TypeError):
+        kb(["parent(cy, eve)", "route(a, b)"])
+    assert kb.query(pl.Expr("parent(cy, C)")) == ["No"]
+
+
+def test_facts_pushed_one_at_a_time(tmp_path):
+    facts = FactHeap()
+    facts.extend([pl.Fact("edge(c, d)"), pl.Fact("edge(a, b)")])
+    facts.push(pl.Fact("edge(b, c)"))
+    facts.push(pl.Fact("edge(a, z)"))  ## after the facts with the same key
+    assert [f.fact for f in facts] == ["edge(a,b)", "edge(a,z)", "edge(b,c)", "edge(c,d)"]
+    path = tmp_path / "edges.pl"
+    path.write_text("edge(c, d).\nedge(a, b).\n")
+    lazy = LazyFacts(str(path), [[0, path.stat().st_size]])
+    lazy.push(pl.Fact("edge(b, c)"))
+    assert [f.fact for f in lazy] == ["edge(a,b)", "edge(b,c)", "edge(c,d)"]
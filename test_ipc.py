@@ -0,0 +1,87 @@
+"""
+Local query server tests for Pytholog.
+Queries over a unix socket with the binary protocol: prepared statements with
+bound parameters, pipelined requests and pooled connections.
+"""
+
+import socket
+import threading
+import pytest
+import pytholog as pl
+from pytholog.ipc import IPCServer, encode, decode
+from pytholog.client import Connection, Pool, Prepared, QueryError
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason = "unix sockets")
+
+
+@pytest.fixture
+def server(tmp_path):
+    kb = pl.KnowledgeBase("family")
+    kb(["parent(ann, bob)", "parent(bob, cy)", "parent(bob, dan)", "age(cy, 7)",
+        "grand(X, Z) :- parent(X, Y), parent(Y, Z)"])
+    path = str(tmp_path / "kb.sock")
+    server = IPCServer(kb, path)
+    thread = threading.Thread(target = server.serve_forever, daemon = True)
+    thread.start()
+    yield path
+    server.shutdown()
+    server.server_close()
+
+
+def test_values_round_trip():
+    value = [None, True, False, 7, -2 ** 63, 2 ** 70, 2.5, "noor", [], {"X": ["a", 1]}]
+    assert decode(encode(value)) == value[:5] + [str(2 ** 70)] + value[6:]
+
+
+def test_queries_and_prepared_statements(server):
+    conn = Connection(server)
+    assert conn.query("parent(ann, X)") == [{"X": "bob"}]
+    assert conn.query("parent(dan, X)") == ["No"]
+    assert len(conn.query("parent(bob, X)", limit = 1)) == 1
+    children = conn.prepare("parent(P, C)", ["P"])
+    assert sorted(a["C"] for a in conn.execute(children, ["bob"])) == ["cy", "dan"]
+    assert conn.execute(children, ["cy"]) == ["No"]
+    assert conn.execute(Prepared("age(Who, Age)", ["Age"]), [7]) == [{"Who": "cy"}]
+    with pytest.raises(QueryError):
+        conn.execute(children, ["Bob"])  ## would be a variable
+    with pytest.raises(QueryError):
+        conn.query("parent(ann")
+    assert conn.query("grand(ann, G)")  ## still in step after errors
+    conn.close()
+
+
+def test_pipeline_and_pool(server):
+    pool = Pool(server, size = 2)
+    grand = Prepared("grand(G, C)", ["G"])
+    answers = pool.pipeline([(grand, ["ann"]), "parent(ann, X)", (grand, ["bob"])])
+    assert sorted(a["C"] for a in answers[0]) == ["cy", "dan"]
+    assert answers[1:] == [[{"X": "bob"}], ["No"]]
+    results = []
+    def ask():
+        for _ in range(20):
+            results.append(pool.execute(grand, ["ann"]))
+    threads = [threading.Thread(target = ask) for _ in range(4)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert len(results) == 80 and all(len(r) == 2 for r in results)
+    assert len(pool._idle) <= 2
+    pool.close()
+
+
+def test_statement_ids_after_close_and_failed_prepare(server):
+    conn = Connection(server)
+    a = conn.prepare("parent(P, C)", ["P"])
+    b = conn.prepare("age(Who, Age)", ["Who"])
+    c = conn.prepare("grand(G, C)", ["G"])
+    conn.close_statement(a)
+    d = conn.prepare("parent(P, C)", ["C"])
+    assert conn.execute(b, ["cy"]) == [{"Age": "7"}]
+    assert conn.execute(d, ["bob"]) == [{"P": "ann"}]
+    assert sorted(x["C"] for x in conn.execute(c, ["ann"])) == ["cy", "dan"]
+    ## a statement the server refused is prepared again, and refused again
+    wrong = Prepared("parent(P, C)", ["Q"])
+    for _ in range(2):
+        with pytest.raises(QueryError, match = "not a parameter"):
+            conn.execute(wrong, ["bob"])
+    assert conn.pipeline([(wrong, ["bob"]), (b, ["cy"])], raise_errors = False)[1] == [{"Age": "7"}]
+    conn.close()
@@ -0,0 +1,111 @@
+"""
+Journal tests for Pytholog.
+Clauses asserted and retracted are logged so a knowledge base is restored
+from its last snapshot and the journal after it, torn records are dropped.
+"""
+
+import os
+import time
+import threading
+import pytest
+import pytholog as pl
+
+
+def paths(tmp_path):
+    return str(tmp_path / "kb.snapshot"), str(tmp_path / "kb.journal")
+
+
+def test_journal_replays_changes(tmp_path):
+    snap, log = paths(tmp_path)
+    kb = pl.KnowledgeBase.restore(snap, log, "family", sync = "always")
+    kb(["parent(ann, bob)", "parent(bob, cy)", "grand(X, Z) :- parent(X, Y), parent(Y, Z)"])
+    assert kb.retract("parent(bob, cy)")
+    assert not kb.retract("parent(zed, cy)")
+    kb(["parent(bob, dan)"])
+    kb.journal.close()
+    restored = pl.KnowledgeBase.restore(snap, log, "family")
+    assert restored.query(pl.Expr("grand(ann, G)")) == [{"G": "dan"}]
+    assert restored.db["grand"]["rules"] == 1
+
+
+def test_compaction_and_torn_records(tmp_path):
+    snap, log = paths(tmp_path)
+    kb = pl.KnowledgeBase.restore(snap, log, "edges", sync = "batch", batch_size = 100)
+    kb(["edge(a, b)", "edge(b, c)"])
+    kb.compact(snap, background = True).join()
+    assert os.path.exists(snap)
+    assert not os.path.exists(log + ".0")
+    kb(["edge(c, d)"])
+    kb.retract("edge(a, b)")
+    kb.journal.close()
+    with open(log, "a") as f:
+        f.write("0badc0de + edge(d, e")  ## torn by a crash
+    restored = pl.KnowledgeBase.restore(snap, log)
+    assert restored.name == "edges"
+    assert sorted(a["X"] for a in restored.query(pl.Expr("edge(X, Y)"))) == ["b", "c"]
+    ## the compacted journal is not replayed again
+    assert restored.journal.epoch == 1
+    restored.journal.close()
+
+
+def test_compaction_waits_for_writers(tmp_path):
+    snap, log = paths(tmp_path)
+    kb = pl.KnowledgeBase.restore(snap, log, "edges", sync = "always")
+    kb(["edge(a, b)"])
+    rotate, writers = kb.journal.rotate, []
+    def rotate_then_write():
+        ## a write sent while the journal is rotated lands in one of the snapshot or the new journal
+        epoch = rotate()
+        writers.append(threading.Thread(target = kb, args = (["edge(x, y)"],)))
+        writers[0].start()
+        time.sleep(0.1)
+        return epoch
+    kb.journal.rotate = rotate_then_write
+    kb.compact(snap, background = False)
+    writers[0].join()
+    kb.journal.close()
+    restored = pl.KnowledgeBase.restore(snap, log)
+    assert sorted(a["X"] for a in restored.query(pl.Expr("edge(X, Y)"))) == ["a", "x"]
+    restored.journal.close()
+
+
+def test_failed_retracts_are_not_logged(tmp_path):
+    snap, log = paths(tmp_path)
+    store = str(tmp_path / "price.cols")
+    prices = pl.KnowledgeBase("prices")
+    prices(["price(apple, 10)", "price(pear, 12)"])
+    prices.save_store("price", store)
+    kb = pl.KnowledgeBase.restore(snap, log, "shop", sync = "always")
+    kb.attach_store(store)
+    kb(["fruit(apple)"])
+    kb.compact(snap, background = False)
+    with pytest.raises(TypeError):
+        kb.retract("price(apple, 10)")  ## a store is read-only
+    assert not kb.retract("fruit(kiwi)")
+    assert kb.retract("fruit(apple)")
+    kb.journal.close()
+    with open(log) as f:
+        assert [line.split(" ", 2)[1:] for line in f.read().splitlines()[1:]] == [["-", "fruit(apple)"]]
+    restored = pl.KnowledgeBase.restore(snap, log)
+    assert restored.query(pl.Expr("price(apple, P)")) == [{"P": "10"}]
+    assert restored.query(pl.Expr("fruit(X)")) == ["No"]
+    restored.journal.close()
+
+
+def test_imported_tables_are_replayed(tmp_path):
+    snap, log = paths(tmp_path)
+    table = tmp_path / "price.csv"
+    table.write_text("item,price,weight\napple,10,0.25\npear,12,007\n")
+    kb = pl.KnowledgeBase.restore(snap, log, "shop", sync = "always")
+    kb(["fruit(apple)"])
+    assert kb.load_csv("price", str(table)) == 2
+    kb.retract("price(pear, 12, 007)")
+    kb.journal.close()
+    restored = pl.KnowledgeBase.restore(snap, log)
+    assert restored.query(pl.Expr("price(X, P, W)")) == [{"X": "apple", "P": 10, "W": 0.25}]
+    assert [f.fact for f in restored.db["price"]["facts"]] == [f.fact for f in kb.db["price"]["facts"]]
+    restored.load_csv("price", str(table))
+    restored.journal.close()
+    again = pl.KnowledgeBase.restore(snap, log)
+    assert again.query(pl.Expr("price(pear, P, W)")) == [{"P": 12, "W": "007"}]
+    again.journal.close()
@@ -0,0 +1,134 @@
+"""
+Last-call optimisation and environment trimming tests for Pytholog.
+Tail recursive predicates should not keep every ancestor goal alive.
+"""
+
+import pytest
+import pytholog as pl
+from pytholog import querizer
+from pytholog.goal import Goal
+from pytholog.domain import Bindings
+from pytholog.term import Var, PList
+from pytholog.search_util import trim_domain
+
+
+def chain_depth(goal):
+    depth = 0
+    while goal is not None:
+        depth += 1
+        goal = goal.parent
+    return depth
+
+
+def deepest_frame(kb, query, monkeypatch):
+    depths = []
+    push = querizer.SearchQueue.push
+    def recording_push(self, goal):
+        depths.append(chain_depth(goal))
+        push(self, goal)
+    monkeypatch.setattr(querizer.SearchQueue, "push", recording_push)
+    result = kb.query(pl.Expr(query))
+    return result, max(depths)
+
+
+def test_tail_recursive_list_walk(monkeypatch):
+    kb = pl.KnowledgeBase("walk")
+    kb([
+        "walk([])",
+        "walk([_|T]) :- walk(T)"
+    ])
+    lst = "[" + ",".join("a%d" % i for i in range(300)) + "]"
+    result, depth = deepest_frame(kb, "walk(%s)" % lst, monkeypatch)
+    assert result == ["Yes"]
+    # the frames of the finished walk/1 calls are released
+    assert depth <= 4
+
+
+def test_non_tail_recursion_keeps_frames(monkeypatch):
+    kb = pl.KnowledgeBase("len")
+    kb([
+        "len([], 0)",
+        "len([_|T], N) :- len(T, M), N is M + 1"
+    ])
+    result, depth = deepest_frame(kb, "len([a,b,c,d,e], N)", monkeypatch)
+    assert result[0].get("N") == 5
+    assert depth > 5
+
+
+def test_last_call_with_show_path():
+    graph = pl.KnowledgeBase("graph_path")
+    graph(["edge(a, b)", "edge(b, c)", "edge(c, d)",
+           "path(X, Y) :- edge(X, Y)",
+           "path(X, Y) :- edge(X, Z), path(Z, Y)"])
+    answer, path = graph.query(pl.Expr("path(a, d)"), show_path = True)
+    assert answer == ["Yes"]
+    assert {"b", "c"} <= path
+
+
+def trim(goal_ind):
+    rule = pl.Fact("grandparent(X, Y) :- parent(X, Z), parent(Z, Y)")
+    root = Goal(pl.Fact.query(pl.Expr("grandparent(tom, Who)")), domain = Bindings(1))
+    domain = Bindings(300)
+    domain[0] = ("ann", 0)                  # the query variable
+    domain[10] = ("tom", 0)                 # X of the rule called at offset 10
+    domain[11] = (PList([Var(0, "A")]), 50) # Y is bound through another call
+    domain[12] = ("bob", 0)                 # Z
+    domain[50] = ("x", 0)
+    for i in range(100, 300):               # bindings of finished calls
+        domain[i] = ("junk", 0)
+    goal = Goal(rule, root, domain, ind = goal_ind, offset = 10)
+    trim_domain(goal)
+    return set(goal.domain)
+
+
+def test_trim_domain_drops_dead_bindings():
+    assert trim(1) == {0, 10, 11, 12, 50}
+    # Z is not mentioned after the second goal
+    assert trim(2) == {0, 10, 11, 50}
+
+
+def test_query_frame_is_never_trimmed():
+    query = pl.Expr("pair(A, B)")
+    domain = Bindings(2)
+    domain[0] = ("a", 0)
+    domain[1] = ("b", 0)
+    for i in range(2, 200):
+        domain[i] = ("junk", 0)
+    root = Goal(pl.Fact.query(query), domain = domain, ind = 1)
+    trim_domain(root)
+    assert set(root.domain) == {0, 1}
+
+
+def test_deep_countdown_runs_in_constant_memory(monkeypatch):
+    kb = pl.KnowledgeBase("count")
+    kb([
+        "count(0)",
+        "count(N) :- N > 0, N1 is N - 1, count(N1)"
+    ])
+    sizes = []
+    push = querizer.SearchQueue.push
+    def recording_push(self, goal):
+        sizes.append(len(goal.domain))
+        push(self, goal)
+    monkeypatch.setattr(querizer.SearchQueue, "push", recording_push)
+    # 5000 calls take about 15000 goals, past the default limit
+    kb.max_loops = None
+    assert kb.query(pl.Expr("count(5000)")) == ["Yes"]
+    # the bindings of the finished calls are trimmed
+    assert max(sizes) <= 2 * querizer.TRIM_SIZE
+
+
+def test_searches_past_the_limit_are_aborted():
+    kb = pl.KnowledgeBase("loop")
+    kb(["loop(X) :- loop(X)", "count(0)", "count(N) :- N > 0, N1 is N - 1, count(N1)",
+        "nat(z)", "nat(s(X)) :- nat(X)"])
+    assert kb.query(pl.Expr("count(1000)")) == ["Yes"]  ## within the default limit
+    kb.max_loops = 1000
+    # a search ends with the answers it found before the limit
+    assert 0 < len(kb.query(pl.Expr("nat(N)"))) < 1000
+    with pytest.raises(querizer.SearchAborted):
+        kb.query(pl.Expr("loop(a)"))
+    with pytest.raises(querizer.SearchAborted):
+        list(kb.solve("count(500)"))
+    kb.max_loops = None
+    assert kb.query(pl.Expr("count(500)")) == ["Yes"]
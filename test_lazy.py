@@ -0,0 +1,55 @@
+"""
+Lazy consult tests for Pytholog.
+A file consulted lazily is indexed once, then its predicates are only read
+when they are queried, with the same answers as an eager consult.
+"""
+
+import os
+import pytholog as pl
+from pytholog.lazy import LazyFacts, index_path
+
+SOURCE = """% a small program
+edge(a, b). edge(b, c).
+path(X, Y) :- edge(X, Y).
+path(X, Y) :-
+    edge(X, Z), /* one step */ path(Z, Y).
+label(a, 'first. one').
+edge(c, d).
+"""
+
+
+def test_lazy_consult_reads_predicates_when_used(tmp_path):
+    path = str(tmp_path / "graph.pl")
+    with open(path, "w") as f:
+        f.write(SOURCE)
+    eager = pl.KnowledgeBase("eager")
+    assert eager.from_file(path) == 6
+    first = pl.KnowledgeBase("first")
+    assert first.from_file(path, lazy = True) == 6
+    assert os.path.exists(index_path(path))
+    kb = pl.KnowledgeBase("lazy")
+    assert kb.from_file(path, lazy = True) == 6
+    assert isinstance(kb.db["edge"]["facts"], LazyFacts)
+    assert kb.db["path"]["rules"] == 2
+    assert kb.query(pl.Expr("label(a, L)")) == eager.query(pl.Expr("label(a, L)"))
+    assert isinstance(kb.db["edge"]["facts"], LazyFacts)
+    ## the callers of a change are found from the index, the rules are not read for it
+    kb(["label(b, second)"])
+    assert kb._affected(["edge"]) == {"edge", "path"}
+    assert isinstance(kb.db["path"]["facts"], LazyFacts)
+    for q in ["path(a, Y)", "edge(X, d)"]:
+        assert kb.query(pl.Expr(q)) == eager.query(pl.Expr(q)), q
+    assert type(kb.db["edge"]["facts"]) is pl.pq.FactHeap
+    assert [f.fact for f in kb.db["edge"]["facts"]] == [f.fact for f in eager.db["edge"]["facts"]]
+
+
+def test_lazy_index_follows_the_file(tmp_path):
+    path = str(tmp_path / "graph.pl")
+    with open(path, "w") as f:
+        f.write(SOURCE)
+    pl.KnowledgeBase("first").from_file(path, lazy = True)
+    with open(path, "a") as f:
+        f.write("edge(d, e).\n")
+    kb = pl.KnowledgeBase("changed")
+    assert kb.from_file(path, lazy = True) == 7
+    assert kb.query(pl.Expr("edge(d, Y)")) == [{"Y": "e"}]
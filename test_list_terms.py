@@ -0,0 +1,69 @@
+"""
+List term tests for Pytholog.
+Lists are views on shared items so [H|T] decomposition is O(1),
+and their length is known without walking them.
+"""
+
+import pytholog as pl
+from pytholog.term import PList, NIL, VarTable, compile_term
+from pytholog.unify import unify_terms
+from pytholog.domain import Bindings
+
+
+def test_rest_is_a_view_on_the_same_items():
+    lst = compile_term("[a,b,c,d]", VarTable())
+    tail = lst.rest()
+    assert tail.items is lst.items
+    assert len(tail) == 3 and tail.elems == ("b", "c", "d")
+    assert tail.rest(3) is NIL
+
+
+def test_ground_and_length_are_cached():
+    table = VarTable()
+    assert compile_term("[a,[b,c]]", table).ground
+    pattern = compile_term("[a,X|T]", table)
+    assert not pattern.ground
+    assert len(pattern) == 2
+
+
+def test_head_tail_binding_shares_the_list():
+    table = VarTable()
+    pattern = compile_term("[H|T]", table)
+    lst = compile_term("[a,b,c]", VarTable())
+    store = Bindings(len(table))
+    assert unify_terms(pattern, 0, lst, 10, store)
+    tail, _ = store[1]
+    assert tail.items is lst.items and tail.start == 1
+
+
+def test_lists_of_different_lengths_are_rejected():
+    store = Bindings()
+    a = compile_term("[a,b,c]", VarTable())
+    b = compile_term("[a,b]", VarTable())
+    assert not unify_terms(a, 0, b, 0, store)
+    assert len(store) == 0
+
+
+def test_length_builtin():
+    kb = pl.KnowledgeBase("length_builtin")
+    kb(["size(L, N) :- length(L, N)"])
+    assert kb.query(pl.Expr("size([a,b,c], N)")) == [{"N": 3}]
+    assert kb.query(pl.Expr("length([a,b], N)")) == [{"N": 2}]
+    assert kb.query(pl.Expr("size([a,b], 2)")) == ["Yes"]
+    assert kb.query(pl.Expr("size([a,b], 3)")) == ["No"]
+    fresh = kb.query(pl.Expr("size(L, 2)"))[0]["L"]
+    assert fresh.startswith("[_") and fresh.count(",") == 1
+
+
+def test_user_defined_length_takes_precedence():
+    kb = pl.KnowledgeBase("length_user")
+    kb(["length(L, many)"])
+    assert kb.query(pl.Expr("length([a], N)")) == [{"N": "many"}]
+
+
+def test_long_list_walk():
+    kb = pl.KnowledgeBase("walk_long")
+    kb(["walk([])",
+        "walk([_|T]) :- walk(T)"])
+    lst = "[" + ",".join("a%d" % i for i in range(900)) + "]"
+    assert kb.query(pl.Expr("walk(%s)" % lst)) == ["Yes"]
@@ -0,0 +1,62 @@
+"""
+Metrics tests for Pytholog.
+Once enabled, a knowledge base counts its queries, calls, inferences, unifications,
+cache hits, index probes and scans, and renders them for prometheus.
+"""
+
+import pytest
+import pytholog as pl
+from pytholog.metrics import prometheus
+from pytholog.querizer import SearchAborted
+
+
+def family():
+    kb = pl.KnowledgeBase("family")
+    kb(["parent(ann, bob)", "parent(bob, cy)", "parent(bob, dan)",
+        "grand(X, Z) :- parent(X, Y), parent(Y, Z)"])
+    return kb
+
+
+def test_metrics_are_off_by_default():
+    kb = family()
+    kb.query(pl.Expr("grand(ann, G)"))
+    assert kb.metrics is None and kb.stats() == {}
+
+
+def test_engine_counters():
+    kb = family()
+    kb.enable_metrics()
+    assert len(kb.query(pl.Expr("grand(ann, G)"))) == 2
+    kb.query(pl.Expr("grand(ann, H)"))  ## the same query, from the cache
+    kb.query(pl.Expr("parent(bob, C)"))  ## a lookup by the first arg
+    kb.query(pl.Expr("parent(P, dan)"))  ## a lookup by the second arg
+    kb.query(pl.Expr("parent(P, C)"))  ## through every fact
+    stats = kb.stats()
+    assert stats["queries"] == 5
+    assert stats["cache_hits"] == 1 and stats["cache_misses"] == 4
+    assert stats["calls"] == {"grand": 3, "parent": 5}  ## the queries and the goals searched
+    assert stats["index_probes"] == 2 and stats["scans"] == 4
+    ## grand(ann, G): its rule, then each of its 2 goals with the 3 parents (a bucket
+    ## this small is read through); the 2 facts of bob, the one of dan, the 3 facts
+    assert stats["unifications"] == 1 + 3 + 3 + 2 + 1 + 3
+    assert stats["unification_failures"] == 2 + 1
+    assert stats["inferences"] >= 5 + 2 + 1 + 3
+    assert stats["peak_queue_depth"] >= 2
+    assert stats["latency"]["count"] == 5
+    assert stats["latency"]["buckets"][-1] == (float("inf"), 5)
+    kb.enable_metrics(False)
+    assert kb.stats() == {}
+
+
+def test_aborted_searches_and_prometheus_text():
+    kb = pl.KnowledgeBase("loops")
+    kb(["loop(X) :- loop(X)", "a(b)"])
+    kb.enable_metrics()
+    with pytest.raises(SearchAborted):  ## not answered No, whether it holds is not known
+        kb.query(pl.Expr("loop(a)"))
+    text = prometheus(kb.stats(), {"kb": kb.name})
+    assert 'pytholog_searches_aborted_total{kb="loops"} 1' in text
+    assert 'pytholog_calls_total{kb="loops",predicate="loop"} ' in text
+    assert '# TYPE pytholog_query_seconds histogram' in text
+    assert 'pytholog_query_seconds_bucket{kb="loops",le="+Inf"} 1' in text
+    assert 'pytholog_query_seconds_count{kb="loops"} 1' in text
@@ -0,0 +1,61 @@
+"""
+Prepared query tests for Pytholog.
+A query is read once and run with its parameters bound, with the answers of the
+same query, and bucket probes by bound args find the facts a read through would.
+"""
+
+import pytest
+import pytholog as pl
+from pytholog.prepared import BindError
+
+
+def routes():
+    kb = pl.KnowledgeBase("routes")
+    kb(["edge(c%d, c%d, %d)" % (i % 50, (i * 7) % 50, i % 13) for i in range(500)])
+    kb(["edge(X, hub, 0)", "path(X, Y, P) :- edge(X, Y, P)",
+        "likes(noor, tea)", "likes(fawi, tea)", "likes(noor, cake)"])
+    return kb
+
+
+def test_executions_answer_like_queries():
+    kb = routes()
+    path = kb.prepare("path(X, Y, P)")
+    assert path.params == ("X", "Y", "P") and path.plan[0] == "search"
+    assert path.execute(X = "c3") == kb.query(pl.Expr("path(c3, Y, P)"))
+    assert path.execute(X = "c3", Y = "hub") == [{"P": "0"}]
+    likes = kb.prepare("likes(Who, What)")
+    assert likes.plan[0] == "facts"
+    assert likes.executemany([{"Who": "noor"}, {"What": "tea"}, {"Who": "cy"}]) == [
+        [{"What": "tea"}, {"What": "cake"}], [{"Who": "fawi"}, {"Who": "noor"}], ["No"]]
+    assert likes.execute(limit = 1, Who = "noor") == [{"What": "tea"}]
+    ## a rule added changes the plan
+    kb(["likes(X, water) :- likes(X, tea)"])
+    assert likes.execute(Who = "fawi") == [{"What": "tea"}, {"What": "water"}]
+    assert likes.plan[0] == "search"
+
+
+def test_bad_bindings():
+    likes = routes().prepare("likes(Who, What)")
+    with pytest.raises(BindError):
+        likes.execute(Whom = "noor")
+    with pytest.raises(BindError):
+        likes.execute(Who = "Noor")  ## would be a variable
+    with pytest.raises(BindError):
+        likes.execute(Who = ["noor"])
+
+
+def test_probes_find_what_reading_through_finds():
+    kb = routes()
+    bucket = kb.db["edge"]["facts"]
+    for bound in ([(0, "c3")], [(1, "c7")], [(2, "5")], [(1, "hub")], [(0, "c1"), (1, "c7")]):
+        ## the facts whose bound args are the texts or are not texts, in their order
+        expected = [bucket[i] for i in range(len(bucket))
+                    if all(not isinstance(bucket[i].lh.args[c], str) or bucket[i].lh.args[c] == t
+                           for c, t in bound)]
+        found = bucket.probe(bound)
+        assert [f for f in found if f in expected] == expected
+        assert len(found) < len(bucket)
+    ## the rules probe the bucket by the args bound when they are called
+    for args in ("c1, c7, P", "c1, Y, 3"):
+        by_rule = kb.query(pl.Expr("path(%s)" % args))
+        assert sorted(map(str, by_rule)) == sorted(map(str, kb.query(pl.Expr("edge(%s)" % args))))
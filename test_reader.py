@@ -0,0 +1,57 @@
+"""
+Clause reader tests for Pytholog.
+Clauses are read in one pass with operator precedence and compiled directly.
+"""
+
+import pytest
+import pytholog as pl
+from pytholog.reader import PrologSyntaxError, read_clause, tokenize
+
+
+def test_atoms_with_keywords_are_kept():
+    fact = pl.Fact("likes(this_island, ORLANDO) :- visits(ANDY, this_island)")
+    assert fact.lh.terms == ("this_island", "ORLANDO")
+    assert fact.rhs[0].predicate == "visits"
+    assert fact.rhs[0].terms == ("ANDY", "this_island")
+    assert fact.varnames == ["ORLANDO", "ANDY"]
+
+
+def test_body_goals_split_after_arithmetic():
+    rule = pl.Fact("countdown(N, [N|Rest]) :- N > 0, N1 is N - 1, countdown(N1, Rest).")
+    assert [g.predicate for g in rule.rhs] == ["", "", "countdown"]
+    assert rule.rhs[1].arith.target.name == "N1"
+
+
+def test_operator_precedence():
+    node = read_clause("X is 1 + 2 * 3 - 4")
+    assert node == ("op", "is", (("var", "X"),
+                    ("op", "-", (("op", "+", (("const", "1"),
+                     ("op", "*", (("const", "2"), ("const", "3"))))), ("const", "4")))))
+    # is takes the whole comparison on its right
+    assert read_clause("T is W <= 0.8")[2][1][1] == "<="
+
+
+def test_text_reads_back_to_the_same_clause():
+    for text in ["path(X, Y, W) :- edge(X, Z, W1), path(Z, Y, W2), W is W1 + W2.",
+                 "lcm(X, Y, L) :- gcd(X, Y, G), L is (X * Y) / G",
+                 "count_all([H|T], N) :- \\+(is_list(H)), count_all(T, NT), N is NT + 1",
+                 "x(Y) :- Y is 3 - -1, Z = 'a b'"]:
+        fact = pl.Fact(text)
+        assert pl.Fact(fact.fact).fact == fact.fact
+
+
+def test_prolog_comparisons_evaluate():
+    kb = pl.KnowledgeBase("reader_cmp")
+    kb(["small(X) :- X =< 3", "div(X, Y) :- 0 =:= X mod Y"])
+    assert kb.query(pl.Expr("small(2)")) == ["Yes"]
+    assert kb.query(pl.Expr("small(4)")) == ["No"]
+    assert kb.query(pl.Expr("div(9, 3)")) == ["Yes"]
+
+
+def test_tokens_and_errors():
+    assert tokenize("f(a).")[-2] == ("end", ".")
+    assert tokenize("X is 1.5")[-2] == ("num", "1.5")
+    with pytest.raises(PrologSyntaxError):
+        pl.Fact("likes(noor, sausage")
+    with pytest.raises(PrologSyntaxError):
+        pl.Fact("likes(noor) sausage")
@@ -0,0 +1,80 @@
+"""
+Registry tests for Pytholog.
+Hosted knowledge bases are reloaded from their changed files by applying only the
+clauses that changed to a copy, which replaces them while queries run on the old one.
+"""
+
+import os
+import time
+import pytholog as pl
+from pytholog.registry import Registry
+
+
+def write(path, clauses):
+    with open(path, "w") as f:
+        f.write("".join(c + ".\n" for c in clauses))
+    ## a new stamp even where the clock is coarse
+    stamp = time.time() + 1 + (os.stat(path).st_mtime % 7)
+    os.utime(path, (stamp, stamp))
+
+
+FAMILY = ["parent(ann, bob)", "parent(bob, cy)", "likes(ann, tea)",
+          "grand(X, Z) :- parent(X, Y), parent(Y, Z)"]
+
+
+def test_reload_applies_the_changed_clauses(tmp_path):
+    path = str(tmp_path / "family.pl")
+    write(path, FAMILY)
+    registry = Registry()
+    old = registry.add("family", [path])
+    assert old.query(pl.Expr("grand(ann, G)")) == [{"G": "cy"}]
+    assert old.query(pl.Expr("likes(ann, L)")) == [{"L": "tea"}]
+    assert registry.reload() == []  ## nothing changed
+    write(path, ["parent(ann, bob)", "parent(bob, dan)", "likes(ann, tea)",
+                 "grand(X, Z) :- parent(X, Y), parent(Y, Z)"])
+    assert registry.reload() == ["family"]
+    kb = registry["family"]
+    assert kb is not old and kb.name == "family"
+    ## likes did not change: its facts and cached answers are kept
+    assert kb.db["likes"]["facts"] is old.db["likes"]["facts"]
+    assert set(kb._cache) == {"likes(ann,Var1)"}
+    assert kb.query(pl.Expr("grand(ann, G)")) == [{"G": "dan"}]
+    assert kb.query(pl.Expr("parent(bob, C)")) == [{"C": "dan"}]
+    assert kb.db["grand"]["rules"] == 1
+    ## the old one is left as it was
+    assert old.query(pl.Expr("parent(bob, C)")) == [{"C": "cy"}]
+
+
+def test_queries_running_end_on_the_old_one(tmp_path):
+    path = str(tmp_path / "nums.pl")
+    write(path, ["num(%d)" % i for i in range(100)])
+    registry = Registry()
+    registry.add("nums", [path])
+    running = registry["nums"].solve(pl.Expr("num(N)"))
+    first = [next(running) for _ in range(10)]
+    write(path, ["num(%d)" % i for i in range(50)] + ["other(x)"])
+    assert registry.reload("nums") == ["nums"]
+    assert len(first + list(running)) == 100
+    assert len(registry["nums"].query(pl.Expr("num(N)"))) == 50
+    assert registry["nums"].query(pl.Expr("other(X)")) == [{"X": "x"}]
+
+
+def test_bad_changes_are_kept_out_and_files_are_watched(tmp_path):
+    path = str(tmp_path / "family.pl")
+    write(path, FAMILY)
+    registry = Registry(interval = 0.05)
+    old = registry.add("family", [path])
+    with open(path, "a") as f:
+        f.write("likes(ann, 'tea).\n")
+    assert registry.reload() == []
+    assert registry["family"] is old and path in registry.errors
+    registry.watch()
+    try:
+        write(path, FAMILY[:2] + FAMILY[3:])  ## without likes
+        deadline = time.time() + 10
+        while registry["family"] is old and time.time() < deadline:
+            time.sleep(0.02)
+    finally:
+        registry.stop()
+    assert registry["family"].query(pl.Expr("likes(ann, L)")) == ["No"]
+    assert "likes" not in registry["family"].db and registry.errors == {}
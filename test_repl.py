@@ -0,0 +1,88 @@
+"""
+Interactive session tests for Pytholog.
+The session commands time and profile queries without changing their answers,
+read the answers of a query one at a time and report the predicates, indexes and cache.
+"""
+
+import io
+import pytholog as pl
+from pytholog.repl import Session
+
+
+def session():
+    kb = pl.KnowledgeBase("session")
+    kb(["likes(noor, sausage)", "likes(melissa, pasta)", "likes(dmitry, cookie)",
+        "food_type(sausage, meat)", "food_type(pasta, meat)", "flavor(savory, meat)",
+        "food_flavor(X, Y) :- food_type(X, Z), flavor(Y, Z)"])
+    kb(["edge(c%d, c%d)" % (i, i + 1) for i in range(30)])
+    out = io.StringIO()
+    return kb, Session(kb, out), out
+
+
+def lines(out):
+    text = out.getvalue().splitlines()
+    out.seek(0)
+    out.truncate()
+    return text
+
+
+def test_time_and_profile():
+    kb, s, out = session()
+    assert s.command(":time food_flavor(What, savory)?")
+    found = lines(out)
+    assert found[0] == str(kb.query(pl.Expr("food_flavor(What, savory)")))
+    assert found[1].startswith("% 2 answers in") and found[1].endswith("cache miss")
+    assert "10 inferences" in found[1]
+    s.command(":time food_flavor(What, savory)?")
+    assert lines(out)[1].endswith("0 scans, cache hit")
+    assert kb.metrics is None  ## recorded for the query only
+    s.command(":profile food_flavor(What, savory)!")
+    found = lines(out)
+    assert found[0].startswith("% 1 answers in")
+    assert found[1:5] == ["% predicates called the most:", "%   flavor                   1",
+                          "%   food_flavor              1", "%   food_type                1"]
+    assert any("function calls" in line for line in found)
+    s.command(":profile likes(Who, What)?")  ## facts only, without a search
+    assert lines(out)[1:3] == ["% predicates called the most:", "%   likes                    1"]
+
+
+def test_answers_one_at_a_time():
+    kb, s, out = session()
+    assert s.command("likes(Who, sausage);")
+    assert s.command(";")
+    assert s.command(";")
+    assert lines(out) == ["Who = noor ;", "No", "no query to go on with, end one with ; to read its answers one at a time"]
+    s.command("edge(c3, Y);")
+    s.command(";")
+    assert s.command("likes(noor, sausage)?") is False  ## a query of the session ends the answers
+    s.command(";")
+    assert lines(out)[-1].startswith("no query to go on with")
+    s.command(":time p(((")
+    s.command(":nope")
+    assert s.command("likes(X;")  ## read before its first answer, like the queries of the commands
+    assert s.command(";")
+    found = [line.split(":")[0] for line in lines(out)]
+    assert found[:3] == ["PrologSyntaxError", "unknown command ", "PrologSyntaxError"]
+    assert found[3].startswith("no query to go on with")
+
+
+def test_stats_table_indexes_cache():
+    kb, s, out = session()
+    s.command(":stats")
+    assert lines(out) == ["% metrics are off, :stats on records them"]
+    s.command(":stats on")
+    kb.query("edge(X, c7)")
+    kb.query("edge(X, c7)")
+    lines(out)
+    s.command(":stats")
+    found = lines(out)
+    assert "% queries                2" in found and "% cache hit rate         50%" in found
+    s.command(":table")
+    assert "% edge                           30      0  FactHeap     2" in lines(out)
+    s.command(":indexes")
+    assert ["% edge                     arg 1, sorted", "% edge                     arg 2, 30 values"] == lines(out)[:2]
+    s.command(":cache")
+    assert lines(out) == ["% 1 cached answers: edge 1", "% 1 hits, 1 misses (hit rate 50%)",
+                          "% 1 query shapes:", "%   edge(X,?)                facts, looked up by arg 2"]
+    s.command(":cache clear")
+    assert lines(out)[0] == "% 0 cached answers" and kb._cache == {}
@@ -0,0 +1,65 @@
+"""
+Scheduler tests for Pytholog.
+Queries run as tasks taking turns by slices of inferences, by priority and by
+client, and are rejected when too many are waiting.
+"""
+
+import pytest
+import pytholog as pl
+from pytholog.scheduler import Scheduler, Overloaded
+
+
+def big_kb():
+    kb = pl.KnowledgeBase("big")
+    kb(["big(n%d, %d)" % (i, i % 10) for i in range(20000)])
+    kb(["friend(a%d, b%d)" % (i, i) for i in range(100)])
+    kb(["edge(a, b)", "edge(b, c)", "path(X, Y) :- edge(X, Y)", "path(X, Y) :- edge(X, Z), path(Z, Y)"])
+    kb.materialize()
+    return kb
+
+
+def test_answers_are_the_query_ones():
+    kb = big_kb()
+    scheduler = Scheduler(kb, slice = 10)
+    assert scheduler.query(pl.Expr("path(a, Y)")) == kb.query(pl.Expr("path(a, Y)"))
+    assert scheduler.query(pl.Expr("friend(z, Y)")) == ["No"]
+    assert len(scheduler.query(pl.Expr("big(X, 3)"), limit = 5)) == 5
+    scheduler.stop()
+
+
+def test_short_queries_do_not_wait_for_long_ones():
+    kb = big_kb()
+    scheduler = Scheduler(kb, slice = 50)
+    long = scheduler.submit(pl.Expr("big(X, N)"), priority = "low", client = "batch")
+    assert scheduler.query(pl.Expr("friend(a1, Y)"), client = "app") == [{"Y": "b1"}]
+    assert not long.done
+    assert len(long.result()) == 20000
+    assert long.slices > 100 and long.inferences >= 20000
+    scheduler.stop()
+
+
+def test_priorities_take_more_turns():
+    kb = big_kb()
+    scheduler = Scheduler(kb, slice = 50)
+    low = scheduler.submit(pl.Expr("big(X, 4)"), priority = "low")
+    high = scheduler.submit(pl.Expr("big(X, 5)"), priority = "high")
+    high.result()
+    assert not low.done
+    low.result()
+    scheduler.stop()
+
+
+def test_admission_control():
+    kb = big_kb()
+    scheduler = Scheduler(kb, slice = 50, max_backlog = 3, quota = 2)
+    scheduler.submit(pl.Expr("big(X, 1)"), client = "a")
+    scheduler.submit(pl.Expr("big(X, 2)"), client = "a")
+    with pytest.raises(Overloaded):
+        scheduler.submit(pl.Expr("big(X, 3)"), client = "a")  ## over its quota
+    scheduler.submit(pl.Expr("big(X, 4)"), client = "b")
+    with pytest.raises(Overloaded):
+        scheduler.submit(pl.Expr("big(X, 5)"), client = "c")  ## over the backlog
+    ## cached answers do not need a task
+    kb.query(pl.Expr("friend(a1, Y)"))
+    assert scheduler.query(pl.Expr("friend(a1, Y)"), client = "c") == [{"Y": "b1"}]
+    scheduler.stop()
@@ -0,0 +1,85 @@
+"""
+Server tests for Pytholog.
+The pre-forking WSGI server keeps connections alive, streams responses with
+no length as chunks and its forked workers answer from the shared knowledge base.
+"""
+
+import os
+import json
+import signal
+import threading
+import http.client
+import pytest
+import pytholog as pl
+from pytholog.server import Server
+
+
+def kb_app(kb):
+    def app(environ, start_response):
+        answer = kb.query(pl.Expr(environ["QUERY_STRING"]))
+        start_response("200 OK", [("Content-Type", "application/json")])
+        return [json.dumps(a).encode("utf-8") + b"\n" for a in answer]
+    return app
+
+
+def family():
+    kb = pl.KnowledgeBase("family")
+    kb(["parent(ann, bob)", "parent(bob, cy)", "parent(bob, dan)",
+        "grand(X, Z) :- parent(X, Y), parent(Y, Z)"])
+    kb.materialize()
+    return kb
+
+
+def get(conn, query):
+    conn.request("GET", "/?" + query)
+    response = conn.getresponse()
+    return response, [json.loads(l) for l in response.read().splitlines()]
+
+
+def test_keep_alive_and_chunked_answers():
+    server = Server(kb_app(family()), port = 0, threads = 2)
+    thread = threading.Thread(target = server.serve)
+    thread.start()
+    try:
+        conn = http.client.HTTPConnection(*server.address)
+        response, answers = get(conn, "grand(ann,G)")
+        assert response.getheader("Transfer-Encoding") == "chunked"
+        assert sorted(a["G"] for a in answers) == ["cy", "dan"]
+        sock = conn.sock
+        response, answers = get(conn, "parent(P,bob)")
+        assert conn.sock is sock  ## the same connection
+        assert answers == [{"P": "ann"}]
+        conn.close()
+    finally:
+        server.stop()
+        thread.join()
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason = "workers are forked")
+def test_forked_workers():
+    server = Server(kb_app(family()), port = 0, workers = 2, threads = 2)
+    pid = os.fork()
+    if pid == 0:
+        server.serve()
+        os._exit(0)
+    try:
+        for _ in range(4):
+            conn = http.client.HTTPConnection(*server.address, timeout = 10)
+            _, answers = get(conn, "parent(bob,C)")
+            assert sorted(a["C"] for a in answers) == ["cy", "dan"]
+            conn.close()
+    finally:
+        os.kill(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
+
+
+def test_concurrent_readers_of_bulk_facts():
+    kb = pl.KnowledgeBase("routes")
+    kb(["route(city%d, city%d)" % (i % 50, i) for i in range(5000)])
+    answers = []
+    def ask():
+        answers.append(len(kb.query(pl.Expr("route(city7, To)"))))
+    threads = [threading.Thread(target = ask) for _ in range(8)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert answers == [100] * 8
@@ -0,0 +1,60 @@
+"""
+Query shape tests for Pytholog.
+Query texts of a known shape compile to the expr the reader gives, queries of a
+shape share its plan, and the plan is chosen again when its predicates change.
+"""
+
+import itertools
+import pytholog as pl
+from pytholog.shapes import read_flat, shape_of, shaped
+from pytholog.term import Var
+
+
+def compiled(expr):
+    args = [(a.index, a.name) if isinstance(a, Var) else a for a in expr.args]
+    return expr.predicate, expr.terms, args, expr.arith, list(expr.varnames), expr.nvars
+
+
+def test_shapes_compile_like_the_reader():
+    kb = pl.KnowledgeBase("shapes")
+    args = ["a", "is", "X", "Y", "_", "_x", "7", "-3", "2.50", "1e3", "-2.5E+3", "007"]
+    for n in (1, 2, 3):
+        for chosen in itertools.product(args, repeat = n):
+            text = "p(%s)" % ", ".join(chosen)
+            read = pl.Expr(text)
+            assert read_flat(text)[0] == shape_of(read)
+            assert compiled(shaped(kb, text)[0]) == compiled(read)
+    ## the ones that are not flat are read
+    for text in ("p('a', X)", "p([a], X)", "p(a b)", "p (a)", "p(- 3)", "p(f(a), X)"):
+        assert read_flat(text) is None
+
+
+def test_queries_of_a_shape_share_a_plan():
+    kb = pl.KnowledgeBase("shared")
+    kb(["likes(p%d, t%d)" % (i, i % 5) for i in range(50)] + ["fan(X, T) :- likes(X, T)"])
+    assert kb.query("likes(p7, What)") == [{"What": "t2"}]
+    assert kb.query(pl.Expr("likes(p8, What)")) == [{"What": "t3"}]
+    assert kb.query("fan(p9, T).") == kb.query(pl.Expr("fan(p9, T)")) == [{"T": "t4"}]
+    assert sorted(kb._shapes) == ["fan(?,T)", "likes(?,What)"]
+    assert kb._shapes["likes(?,What)"].plan[0] == "facts"
+    assert kb._shapes["fan(?,T)"].plan[0] == "search"
+    assert [a["Who"] for a in kb.query("likes(Who, t1)")][:2] == ["p1", "p11"]
+    assert kb._shapes["likes(Who,?)"].columns == (1,)
+    assert list(kb.solve("likes(p3, What)")) == [{"What": "t3"}]
+    assert kb.query("likes(p3, 'Tea')") == ["No"]  ## read, it is not flat
+
+
+def test_plans_follow_the_changes():
+    kb = pl.KnowledgeBase("changes")
+    kb(["likes(noor, tea)", "drinks(X, D) :- likes(X, D)", "size(cup, 3)"])
+    assert kb.query("drinks(noor, D)") == [{"D": "tea"}]
+    assert kb.query("size(cup, N)") == [{"N": "3"}]
+    assert kb.query("wants(noor, W)") == ["No"]
+    kb(["likes(noor, water) :- likes(noor, tea)", "wants(noor, cake)"])
+    ## the changed predicates and the rules calling them are planned again
+    assert kb._shapes["drinks(?,D)"].plan is None
+    assert kb._shapes["size(?,N)"].plan[0] == "facts"
+    assert sorted(d["D"] for d in kb.query("drinks(noor, D)")) == ["tea", "water"]
+    assert kb.query("wants(noor, W)") == [{"W": "cake"}]
+    kb.clear_cache()
+    assert kb._shapes == {}
@@ -0,0 +1,91 @@
+"""
+Snapshot tests for Pytholog.
+A knowledge base saved to a binary snapshot loads back with the same clauses.
+"""
+
+import sqlite3
+import pytest
+import pytholog as pl
+from pytholog.snapshot import SnapshotError
+from pytholog.columns import ColumnStore
+from pytholog.external import SQLiteTable
+
+
+def clause_texts(kb):
+    return {pred: [f.fact for f in kb.db[pred]["facts"]] for pred in kb.db}
+
+
+def test_snapshot_round_trip(tmp_path):
+    kb = pl.KnowledgeBase("snap")
+    kb(["edge(b, c, 2)", "edge(a, b, 1)", "likes(noor, [a,[b,c]])", "likes(ann, tea)",
+        "path(X, Y, W) :- edge(X, Y, W)",
+        "path(X, Y, W) :- edge(X, Z, W1), path(Z, Y, W2), W is W1 + W2",
+        "first([H|_], H)", "small(X) :- X =< 3", "mix(b)", "mix(a, X)", "rainy"])
+    path = str(tmp_path / "kb.snapshot")
+    kb.save_snapshot(path)
+    restored = pl.KnowledgeBase.load_snapshot(path)
+    assert restored.name == "snap"
+    assert clause_texts(restored) == clause_texts(kb)
+    assert restored.db["path"]["rules"] == 2
+    assert restored.query(pl.Expr("path(a, c, W)")) == [{"W": 3}]
+    assert restored.query(pl.Expr("first([x,y], F)")) == [{"F": "x"}]
+    assert restored.query(pl.Expr("small(4)")) == ["No"]
+    assert restored.query(pl.Expr("likes(ann, L)")) == [{"L": "tea"}]
+
+
+def test_snapshot_rejects_other_files(tmp_path):
+    path = tmp_path / "kb.snapshot"
+    path.write_bytes(b"food_type(gouda, cheese).")
+    with pytest.raises(SnapshotError):
+        pl.KnowledgeBase.load_snapshot(str(path))
+    path.write_bytes(b"PYTHOLOG" + (99).to_bytes(4, "little"))
+    with pytest.raises(SnapshotError, match = "format 99"):
+        pl.KnowledgeBase.load_snapshot(str(path))
+
+
+def test_snapshot_attaches_tables_and_stores_again(tmp_path):
+    database = str(tmp_path / "dvd.db")
+    db = sqlite3.connect(database)
+    db.execute("CREATE TABLE rental (rental_id INTEGER, customer TEXT)")
+    db.executemany("INSERT INTO rental VALUES (?, ?)", [(5, "ann"), (6, "bob")])
+    db.commit()
+    db.close()
+    store = str(tmp_path / "edge.cols")
+    kb = pl.KnowledgeBase("attached")
+    kb(["edge(a, b)", "edge(b, c)"])
+    kb.save_store("edge", store)
+    kb.external("rental", 2, database, "rental")
+    kb.attach_store(store)
+    kb(["seen(C) :- rental(_, C)"])
+    path = str(tmp_path / "kb.snapshot")
+    kb.save_snapshot(path)
+    ## the journal compacts a copy of the knowledge base into the same format
+    kb.open_journal(str(tmp_path / "kb.journal"))
+    kb.compact(path, background = False)
+    kb.journal.close()
+    restored = pl.KnowledgeBase.load_snapshot(path)
+    assert type(restored.db["rental"]["facts"]) is SQLiteTable
+    assert type(restored.db["edge"]["facts"]) is ColumnStore
+    assert restored.query(pl.Expr("rental(I, ann)")) == [{"I": 5}]
+    assert restored.query(pl.Expr("edge(b, Y)")) == [{"Y": "c"}]
+    assert restored.query(pl.Expr("seen(bob)")) == ["Yes"]
+    memory = pl.KnowledgeBase("memory")
+    memory.external("rental", 2, ":memory:", "sqlite_master", ["type", "name"])
+    with pytest.raises(SnapshotError, match = "rental"):
+        memory.save_snapshot(str(tmp_path / "memory.snapshot"))
+
+
+def test_snapshot_keeps_the_numbers_of_tables(tmp_path):
+    table = tmp_path / "price.csv"
+    table.write_text("item,price,weight\napple,10,0.25\npear,12,007\n")
+    kb = pl.KnowledgeBase("shop")
+    kb.load_csv("price", str(table))
+    kb(["cheap(X) :- price(X, P, _), P < 11"])
+    path = str(tmp_path / "kb.snapshot")
+    kb.save_snapshot(path)
+    restored = pl.KnowledgeBase.load_snapshot(path)
+    assert restored.query(pl.Expr("price(X, P, W)")) == kb.query(pl.Expr("price(X, P, W)"))
+    assert restored.query(pl.Expr("price(apple, P, W)")) == [{"P": 10, "W": 0.25}]
+    assert restored.query(pl.Expr("price(pear, 12, W)")) == [{"W": "007"}]
+    assert restored.query(pl.Expr("cheap(X)")) == [{"X": "apple"}]
+    assert [f.fact for f in restored.db["price"]["facts"]] == [f.fact for f in kb.db["price"]["facts"]]
@@ -0,0 +1,35 @@
+"""
+Lazy engine tests for Pytholog.
+kb.solve yields the answers of a query as the search finds them and stops
+searching where they stop being read.
+"""
+
+import pytholog as pl
+
+
+def graph():
+    kb = pl.KnowledgeBase("graph")
+    kb(["edge(a, b)", "edge(b, c)", "edge(c, d)",
+        "path(X, Y) :- edge(X, Y)", "path(X, Y) :- edge(X, Z), path(Z, Y)"])
+    return kb
+
+
+def test_solve_yields_the_query_answers():
+    kb = graph()
+    assert list(kb.solve(pl.Expr("path(a, Y)"))) == kb.query(pl.Expr("path(a, Y)"))
+    assert list(kb.solve(pl.Expr("edge(b, Y)"))) == [{"Y": "c"}]
+    assert list(kb.solve(pl.Expr("edge(a, b)"))) == ["Yes"]
+    ## no answers is nothing rather than No
+    assert list(kb.solve(pl.Expr("edge(z, Y)"))) == []
+    assert list(kb.solve(pl.Expr("unknown(Y)"))) == []
+
+
+def test_solve_is_lazy():
+    kb = graph()
+    answers = kb.solve(pl.Expr("path(a, Y)"))
+    assert next(answers) == kb.query(pl.Expr("path(a, Y)"))[0]
+    assert len(list(kb.solve(pl.Expr("path(a, Y)"), limit = 2))) == 2
+    ## nothing is cached by it
+    kb.clear_cache()
+    list(kb.solve(pl.Expr("path(b, Y)")))
+    assert kb._cache == {}
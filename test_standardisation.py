@@ -0,0 +1,56 @@
+"""
+Standardisation-apart tests for Pytholog.
+Clause variables are numbered at compile time and renamed apart by an offset
+per call, so variables of different clauses and recursion levels never clash.
+"""
+
+import pytholog as pl
+from pytholog.term import Var, PList
+
+
+def test_clause_variables_are_numbered():
+    fact = pl.Fact("append([H|T1], L2, [H|T3]) :- append(T1, L2, T3)")
+    assert fact.nvars == 4
+    assert fact.varnames == ["H", "T1", "L2", "T3"]
+    head = fact.lh.args
+    assert isinstance(head[0], PList) and head[0].items[0].index == 0
+    # the body shares the numbering of the head
+    assert [a.index for a in fact.rhs[0].args] == [1, 2, 3]
+
+
+def test_anonymous_variables_are_distinct():
+    fact = pl.Fact("pair(_, _)")
+    a, b = fact.lh.args
+    assert isinstance(a, Var) and isinstance(b, Var)
+    assert a.index != b.index
+
+
+def test_same_names_in_query_and_clause():
+    kb = pl.KnowledgeBase("swap")
+    kb(["friend(ann, bob)",
+        "likes(X, Y) :- friend(Y, X)"])
+    assert kb.query(pl.Expr("likes(Y, X)")) == [{"Y": "bob", "X": "ann"}]
+
+
+def test_append_splits_a_list():
+    kb = pl.KnowledgeBase("append_split")
+    kb(["append([], L, L)",
+        "append([H|T1], L2, [H|T3]) :- append(T1, L2, T3)"])
+    result = kb.query(pl.Expr("append(X, Y, [a,b])"))
+    splits = {(r["X"], r["Y"]) for r in result}
+    assert splits == {("[]", "[a,b]"), ("[a]", "[b]"), ("[a,b]", "[]")}
+    assert kb.query(pl.Expr("append([a,b], [c], Z)")) == [{"Z": "[a,b,c]"}]
+
+
+def test_partial_answers_do_not_leak_clause_names():
+    kb = pl.KnowledgeBase("partial")
+    kb(["pair(X, [X|T], T)",
+        "wrap(X, Y) :- pair(X, Y, Z)"])
+    value = kb.query(pl.Expr("wrap(a, L)"))[0]["L"]
+    assert value.startswith("[a|_") and "T" not in value
+
+
+def test_fresh_renames_only_variables():
+    fact = pl.Fact("likes(X, Food) :- food(Food), tasty(Food)")
+    fresh = fact.fresh("1")
+    assert fresh.to_string() == "likes(X_1,Food_1):-food(Food_1),tasty(Food_1)"
@@ -0,0 +1,61 @@
+"""
+Table import tests for Pytholog.
+Rows of csv files and data frames become the same facts as the clause text,
+with numeric columns kept as numbers.
+"""
+
+import pytest
+import pytholog as pl
+
+ROWS = [("ann", "london", "31", "1.50"), ("bob", "paris", "45", "2.25"), ("cy", "london", "19", "007")]
+
+
+@pytest.fixture
+def people(tmp_path):
+    path = tmp_path / "people.csv"
+    path.write_text("name,city,age,score\n" + "".join(",".join(r) + "\n" for r in ROWS))
+    return str(path)
+
+
+def test_csv_rows_are_facts(people):
+    kb = pl.KnowledgeBase("csv")
+    assert kb.load_csv("lives", people, columns = ["name", "city"]) == 3
+    assert kb.load_csv("person", people) == 3
+    text = pl.KnowledgeBase("text")
+    text(["lives(%s, %s)" % r[:2] for r in ROWS])
+    for q in ["lives(N, london)", "lives(bob, C)", "lives(zed, C)"]:
+        assert kb.query(pl.Expr(q)) == text.query(pl.Expr(q)), q
+    assert kb.query(pl.Expr("person(ann, C, Age, Score)")) == [{"C": "london", "Age": 31, "Score": 1.5}]
+    ## numbers match their text, values that are not plain numbers stay text
+    assert kb.query(pl.Expr("person(N, london, 31, S)")) == [{"N": "ann", "S": 1.5}]
+    assert kb.query(pl.Expr("person(cy, london, A, S)")) == [{"A": 19, "S": "007"}]
+    kb(["adult(N) :- person(N, _, A, _), A >= 21"])
+    assert kb.query(pl.Expr("adult(N)")) == [{"N": "bob"}, {"N": "ann"}]
+    assert [f.fact for f in kb.db["person"]["facts"]][0] == "person(ann,london,31,1.50)"
+
+
+def test_csv_unknown_column(people):
+    with pytest.raises(ValueError, match = "no column"):
+        pl.KnowledgeBase("csv").load_csv("lives", people, columns = ["name", "town"])
+
+
+def test_csv_ragged_rows(tmp_path):
+    path = tmp_path / "pay.csv"
+    path.write_text("id,name,amount\n1,ann,10\n2,bob\n3,cy,30\n")
+    kb = pl.KnowledgeBase("csv")
+    with pytest.raises(ValueError, match = "line 3 has 2 fields, expected 3"):
+        kb.load_csv("pay", str(path))
+    assert kb.query(pl.Expr("pay(I, N)")) == ["No"] and "pay" not in kb.db
+    ## without a header the first row tells how many fields there are
+    path.write_text("1,ann\n2,bob,20\n")
+    with pytest.raises(ValueError, match = "line 2 has 3 fields, expected 2"):
+        kb.load_csv("pay", str(path), header = False)
+
+
+def test_dataframe_rows_are_facts():
+    pd = pytest.importorskip("pandas")
+    df = pd.DataFrame({"name": ["ann", "bob"], "age": [31, 45], "score": [1.5, 2.25]})
+    kb = pl.KnowledgeBase("frame")
+    assert kb.load_dataframe("person", df) == 2
+    assert kb.query(pl.Expr("person(bob, A, S)")) == [{"A": 45, "S": 2.25}]
+    assert kb.query(pl.Expr("person(N, 31, 1.5)")) == [{"N": "ann"}]
@@ -0,0 +1,90 @@
+"""
+Web api tests for the Pytholog tool.
+The routes of tool/Pytholog.py answer batches, prepared queries, inserts and
+metrics for the knowledge bases it hosts, and refuse malformed requests with 400.
+"""
+
+import os
+import json
+import importlib.util
+import pytest
+import pytholog as pl
+from pytholog.journal import JournalError
+
+flask = pytest.importorskip("flask")
+
+
+@pytest.fixture
+def tool():
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tool", "Pytholog.py")
+    spec = importlib.util.spec_from_file_location("pytholog_tool", path)
+    tool = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(tool)
+    kb = pl.KnowledgeBase("family")
+    kb(["parent(ann, bob)", "parent(bob, cy)", "parent(bob, dan)",
+        "grand(X, Z) :- parent(X, Y), parent(Y, Z)"])
+    tool.registry.add("family", kb = kb)
+    tool.registry.add("other")
+    tool.server["kb"] = "family"
+    return tool
+
+
+def records(response):
+    return [json.loads(line) for line in response.get_data(as_text = True).splitlines()]
+
+
+def test_query_batch(tool):
+    client = tool.app.test_client()
+    response = client.post("/query_batch", json = {"limit": 1, "queries": [
+        {"id": "g", "expr": "grand(ann, G)"}, {"expr": "parent(P, dan)", "limit": None}, {"expr": "p(("}]})
+    assert response.status_code == 200
+    found = records(response)
+    assert found[:2] == [{"id": "g", "answer": {"G": "dan"}}, {"id": "g", "done": True, "answers": 1}]
+    assert found[2:4] == [{"id": 1, "answer": {"P": "bob"}}, {"id": 1, "done": True, "answers": 1}]
+    assert found[4]["id"] == 2 and found[4]["error"].startswith("PrologSyntaxError")
+    for body in (["grand(ann, G)"], [{"expr": "grand(ann, G)"}, 3], {"queries": "grand(ann, G)"}, 5):
+        response = client.post("/query_batch", json = body)
+        assert response.status_code == 400, body
+        assert response.get_json()["error"].startswith("TypeError")
+    assert client.post("/kb/nowhere/query_batch", json = []).status_code == 404
+
+
+def test_insert_batch_and_prepared_queries(tool):
+    client = tool.app.test_client()
+    response = client.post("/kb/other/insert_batch", json = ["edge(a, b)", "edge(b, c)", "link(X, Y) :- edge(X, Y)"])
+    assert response.get_json() == {"added": 3, "predicates": ["edge", "link"]}
+    response = client.post("/kb/other/insert_batch", data = "edge(c, d).\nedge(d, e).", content_type = "text/plain")
+    assert response.get_json() == {"added": 2, "predicates": ["edge"]}
+    for body in (["edge(e, f)", "edge(("], [5]):
+        assert client.post("/kb/other/insert_batch", json = body).status_code == 400
+    assert len(tool.registry["other"].db["edge"]["facts"]) == 4  ## a bad batch adds nothing
+    def refused(kn):
+        raise JournalError("the journal cannot be written")
+    tool.registry["other"].add_kn = refused
+    response = client.post("/kb/other/insert_batch", json = ["edge(e, f)"])
+    assert response.status_code == 400 and response.get_json() == {"error": "the journal cannot be written"}
+    prepared = client.post("/kb/other/prepare", json = {"query": "link(X, Y)?"}).get_json()
+    assert prepared["params"] == ["X", "Y"]
+    response = client.post("/kb/other/execute", json = {"id": prepared["id"], "params": {"X": "c"}})
+    assert response.get_json() == [{"Y": "d"}]
+    response = client.post("/kb/other/execute", json = {"id": prepared["id"], "rows": [{"X": "a"}, {"Y": "e"}]})
+    assert response.get_json() == [[{"Y": "b"}], [{"X": "d"}]]
+    assert client.post("/kb/other/prepare", json = {"query": "link(X"}).status_code == 400
+    assert client.post("/kb/other/execute", json = {"params": {}}).status_code == 400
+    assert client.post("/kb/other/execute", json = {"id": prepared["id"], "params": {"Z": "a"}}).status_code == 400
+
+
+def test_kb_routes_and_metrics(tool):
+    client = tool.app.test_client()
+    assert client.get("/kb").get_json() == {"kbs": ["family", "other"], "default": "family", "errors": {}}
+    response = client.get("/kb/family/query", query_string = {"expr": "grand(ann, G)?"})
+    assert response.get_json() == tool.registry["family"].query("grand(ann, G)")
+    assert client.get("/kb/nowhere/query", query_string = {"expr": "grand(ann, G)?"}).status_code == 404
+    assert client.get("/metrics").status_code == 404  ## off until --metrics
+    tool.registry["family"].enable_metrics()
+    client.get("/query", query_string = {"expr": "parent(bob, C)?"})
+    response = client.get("/kb/family/metrics")
+    assert response.status_code == 200 and response.mimetype == "text/plain"
+    text = response.get_data(as_text = True)
+    assert 'pytholog_queries_total{kb="family"} 1' in text
+    assert 'pytholog_calls_total{kb="family",predicate="parent"} 1' in text
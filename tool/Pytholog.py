@@ -1,9 +1,24 @@
 import pytholog as pl
+from pytholog.server import serve
+from pytholog.ipc import serve_unix
+from pytholog.scheduler import Scheduler, Overloaded
+from pytholog.metrics import prometheus
+from pytholog.registry import Registry
+from pytholog.prepared import BindError
+from pytholog.repl import Session
+from pytholog.reader import PrologSyntaxError, read_clauses
+import os
 import sys
 import argparse
+import threading
 import re
 from pprint import pprint
-from flask import Flask, jsonify, request
+from flask import Flask, Response, abort, jsonify, request, stream_with_context
+import io
+import json
+import base64
+import weakref
+from itertools import chain
 
 app = Flask(__name__)
 app.config["DEBUG"] = True
@@ -14,30 +29,132 @@ def main():
         description="pytholog executable tool: prolog experience at command line and a logic knowledge base with no dependencies")
     parser.add_argument("-c", "--consult", help="read an existing prolog file/knowledge base",
                         type=str, required=False)
+    parser.add_argument("-s", "--snapshot", help="start from a knowledge base snapshot (see KnowledgeBase.save_snapshot)",
+                        type=str, required=False)
+    parser.add_argument("-j", "--journal", help="append-only journal of the changes, replayed after the snapshot "
+                        "(saving compacts it into the snapshot instead of writing <name>.pl)",
+                        type=str, required=False)
     parser.add_argument("-n", "--name", help="knowledge base name",
                         type=str, required=True)
     parser.add_argument("-i", "--interactive", help="start an interactive prolog-like session",
                         action="store_true", default=False)
     parser.add_argument("-a", "--api", help="start a flask api",
                         action="store_true", default=True)
+    parser.add_argument("-w", "--workers", help="serve the api with this many pre-forked worker processes "
+                        "sharing the knowledge base read-only (production mode, instead of flask's server)",
+                        type=int, required=False)
+    parser.add_argument("-t", "--threads", help="concurrent connections per worker (production mode)",
+                        type=int, default=8)
+    parser.add_argument("--host", help="address the api listens on", type=str, default="127.0.0.1")
+    parser.add_argument("-p", "--port", help="port the api listens on", type=int, default=5000)
+    parser.add_argument("-u", "--unix-socket", help="answer local clients on this unix socket with the binary "
+                        "protocol of pytholog.ipc (see pytholog.client) instead of the api",
+                        type=str, required=False)
+    parser.add_argument("--schedule", help="run the queries of the api on a fair scheduler: they take turns by "
+                        "slices of inferences, by priority (priority=high|normal|low) and client (client=...)",
+                        action="store_true", default=False)
+    parser.add_argument("--slice", help="inferences a scheduled query runs before the next one's turn",
+                        type=int, default=500)
+    parser.add_argument("--max-backlog", help="scheduled queries waiting before new ones are rejected (503)",
+                        type=int, default=1000)
+    parser.add_argument("--quota", help="scheduled queries a client can have waiting",
+                        type=int, default=100)
+    parser.add_argument("-k", "--kb", help="host another knowledge base under /kb/NAME/, consulted from FILE "
+                        "(repeat it for more knowledge bases or files)", metavar="NAME=FILE", action="append")
+    parser.add_argument("--watch", help="reload the consulted files when they change, applying only the clauses "
+                        "that changed (checked every WATCH seconds, 1 by default)",
+                        type=float, nargs="?", const=1.0, default=None)
+    parser.add_argument("-m", "--metrics", help="record what the engine does and serve it at /metrics "
+                        "(prometheus text format)", action="store_true", default=False)
+    parser.add_argument("--keep-alive", help="seconds an idle connection is kept open (production mode)",
+                        type=float, default=5)
     args, _ = parser.parse_known_args()
     args = vars(args)
 
     name = args["name"]
-    kb = pl.KnowledgeBase(name)
-
-    if args["consult"]:
-        kb.from_file(args["consult"])
+    fresh = True
+    if args["journal"]:
+        snapshot["path"] = args["snapshot"] or name + ".snapshot"
+        ## a restored knowledge base already has what was consulted the first time
+        fresh = not any(os.path.exists(p) for p in (snapshot["path"], args["journal"]))
+        kb = pl.KnowledgeBase.restore(snapshot["path"], args["journal"], name)
+    elif args["snapshot"]:
+        kb = pl.KnowledgeBase.load_snapshot(args["snapshot"])
+        kb.name = name
+    else:
+        kb = pl.KnowledgeBase(name)
+
+    if args["watch"] is not None and kb.journal is not None:
+        parser.error("a journaled knowledge base keeps its changes, its files cannot be watched")
+    registry.add(name, [args["consult"]] if args["consult"] and fresh else [], kb)
+    for spec in args["kb"] or []:
+        other, sep, path = spec.partition("=")
+        if not sep:
+            parser.error("--kb is NAME=FILE, got %s" % spec)
+        registry.add(other, [path], registry[other] if other in registry else None)
+    if args["metrics"]:
+        for hosted_kb in registry:
+            hosted_kb.enable_metrics()
         
     if args["interactive"]:
         type = "interactive"
+    elif args["unix_socket"]:
+        type = "ipc"
+    elif args["workers"]:
+        if kb.journal is not None:
+            parser.error("the workers serve the knowledge base read-only, it cannot be journaled")
+        type = "server"
     else:
         type = "api"
+    server.update((k, args[k]) for k in ("workers", "threads", "host", "port", "keep_alive", "unix_socket",
+                                         "schedule", "slice", "max_backlog", "quota", "watch"))
+    server["kb"] = name
 
     #run(kb)
     return kb, type
 
 
+## the snapshot a journaled knowledge base is compacted into
+snapshot = {"path": None}
+
+## how the api is served
+server = {"workers": None, "threads": 8, "host": "127.0.0.1", "port": 5000, "keep_alive": 5,
+          "unix_socket": None, "schedule": False, "slice": 500, "max_backlog": 1000, "quota": 100,
+          "watch": None, "kb": None}
+
+## the knowledge bases served: the one of --name (and --consult) and the --kb ones
+registry = Registry()
+
+
+## the knowledge base of a request: /kb/<name>/... or the one of --name. a reload
+## replaces it in the registry, the requests already answering end on the old one
+def hosted(name=None):
+    if server["watch"] is not None:
+        registry.interval = server["watch"]
+        registry.watch()  ## (a forked worker starts its own on its first request)
+    name = name or server["kb"]
+    if name not in registry:
+        response = jsonify("no knowledge base %s" % name)
+        response.status_code = 404
+        abort(response)
+    return registry[name]
+
+
+## the workers share the knowledge base as it is when they are forked, so what is
+## left to load (see KnowledgeBase.materialize) is done once rather than in every worker
+def read_only(registry):
+    for kb in registry:
+        kb.materialize()
+    app.config["DEBUG"] = False
+    app.config["READ_ONLY"] = True
+
+
+def refuse_write():
+    response = jsonify("the knowledge base is read-only, it is served by %d workers" % server["workers"])
+    response.status_code = 403
+    return response
+
+
 def save_to_file(kb):
     output = kb.name + ".pl"
     with open(output, "w") as o:
@@ -49,8 +166,18 @@ def save_to_file(kb):
     return ("KnowledgeBase is saved into %s file" % output)
 
 
+## a journaled knowledge base is already saved, compacting only keeps its journal short
+def compact(kb, background = True):
+    kb.journal.flush()
+    kb.compact(snapshot["path"], background = background)
+    return ("KnowledgeBase is saved into %s journal (compacting into %s)" % (kb.journal.path, snapshot["path"]))
+
+
 def save_quit(kb, exit = True):
-    s = save_to_file(kb)
+    if kb.journal is not None:
+        s = compact(kb, background = not exit)
+    else:
+        s = save_to_file(kb)
     if exit:
         print(s)
         sys.exit(0)
@@ -64,7 +191,8 @@ def show_kb(kb):
 
 
 def invalid_inpt(kb):
-    print("invalid input\n please type 'print' to print the knowledge base\n or 'quit' to save and exit")
+    print("invalid input\n please type 'print' to print the knowledge base\n or 'quit' to save and exit\n"
+          " or ':help' for the commands timing and profiling queries")
 
 
 def is_fact(inpt):
@@ -78,21 +206,54 @@ def _insert(kb, inpt):
     kb([inpt])
 
 
+## the query text of an input and whether it is cut ("!" instead of "?")
+def _query_text(inpt):
+    inpt = re.sub("\?", "", inpt).strip()
+    cut = inpt.endswith("!")
+    return (inpt[:-1] if cut else inpt), cut
+
+
+def _parse_query(inpt):
+    text, cut = _query_text(inpt)
+    return pl.Expr(text), cut
+
+
+## the text is compiled by the knowledge base, once for each shape of query
 def _query(kb, inpt):
-    inpt = re.sub("\?", "", inpt)
-    cut = (inpt[-1] == "!")
-    return kb.query(pl.Expr(inpt[:-1]), cut=cut)
+    text, cut = _query_text(inpt)
+    return kb.query(text, cut=cut)
+
+
+## with --schedule the queries of the api take turns on a fair scheduler
+## (see pytholog.scheduler), one per worker started by its first query
+_scheduler = {"scheduler": None, "lock": threading.Lock()}
+
+
+def get_scheduler(kb):
+    with _scheduler["lock"]:
+        if _scheduler["scheduler"] is None:
+            _scheduler["scheduler"] = Scheduler(kb, slice=server["slice"], max_backlog=server["max_backlog"],
+                                                quota=server["quota"])
+        return _scheduler["scheduler"]
+
+
+def _scheduled_query(kb, inpt, priority, client):
+    expr, cut = _parse_query(inpt)
+    return get_scheduler(kb).query(expr, limit=1 if cut else None, priority=priority, client=client, kb=kb)
 
 
 def inpt_prep(inpt):
     return re.sub("\.", "", inpt)
 
 # interactive command line
+## the commands starting with ":" and the queries read an answer at a time
+## (ending with ";") are the session's (see pytholog.repl)
 def run(kb):
     switch = {
         "quit": save_quit,
         "print": show_kb,
     }
+    session = Session(kb)
 
     while True:
         sys.stdout.write("?- ")
@@ -100,6 +261,8 @@ def run(kb):
 
         inpt = sys.stdin.readline().rstrip("\n")
 
+        if session.command(inpt): continue
+
         if inpt in [" ", ""]: continue
 
         inpt = inpt_prep(inpt)
@@ -116,26 +279,183 @@ def run(kb):
             switch.get(inpt, invalid_inpt)(kb)
             continue
 
+## the knowledge bases hosted, and the files whose last change could not be applied
+@app.route("/kb", methods=["GET"])
+def kb_list():
+    return jsonify({"kbs": registry.names(), "default": server["kb"], "errors": registry.errors})
+
 @app.route("/query", methods=["GET"])
-def kb_query():
+@app.route("/kb/<name>/query", methods=["GET"])
+def kb_query(name=None):
+    kb = hosted(name)
     inpt = request.args["expr"]
     inpt = inpt_prep(inpt)
-    return jsonify(_query(kb, inpt))
+    if not server["schedule"]:
+        return jsonify(_query(kb, inpt))
+    try:
+        answers = _scheduled_query(kb, inpt, request.args.get("priority", "normal"),
+                                   request.args.get("client", request.remote_addr))
+    except Overloaded as e:
+        response = jsonify({"error": str(e)})
+        response.status_code = 503
+        response.headers["Retry-After"] = "1"
+        return response
+    return jsonify(answers)
     
+## many queries in one request: a json list of {"id", "expr", "limit"} (or an object
+## with it as "queries" and a default "limit"), answered as ndjson records streamed
+## as the answers are found, {"id", "answer"} for each answer then {"id", "done",
+## "answers"} (or {"id", "error"} if the query cannot be run). a body of another
+## shape is refused whole before anything is streamed
+@app.route("/query_batch", methods=["POST"])
+@app.route("/kb/<name>/query_batch", methods=["POST"])
+def kb_query_batch(name=None):
+    kb = hosted(name)
+    body = request.get_json(force=True)
+    limit = None
+    if isinstance(body, dict):
+        limit = body.get("limit")
+        body = body.get("queries", [])
+    if not isinstance(body, list) or not all(isinstance(q, dict) for q in body):
+        return bad_request(TypeError("the queries are a list of objects with an expr"))
+    return Response(stream_with_context(chain.from_iterable(
+        batch_answers(kb, q.get("id", i), q.get("expr", ""), q.get("limit", limit))
+        for i, q in enumerate(body))), mimetype="application/x-ndjson")
+
+
+def batch_answers(kb, id, expr, limit):
+    count = 0
+    try:
+        for answer in kb.solve(inpt_prep(expr), limit):
+            count += 1
+            yield json.dumps({"id": id, "answer": answer}) + "\n"
+    except Exception as e:
+        yield json.dumps({"id": id, "error": "%s: %s" % (type(e).__name__, e)}) + "\n"
+        return
+    yield json.dumps({"id": id, "done": True, "answers": count}) + "\n"
+
+## writes wait for a reload that is running (see Registry.lock), so they are not
+## made on a knowledge base that is being replaced
+## prepared queries: /prepare {"query": "path(X, Y, P)"} answers its "id" and "params",
+## then /execute {"id", "params": {"X": "seattle"}} (or "rows": [{...}, ...] for many)
+## runs it without reading it again. the id is the query text encoded, so any worker
+## can run it: each worker prepares it once for each knowledge base
+_prepared = weakref.WeakKeyDictionary()  ## kb -> {id: its prepared query}
+
+
+def prepared_query(kb, id):
+    queries = _prepared.setdefault(kb, {})
+    if id not in queries:
+        queries[id] = kb.prepare(base64.urlsafe_b64decode(id.encode("ascii")).decode("utf-8"))
+    return queries[id]
+
+
+def bad_request(e):
+    response = jsonify({"error": "%s: %s" % (type(e).__name__, e)})
+    response.status_code = 400
+    return response
+
+@app.route("/prepare", methods=["POST"])
+@app.route("/kb/<name>/prepare", methods=["POST"])
+def kb_prepare(name=None):
+    kb = hosted(name)
+    query = inpt_prep(request.get_json(force=True).get("query", "")).rstrip("?").strip()
+    id = base64.urlsafe_b64encode(query.encode("utf-8")).decode("ascii")
+    try:
+        handle = prepared_query(kb, id)
+    except (PrologSyntaxError, BindError) as e:
+        return bad_request(e)
+    return jsonify({"id": id, "params": list(handle.params)})
+
+@app.route("/execute", methods=["POST"])
+@app.route("/kb/<name>/execute", methods=["POST"])
+def kb_execute(name=None):
+    kb = hosted(name)
+    body = request.get_json(force=True)
+    try:
+        handle = prepared_query(kb, body["id"])
+        if "rows" in body:
+            return jsonify(handle.executemany(body["rows"], limit=body.get("limit")))
+        return jsonify(handle.execute(limit=body.get("limit"), **body.get("params", {})))
+    except (KeyError, ValueError, TypeError) as e:
+        return bad_request(e)
+
 @app.route("/insert", methods=["POST"])
-def kb_insert():
-    inpt = request.args["expr"]
-    input = inpt_prep(inpt)
-    _insert(kb, inpt)
+@app.route("/kb/<name>/insert", methods=["POST"])
+def kb_insert(name=None):
+    if app.config.get("READ_ONLY"): return refuse_write()
+    inpt = inpt_prep(request.args["expr"])
+    with registry.lock:
+        _insert(hosted(name), inpt)
     return jsonify("OK")
+
+## many clauses in one request: the body is a json list of clauses (or an object with
+## it as "clauses") or prolog text. they are all parsed before any is added, so a
+## batch with a bad clause adds nothing, and are added in bulk
+@app.route("/insert_batch", methods=["POST"])
+@app.route("/kb/<name>/insert_batch", methods=["POST"])
+def kb_insert_batch(name=None):
+    if app.config.get("READ_ONLY"): return refuse_write()
+    try:
+        if request.is_json:
+            clauses = request.get_json()
+            if isinstance(clauses, dict):
+                clauses = clauses.get("clauses", [])
+        else:
+            clauses = read_clauses(io.StringIO(request.get_data(as_text=True)))
+        facts = [pl.Fact(c) for c in clauses]
+        with registry.lock:
+            hosted(name)(facts)
+    except (ValueError, TypeError) as e:  ## (a PrologSyntaxError is a ValueError)
+        response = jsonify({"error": str(e)})
+        response.status_code = 400
+        return response
+    return jsonify({"added": len(facts), "predicates": sorted({f.lh.predicate for f in facts})})
     
+@app.route("/retract", methods=["POST"])
+@app.route("/kb/<name>/retract", methods=["POST"])
+def kb_retract(name=None):
+    if app.config.get("READ_ONLY"): return refuse_write()
+    inpt = inpt_prep(request.args["expr"])
+    with registry.lock:
+        return jsonify("OK" if hosted(name).retract(inpt) else "No")
+
+## the metrics of the knowledge base (see pytholog.metrics) for prometheus. every
+## worker records its own, they are labelled with the worker's pid
+@app.route("/metrics", methods=["GET"])
+@app.route("/kb/<name>/metrics", methods=["GET"])
+def kb_metrics(name=None):
+    kb = hosted(name)
+    if kb.metrics is None:
+        response = jsonify("metrics are off, start the api with --metrics")
+        response.status_code = 404
+        return response
+    labels = {"kb": kb.name}
+    if server["workers"]:
+        labels["worker"] = os.getpid()
+    gauges = []
+    scheduler = _scheduler["scheduler"]
+    if scheduler is not None:
+        gauges = [("scheduler_backlog", "Scheduled queries waiting.", scheduler.backlog),
+                  ("scheduler_peak_backlog", "The most scheduled queries waiting at once.", scheduler.peak_backlog)]
+    return Response(prometheus(kb.stats(), labels, gauges=gauges), mimetype="text/plain; version=0.0.4")
+
 @app.route("/save", methods=["GET", "POST"])
-def kb_save():
-    return jsonify(save_quit(kb, exit = False))
+@app.route("/kb/<name>/save", methods=["GET", "POST"])
+def kb_save(name=None):
+    if app.config.get("READ_ONLY"): return refuse_write()
+    with registry.lock:
+        return jsonify(save_quit(hosted(name), exit = False))
 
 if __name__ == "__main__":
     kb, type = main()
     if type == "interactive":
         run(kb)
+    elif type == "ipc":
+        kb.materialize()
+        serve_unix(kb, server["unix_socket"])
+    elif type == "server":
+        read_only(registry)
+        serve(app, server["host"], server["port"], server["workers"], server["threads"], server["keep_alive"])
     else:
-        app.run()
+        app.run(host=server["host"], port=server["port"])